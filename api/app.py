@@ -1,16 +1,17 @@
 import os
 import logging
-from flask import Flask, render_template, request, redirect, url_for, send_file, flash, jsonify, session
+import threading
+import time
+import cProfile
+from flask import Flask, render_template, request, redirect, url_for, send_file, send_from_directory, flash, jsonify, Response
 from werkzeug.utils import secure_filename
 from werkzeug.middleware.proxy_fix import ProxyFix
-import cv2
-import numpy as np
-from utils.detection import YOLODetector
-from utils.video_processor import VideoProcessor
-from utils.heatmap import HeatmapGenerator
+from utils.jobs import Job, JobManager, JobQueueFull
+from utils.job_store import JobStore
+from utils.metrics import MetricsRegistry, profile_summary
+from utils.uploads import UploadManager, UploadOffsetMismatch, UploadTooLarge
 import uuid
 import json
-from datetime import datetime
 from flask_cors import CORS
 
 # Configure logging
@@ -18,7 +19,6 @@ logging.basicConfig(level=logging.DEBUG)
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "crowd_detection_secret_key_2024")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 CORS(app, origins=[
     "https://stirring-douhua-7a0209.netlify.app",
     "https://lucky-brioche-59abc6.netlify.app"
@@ -28,26 +28,384 @@ CORS(app, origins=[
 UPLOAD_FOLDER = 'static/uploads'
 PROCESSED_FOLDER = 'static/processed'
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'flv', 'wmv'}
-MAX_CONTENT_LENGTH = 25 * 1024 * 1024  # 25MB max file size (reduced for stability)
+MAX_CONTENT_LENGTH = 25 * 1024 * 1024  # 25MB max request size (reduced for stability); larger files use chunked uploads
+MAX_UPLOAD_MB = int(os.environ.get('MAX_UPLOAD_MB', 2048))  # total size of a chunked upload
+UPLOAD_EXPIRE_HOURS = float(os.environ.get('UPLOAD_EXPIRE_HOURS', 24))  # incomplete uploads are deleted after this
+STREAM_UPLOAD_PROCESSING = os.environ.get('STREAM_UPLOAD_PROCESSING', '1') == '1'  # start on streamable uploads before they complete
+UPLOAD_STALL_TIMEOUT = float(os.environ.get('UPLOAD_STALL_TIMEOUT', 300))  # seconds processing waits for the next chunk
+DETECTOR_MODEL = os.environ.get('DETECTOR_MODEL', 'hog')  # 'hog', 'cascade' or the path of a YOLO ONNX model
+DETECTOR_THREADS = int(os.environ.get('DETECTOR_THREADS', 0))  # OpenCV inference threads for ONNX models, 0 for the default
+DETECTOR_POOL_SIZE = int(os.environ.get('DETECTOR_POOL_SIZE', os.cpu_count() or 1))  # detectors shared by jobs and streams
+PROCESSING_WORKERS = int(os.environ.get('PROCESSING_WORKERS', max(1, (os.cpu_count() or 1) // 2)))
+MAX_QUEUED_JOBS = int(os.environ.get('MAX_QUEUED_JOBS', 20))
+CHUNK_WORKERS = int(os.environ.get('CHUNK_WORKERS', 1))  # >1 splits each video across processes
+PIPELINED_PROCESSING = os.environ.get('PIPELINED_PROCESSING', '1') == '1'  # overlap decode, analysis, rendering and encoding
+SEGMENTED_OUTPUT = os.environ.get('SEGMENTED_OUTPUT', '1') == '1'  # publish output as HLS segments while processing
+SEGMENT_SECONDS = float(os.environ.get('SEGMENT_SECONDS', 2))
+ENCODER_BACKEND = os.environ.get('ENCODER_BACKEND', 'auto')  # 'ffmpeg', 'opencv' or 'auto' (ffmpeg when installed)
+ENCODER_PRESET = os.environ.get('ENCODER_PRESET', 'veryfast')  # x264 preset of the ffmpeg encoder
+ENCODER_CRF = int(os.environ.get('ENCODER_CRF', 23))  # x264 quality of the ffmpeg encoder, lower is better
+OUTPUT_MAX_WIDTH = int(os.environ.get('OUTPUT_MAX_WIDTH', 0))  # downscale wider output videos, 0 keeps the input size
+OUTPUT_FRAME_STEP = int(os.environ.get('OUTPUT_FRAME_STEP', 1))  # keep one output frame in this many
+DETECTION_CACHE_DIR = os.environ.get('DETECTION_CACHE_DIR', 'cache/detections')  # empty disables the cache
+DETECTION_CACHE_MAX_MB = int(os.environ.get('DETECTION_CACHE_MAX_MB', 512))
+DEFAULT_OVERLAY_ALPHA = 0.3
+MAX_STREAMS = int(os.environ.get('MAX_STREAMS', 4))
+# Live sources clients may open, e.g. 'rtsp://cameras.example.com/' or a directory of
+# local test files; the server connects to them, so none are allowed by default
+STREAM_SOURCE_PREFIXES = tuple(prefix for prefix in os.environ.get(
+    'STREAM_SOURCE_PREFIXES', '').split(',') if prefix)
+ZONES_FILE = os.environ.get('ZONES_FILE', '')  # JSON list of default polygon zones for jobs that don't set their own
+PREWARM = os.environ.get('PREWARM', '0') == '1'  # load OpenCV and the detector in the background at startup
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'  # allow per-job cProfile captures
+JOB_DB_PATH = os.environ.get('JOB_DB_PATH', 'data/jobs.db')  # SQLite database of jobs, results and their files
+JOB_RETENTION_HOURS = float(os.environ.get('JOB_RETENTION_HOURS', 168))  # finished jobs and their files are deleted after this, 0 keeps them
+CLEANUP_INTERVAL = 3600  # seconds between cleanups of expired jobs
+# Reverse proxies in front of the app whose X-Forwarded-* headers are trusted; without a
+# proxy any client could claim another's address, which jobs are scoped to
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['PROCESSED_FOLDER'] = PROCESSED_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 app.config['UPLOAD_EXTENSIONS'] = ALLOWED_EXTENSIONS
 
+if TRUSTED_PROXIES > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES, x_host=TRUSTED_PROXIES)
+
 # Ensure directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 
-# Initialize components
-detector = YOLODetector()
-processor = VideoProcessor(detector)
-heatmap_gen = HeatmapGenerator()
+# Initialize components. OpenCV, NumPy and the detector are loaded on first
+# use, so a cold start serving pages or status requests doesn't pay for them
+_components = {}
+_components_lock = threading.Lock()
+
+def lazy_component(name, factory):
+    """Create a shared component on first use, once across threads"""
+    component = _components.get(name)
+    if component is None:
+        with _components_lock:
+            component = _components.get(name)
+            if component is None:
+                component = _components[name] = factory()
+    return component
+
+def get_detector():
+    """Get the pool of person detectors shared by all jobs and streams"""
+    def create():
+        from utils.detection import DetectorPool
+        return DetectorPool(size=DETECTOR_POOL_SIZE, model_name=DETECTOR_MODEL,
+                            dnn_threads=DETECTOR_THREADS or None)
+    return lazy_component('detector', create)
+
+def get_detection_cache():
+    """Get the detection cache, or None if it is disabled"""
+    if not DETECTION_CACHE_DIR:
+        return None
+    def create():
+        from utils.detection_cache import DetectionCache
+        return DetectionCache(DETECTION_CACHE_DIR, max_bytes=DETECTION_CACHE_MAX_MB * 1024 * 1024)
+    return lazy_component('detection_cache', create)
+
+def get_default_zones():
+    """Get the zones from ZONES_FILE (an empty list if unset)"""
+    def create():
+        from utils.zones import parse_zones
+        if not ZONES_FILE:
+            return []
+        with open(ZONES_FILE) as f:
+            return parse_zones(json.load(f))
+    return lazy_component('zones', create)
+
+def prewarm():
+    """Load the processing modules and the detector ahead of the first job"""
+    started = time.perf_counter()
+    import utils.video_processor, utils.heatmap, utils.stream_processor  # noqa: F401
+    get_detector()
+    get_detection_cache()
+    logging.info(f"Processing components loaded in {time.perf_counter() - started:.2f}s")
+
+metrics = MetricsRegistry()
+uploads = UploadManager(UPLOAD_FOLDER, MAX_UPLOAD_MB * 1024 * 1024,
+                        expire_seconds=UPLOAD_EXPIRE_HOURS * 3600)
+job_store = JobStore(JOB_DB_PATH)
+# Jobs only run in the process that accepted them; fail those whose process has exited
+# (other workers sharing the database keep theirs)
+if job_store.fail_unfinished("Server restarted before the job finished"):
+    logging.warning("Marked jobs interrupted by a restart as failed")
+
+def run_processing_job(job):
+    """Process a queued job on a background worker"""
+    from utils.video_processor import VideoProcessor
+    from utils.heatmap import HeatmapGenerator
+    from utils.encoding import VideoEncoder
+    
+    started = time.perf_counter()
+    profile = job.options.get('profile', False)
+    encoder = VideoEncoder(backend=ENCODER_BACKEND, preset=ENCODER_PRESET, crf=ENCODER_CRF,
+                           max_width=OUTPUT_MAX_WIDTH or None, frame_step=OUTPUT_FRAME_STEP)
+    # OpenCV can only put mp4v into the MPEG-TS segments, which browsers can't play,
+    # and the download would then be re-encoded from them, so only ffmpeg publishes segments
+    segment_dir = (media_dir(job.id) if SEGMENTED_OUTPUT and job.output_path and encoder.backend == 'ffmpeg'
+                   else None)
+    if segment_dir:
+        job_store.add_artifact(job.id, 'media', segment_dir)
+    # Each job gets its own processor and heatmap so concurrent workers don't share state;
+    # detectors are borrowed from the pool per call.
+    # cProfile only sees the calling thread, so profiled jobs run in a single loop
+    job_processor = VideoProcessor(get_detector(), use_pipeline=PIPELINED_PROCESSING and not profile,
+                                   detection_cache=get_detection_cache(),
+                                   overlay_alpha=job.options.get('overlay_alpha', DEFAULT_OVERLAY_ALPHA),
+                                   segment_dir=segment_dir,
+                                   segment_seconds=SEGMENT_SECONDS,
+                                   zones=job.options.get('zones') or get_default_zones(),
+                                   encoder=encoder)
+    job_heatmap = HeatmapGenerator()
+    try:
+        if profile:
+            profiler = cProfile.Profile()
+            results = profiler.runcall(run_job, job, job_processor, job_heatmap, chunk_workers=1)
+            profiler.dump_stats(profile_path(job.id))
+            job_store.add_artifact(job.id, 'profile', profile_path(job.id))
+            results['profile'] = profile_summary(profiler)
+        else:
+            results = run_job(job, job_processor, job_heatmap)
+    except Exception:
+        metrics.observe_job('failed', time.perf_counter() - started)
+        raise
+    if job_processor.timeline is not None:
+        job_processor.timeline.save(timeline_path(job.id))
+        job_store.add_artifact(job.id, 'timeline', timeline_path(job.id))
+    job_store.save_frame_stats(job.id, job_processor.frame_stats)
+    if job.output_path:
+        # Only H.264 output plays in browsers
+        results['encoder'] = encoder.backend
+    metrics.observe_job('completed', time.perf_counter() - started, job_processor.timer)
+    return results
+
+def run_job(job, job_processor, job_heatmap, chunk_workers=CHUNK_WORKERS):
+    """Run a job's analysis or processing with its processor and heatmap"""
+    upload = uploads.get(job.id) if job.options.get('chunked_upload') else None
+    if upload is not None and not upload.complete:
+        # Decode what has arrived while the rest of the upload is still coming in
+        logging.info(f"Starting on upload {upload.id} at {upload.offset}/{upload.size} bytes")
+        source = upload.open_reader(stall_timeout=UPLOAD_STALL_TIMEOUT)
+        chunk_workers = 1
+    else:
+        upload = None
+        source = job.input_path
+    
+    try:
+        if job.options.get('analytics_only'):
+            logging.info(f"Starting video analysis for {job.input_path}")
+            results = job_processor.analyze_video(source, job_heatmap,
+                                                  progress_callback=job.update_progress)
+        elif chunk_workers > 1:
+            logging.info(f"Starting video processing for {job.input_path}")
+            results = job_processor.process_video_parallel(source, job.output_path, job_heatmap,
+                                                           num_workers=chunk_workers,
+                                                           progress_callback=job.update_progress)
+        else:
+            logging.info(f"Starting video processing for {job.input_path}")
+            results = job_processor.process_video(source, job.output_path, job_heatmap,
+                                                  progress_callback=job.update_progress)
+    finally:
+        if upload is not None:
+            source.close()
+    
+    if upload is not None and not upload.complete:
+        raise RuntimeError("Upload stalled before the whole video arrived")
+    return results
+
+job_manager = JobManager(run_processing_job, num_workers=PROCESSING_WORKERS,
+                         max_queued=MAX_QUEUED_JOBS, store=job_store)
+
+# Time of the last cleanup of expired jobs
+cleanup_state = {'last_run': 0.0}
+cleanup_lock = threading.Lock()
+
+if PREWARM:
+    threading.Thread(target=prewarm, name='prewarm', daemon=True).start()
+
+# Serializes queueing the jobs of chunked uploads
+upload_jobs_lock = threading.Lock()
+
+# Live stream processors by stream ID
+streams = {}
+streams_lock = threading.Lock()
+# IDs of streams whose source is still being opened (they count towards MAX_STREAMS)
+starting_streams = set()
+
+def schedule_cleanup():
+    """Delete expired jobs and their files on a background thread, at most once per interval"""
+    if JOB_RETENTION_HOURS <= 0:
+        return
+    with cleanup_lock:
+        now = time.time()
+        if now - cleanup_state['last_run'] < CLEANUP_INTERVAL:
+            return
+        cleanup_state['last_run'] = now
+    threading.Thread(target=run_cleanup, name='cleanup', daemon=True).start()
+
+def run_cleanup():
+    """Delete stale chunked uploads, then expired jobs and the files recorded for them"""
+    uploads.expire_stale()
+    job_store.cleanup(JOB_RETENTION_HOURS * 3600)
+
+def client_job(job_id):
+    """
+    Get a job's record if it was submitted by the requesting client
+    
+    Jobs belong to the client address that submitted them; other clients
+    are told the job doesn't exist.
+    
+    Returns:
+        Job dictionary (see JobStore.get_job), or None
+    """
+    record = job_store.get_job(job_id)
+    if record is None or record['client_id'] != request.remote_addr:
+        return None
+    return record
+
+def job_progress(job_id):
+    """
+    Get a job's progress, live while it is in memory and from the job store after that
+    
+    Returns:
+        Progress dictionary (see Job.to_dict) with the queue position, or None
+        if the job is unknown
+    """
+    job = job_manager.get(job_id)
+    if job is not None:
+        progress = job.to_dict()
+        progress['queue_position'] = job_manager.queue_position(job_id)
+        return progress
+    
+    record = job_store.get_job(job_id)
+    if record is None:
+        return None
+    frames = record['total_frames'] or 0
+    elapsed = (record['finished_at'] or 0) - (record['started_at'] or 0)
+    return {
+        'job_id': job_id,
+        'status': record['status'],
+        'progress': 100.0 if record['status'] == 'completed' else 0.0,
+        'frames_processed': frames,
+        'total_frames': frames,
+        'fps': round(frames / elapsed, 2) if record['started_at'] and elapsed > 0 else 0.0,
+        'eta_seconds': None,
+        'error': record['error'],
+        'queue_position': None
+    }
+
+def job_results(job_id):
+    """Get a completed job's results, from memory or the job store"""
+    job = job_manager.get(job_id)
+    if job is not None:
+        return job.results
+    return job_store.get_results(job_id)
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def media_dir(file_id):
+    """Directory of a job's HLS playlist and segments"""
+    return os.path.join(PROCESSED_FOLDER, f"media_{file_id}")
+
+def playlist_path(file_id):
+    """Path of a job's HLS playlist (index.m3u8)"""
+    return os.path.join(media_dir(file_id), 'index.m3u8')
+
+def timeline_path(job_id):
+    """Path of a job's saved density timeline"""
+    return os.path.join(PROCESSED_FOLDER, f"timeline_{job_id}.npz")
+
+def profile_path(job_id):
+    """Path of a profiled job's cProfile stats file"""
+    return os.path.join(PROCESSED_FOLDER, f"profile_{job_id}.prof")
+
+def parse_profile(value):
+    """Parse an optional profile form field; profiling must be enabled on the server"""
+    return PROFILING_ENABLED and value in ('1', 'true', 'on')
+
+def parse_zones_option(value):
+    """Parse an optional zones field: a list of zones, or a JSON string of one"""
+    if value in (None, ''):
+        return None
+    from utils.zones import parse_zones
+    if isinstance(value, str):
+        value = json.loads(value)
+    return parse_zones(value) or None
+
+def start_upload_job(upload, client_id):
+    """
+    Queue the job of a chunked upload once it can start
+    
+    Complete uploads are always queued; streamable ones as soon as their
+    container is known, so processing runs while the upload continues.
+    
+    Returns:
+        True if the upload has a job
+    
+    Raises:
+        JobQueueFull: If the upload is complete and the queue is full
+    """
+    with upload_jobs_lock:
+        if upload.job_id is not None:
+            return True
+        if not upload.complete and not (STREAM_UPLOAD_PROCESSING and upload.is_streamable()):
+            return False
+        
+        output_path = None
+        if not upload.options.get('analytics_only'):
+            output_path = os.path.join(app.config['PROCESSED_FOLDER'], f"processed_{upload.id}.mp4")
+        job = Job(upload.id, upload.path, output_path, client_id=client_id,
+                  options=dict(upload.options, chunked_upload=True), filename=upload.filename)
+        try:
+            job_manager.submit(job)
+        except JobQueueFull:
+            if upload.complete:
+                raise
+            # Try again with the next chunk
+            return False
+        upload.job_id = job.id
+    schedule_cleanup()
+    return True
+
+def upload_status(upload, status_code=200):
+    """JSON status of a chunked upload, with its offset in the Upload-Offset header"""
+    status = upload.to_dict()
+    status['upload_url'] = url_for('api_upload_chunk', upload_id=upload.id)
+    if upload.job_id is not None:
+        if upload.options.get('analytics_only'):
+            status['status_url'] = url_for('api_analysis_status', job_id=upload.job_id)
+        else:
+            status['status_url'] = url_for('get_progress', file_id=upload.job_id)
+            status['process_url'] = url_for('process_video', file_id=upload.job_id)
+    response = jsonify(status)
+    response.status_code = status_code
+    response.headers['Upload-Offset'] = str(upload.offset)
+    response.headers['Upload-Length'] = str(upload.size)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def parse_overlay_alpha(value):
+    """Parse an optional heatmap overlay opacity form field"""
+    if value in (None, ''):
+        return DEFAULT_OVERLAY_ALPHA
+    alpha = float(value)
+    if not 0.0 <= alpha <= 1.0:
+        raise ValueError("overlay_alpha must be between 0 and 1")
+    return alpha
+
+@app.context_processor
+def upload_limits():
+    """Make the upload size limit available to templates"""
+    return {'max_upload_mb': MAX_UPLOAD_MB}
+
 @app.route('/')
 def index():
     """Main page with upload form"""
@@ -93,6 +451,17 @@ def upload_video():
             flash('No file selected', 'error')
             return redirect(url_for('index'))
         
+        try:
+            overlay_alpha = parse_overlay_alpha(request.form.get('overlay_alpha'))
+        except ValueError:
+            flash('Invalid overlay opacity', 'error')
+            return redirect(url_for('index'))
+        try:
+            zones = parse_zones_option(request.form.get('zones'))
+        except ValueError as e:
+            flash(f'Invalid zones: {e}', 'error')
+            return redirect(url_for('index'))
+        
         # Validate file type
         if file and allowed_file(file.filename):
             # Generate unique filename
@@ -105,10 +474,21 @@ def upload_video():
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
             file.save(file_path)
             
-            # Store in session
-            session['file_id'] = file_id
-            session['original_filename'] = filename
-            session['upload_time'] = datetime.now().isoformat()
+            # Queue processing job
+            output_filename = f"processed_{file_id}.mp4"
+            output_path = os.path.join(app.config['PROCESSED_FOLDER'], output_filename)
+            job = Job(file_id, file_path, output_path, client_id=request.remote_addr,
+                      options={'overlay_alpha': overlay_alpha,
+                               'profile': parse_profile(request.form.get('profile')),
+                               'zones': zones},
+                      filename=filename)
+            try:
+                job_manager.submit(job)
+            except JobQueueFull as e:
+                os.remove(file_path)
+                flash(str(e), 'error')
+                return redirect(url_for('index'))
+            schedule_cleanup()
             
             logging.info(f"File uploaded: {filename}")
             
@@ -123,42 +503,106 @@ def upload_video():
         flash(f'Upload failed: {str(e)}', 'error')
         return redirect(url_for('index'))
 
+@app.route('/api/uploads', methods=['POST'])
+def api_create_upload():
+    """Start a chunked, resumable upload (JSON: filename, size and processing options)"""
+    params = request.get_json(silent=True) or {}
+    filename = secure_filename(str(params.get('filename', '')))
+    if not allowed_file(filename):
+        return jsonify({'status': 'error', 'message': 'Invalid file type'}), 400
+    try:
+        size = int(params.get('size'))
+        if size <= 0:
+            raise ValueError
+        options = {
+            'overlay_alpha': parse_overlay_alpha(params.get('overlay_alpha')),
+            'profile': parse_profile(str(params.get('profile', '')).lower())
+        }
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'Invalid upload parameters'}), 400
+    try:
+        options['zones'] = parse_zones_option(params.get('zones'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Invalid zones: {e}'}), 400
+    if params.get('analytics_only'):
+        options['analytics_only'] = True
+    
+    upload_id = str(uuid.uuid4())
+    try:
+        upload = uploads.create(upload_id, filename, size, options)
+    except UploadTooLarge as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 413
+    
+    response = upload_status(upload, 201)
+    response.headers['Location'] = url_for('api_upload_chunk', upload_id=upload_id)
+    return response
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def api_upload_status(upload_id):
+    """Get the offset to resume a chunked upload from (also as a HEAD request)"""
+    upload = uploads.get(upload_id)
+    if upload is None:
+        return jsonify({'status': 'not_found'}), 404
+    return upload_status(upload)
+
+@app.route('/api/uploads/<upload_id>', methods=['PATCH'])
+def api_upload_chunk(upload_id):
+    """Append the request body at the offset given in the Upload-Offset header"""
+    upload = uploads.get(upload_id)
+    if upload is None:
+        return jsonify({'status': 'not_found'}), 404
+    try:
+        offset = int(request.headers['Upload-Offset'])
+    except (KeyError, ValueError):
+        return jsonify({'status': 'error', 'message': 'Missing or invalid Upload-Offset header'}), 400
+    if request.content_length is not None and request.content_length > MAX_CONTENT_LENGTH:
+        return jsonify({'status': 'error', 'message': 'Chunk is too large'}), 413
+    
+    try:
+        upload.append(request.stream, offset, request.content_length)
+    except UploadOffsetMismatch:
+        return upload_status(upload, 409)
+    except UploadTooLarge as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 413
+    
+    try:
+        start_upload_job(upload, request.remote_addr)
+    except JobQueueFull:
+        # The upload is kept; an empty chunk at the final offset retries
+        response = upload_status(upload, 503)
+        response.headers['Retry-After'] = '5'
+        return response
+    
+    if upload.complete:
+        logging.info(f"Upload {upload_id} complete: {upload.filename}")
+    return upload_status(upload)
+
 @app.route('/process/<file_id>')
 def process_video(file_id):
-    """Process video and show results"""
+    """Show processing status, or results once the job has finished"""
     try:
-        # Validate file_id
-        if 'file_id' not in session or session['file_id'] != file_id:
-            flash('Invalid session or file ID', 'error')
+        record = client_job(file_id)
+        progress = job_progress(file_id)
+        if record is None or progress is None or record['kind'] != 'video':
+            flash('Processing job not found', 'error')
             return redirect(url_for('index'))
         
-        # Find input file
-        input_files = [f for f in os.listdir(app.config['UPLOAD_FOLDER']) if f.startswith(file_id)]
-        if not input_files:
-            flash('Input file not found', 'error')
+        if progress['status'] == 'failed':
+            flash(f"Processing failed: {progress['error']}", 'error')
             return redirect(url_for('index'))
         
-        input_filename = input_files[0]
-        input_path = os.path.join(app.config['UPLOAD_FOLDER'], input_filename)
+        if progress['status'] != 'completed':
+            return render_template('processing.html',
+                                 file_id=file_id,
+                                 original_filename=record['filename'] or 'Unknown',
+                                 progress=progress)
         
-        # Generate output filename
-        output_filename = f"processed_{file_id}.mp4"
-        output_path = os.path.join(app.config['PROCESSED_FOLDER'], output_filename)
-        
-        # Process video
-        logging.info(f"Starting video processing for {input_filename}")
-        results = processor.process_video(input_path, output_path, heatmap_gen)
-        
-        # Store results in session
-        session['results'] = results
-        session['output_filename'] = output_filename
-        
-        logging.info(f"Video processing completed: {results}")
+        output_path = job_store.get_artifact(file_id, 'output')
         return render_template('results.html', 
-                             results=results, 
+                             results=job_results(file_id), 
                              file_id=file_id,
-                             original_filename=session.get('original_filename', 'Unknown'),
-                             output_filename=output_filename)
+                             original_filename=record['filename'] or 'Unknown',
+                             output_filename=os.path.basename(output_path))
         
     except Exception as e:
         logging.error(f"Processing error: {str(e)}")
@@ -169,24 +613,18 @@ def process_video(file_id):
 def download_video(file_id):
     """Download processed video"""
     try:
-        # Validate session
-        if 'file_id' not in session or session['file_id'] != file_id:
-            flash('Invalid session or file ID', 'error')
-            return redirect(url_for('index'))
-        
-        output_filename = session.get('output_filename')
-        if not output_filename:
+        record = client_job(file_id)
+        output_path = job_store.get_artifact(file_id, 'output')
+        if record is None or record['status'] != 'completed' or not output_path:
             flash('No processed video available', 'error')
             return redirect(url_for('index'))
         
-        output_path = os.path.join(app.config['PROCESSED_FOLDER'], output_filename)
-        
         if not os.path.exists(output_path):
             flash('Processed video file not found', 'error')
             return redirect(url_for('index'))
         
-        return send_file(output_path, as_attachment=True, 
-                        download_name=f"crowd_detection_{session.get('original_filename', 'video.mp4')}")
+        return send_file(os.path.abspath(output_path), as_attachment=True, 
+                        download_name=f"crowd_detection_{record['filename'] or 'video.mp4'}")
         
     except Exception as e:
         logging.error(f"Download error: {str(e)}")
@@ -195,10 +633,302 @@ def download_video(file_id):
 
 @app.route('/progress/<file_id>')
 def get_progress(file_id):
-    """Get processing progress (for future real-time updates)"""
-    # This endpoint can be used for real-time progress updates
-    # For now, we'll return a simple status
-    return jsonify({'status': 'processing', 'progress': 50})
+    """Get real processing progress for a job"""
+    progress = job_progress(file_id) if client_job(file_id) is not None else None
+    if progress is None:
+        return jsonify({'status': 'not_found', 'progress': 0}), 404
+    
+    if os.path.exists(playlist_path(file_id)):
+        # Playable while later segments are still being processed
+        progress['playlist_url'] = url_for('stream_media', file_id=file_id, filename=os.path.basename(playlist_path(file_id)))
+    return jsonify(progress)
+
+@app.route('/video/<file_id>')
+def play_video(file_id):
+    """Serve the processed video inline, with Range and conditional request support"""
+    output_path = job_store.get_artifact(file_id, 'output')
+    if not output_path or client_job(file_id) is None:
+        return jsonify({'status': 'not_found'}), 404
+    directory, output_filename = os.path.split(os.path.abspath(output_path))
+    # Only sends the requested byte ranges, or 304 when the client's copy is current
+    return send_from_directory(directory, output_filename,
+                               mimetype='video/mp4', conditional=True, max_age=3600)
+
+@app.route('/media/<file_id>/<filename>')
+def stream_media(file_id, filename):
+    """Serve a job's HLS playlist and segments, while and after it is processed"""
+    if job_store.get_artifact(file_id, 'media') is None or client_job(file_id) is None:
+        return jsonify({'status': 'not_found'}), 404
+    playlist = os.path.abspath(playlist_path(file_id))
+    if not os.path.exists(playlist):
+        return jsonify({'status': 'not_found'}), 404
+    directory, playlist_name = os.path.split(playlist)
+    
+    if filename == playlist_name:
+        # The playlist grows until processing finishes; always revalidate it
+        response = send_from_directory(directory, playlist_name, mimetype='application/vnd.apple.mpegurl',
+                                       conditional=True, max_age=0)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    
+    # Segments are only served once listed, i.e. fully written; they never change after that
+    with open(playlist) as f:
+        listed = filename in f.read().splitlines()
+    if not listed:
+        return jsonify({'status': 'not_found'}), 404
+    response = send_from_directory(directory, filename, mimetype='video/mp2t',
+                                   conditional=True, max_age=86400)
+    response.headers['Cache-Control'] = 'public, max-age=86400, immutable'
+    return response
+
+@app.route('/api/analyze', methods=['POST'])
+def api_analyze():
+    """Queue a stats-only analysis (no output video) and return its job ID"""
+    try:
+        file = request.files.get('video')
+        if file is None or file.filename == '':
+            return jsonify({'status': 'error', 'message': 'No file received'}), 400
+        if not allowed_file(file.filename):
+            return jsonify({'status': 'error', 'message': 'Invalid file type'}), 400
+        try:
+            zones = parse_zones_option(request.form.get('zones'))
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': f'Invalid zones: {e}'}), 400
+        
+        # Save file
+        job_id = str(uuid.uuid4())
+        file_extension = secure_filename(file.filename).rsplit('.', 1)[1].lower()
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}.{file_extension}")
+        file.save(file_path)
+        
+        # Queue analysis job
+        job = Job(job_id, file_path, None, client_id=request.remote_addr,
+                  options={'analytics_only': True,
+                           'profile': parse_profile(request.form.get('profile')),
+                           'zones': zones},
+                  filename=secure_filename(file.filename))
+        try:
+            job_manager.submit(job)
+        except JobQueueFull as e:
+            os.remove(file_path)
+            return jsonify({'status': 'error', 'message': str(e)}), 503
+        schedule_cleanup()
+        
+        logging.info(f"Analysis queued: {job_id}")
+        return jsonify({
+            'status': job.status,
+            'job_id': job_id,
+            'status_url': url_for('api_analysis_status', job_id=job_id)
+        }), 202
+        
+    except Exception as e:
+        logging.error(f"Analysis upload error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/analyze/<job_id>')
+def api_analysis_status(job_id):
+    """Get analysis progress, and the results once completed"""
+    status = job_progress(job_id) if client_job(job_id) is not None else None
+    if status is None:
+        return jsonify({'status': 'not_found', 'progress': 0}), 404
+    
+    if status['status'] == 'completed':
+        status['results'] = job_results(job_id)
+    return jsonify(status)
+
+@app.route('/api/timeline/<job_id>')
+def api_job_timeline(job_id):
+    """
+    Get a job's people count timeline at the resolution that suits a zoom range
+    
+    Query parameters start and end (seconds) select the range, max_points the
+    maximum number of buckets (per-second, 10-second or per-minute) returned.
+    """
+    from utils.timeline import DensityTimeline
+    
+    path = timeline_path(job_id)
+    if not os.path.exists(path) or client_job(job_id) is None:
+        return jsonify({'status': 'not_found'}), 404
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    max_points = min(request.args.get('max_points', 500, type=int), 5000)
+    if max_points < 1:
+        return jsonify({'status': 'error', 'message': 'max_points must be positive'}), 400
+    
+    timeline = DensityTimeline.load(path).query(start, end, max_points)
+    timeline['status'] = 'completed'
+    response = jsonify(timeline)
+    # A finished job's timeline never changes
+    response.headers['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+@app.route('/api/profile/<job_id>')
+def api_job_profile(job_id):
+    """Download the cProfile stats of a profiled job (open with pstats or snakeviz)"""
+    path = job_store.get_artifact(job_id, 'profile')
+    if path is None or not os.path.exists(path) or client_job(job_id) is None:
+        return jsonify({'status': 'not_found'}), 404
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=f"profile_{job_id}.prof")
+
+@app.route('/api/jobs')
+def api_list_jobs():
+    """
+    List the requesting client's jobs, newest first
+    
+    Query parameters status, kind ('video' or 'analysis'), since and until
+    (Unix times) and min_people (peak people count) filter the jobs; limit
+    and offset page through them.
+    """
+    limit = request.args.get('limit', 50, type=int)
+    offset = request.args.get('offset', 0, type=int)
+    if not 1 <= limit <= 500 or offset < 0:
+        return jsonify({'status': 'error', 'message': 'limit must be 1-500 and offset not negative'}), 400
+    
+    jobs = job_store.list_jobs(client_id=request.remote_addr,
+                               status=request.args.get('status'),
+                               kind=request.args.get('kind'),
+                               since=request.args.get('since', type=float),
+                               until=request.args.get('until', type=float),
+                               min_people=request.args.get('min_people', type=int),
+                               limit=limit, offset=offset)
+    return jsonify({'jobs': jobs, 'limit': limit, 'offset': offset})
+
+@app.route('/api/jobs/<job_id>')
+def api_job(job_id):
+    """Get a job's record and progress, and its results once completed"""
+    record = client_job(job_id)
+    progress = job_progress(job_id)
+    if record is None or progress is None:
+        return jsonify({'status': 'not_found'}), 404
+    
+    record.update(progress)
+    if record['status'] == 'completed':
+        record['results'] = job_results(job_id)
+    return jsonify(record)
+
+@app.route('/api/jobs/<job_id>/frames')
+def api_job_frames(job_id):
+    """
+    Get a completed job's per-frame statistics
+    
+    Query parameters start and end (frame numbers, inclusive) select the
+    range; at most limit frames are returned.
+    """
+    if client_job(job_id) is None:
+        return jsonify({'status': 'not_found'}), 404
+    limit = min(request.args.get('limit', 10000, type=int), 100000)
+    frames = job_store.get_frame_stats(job_id, request.args.get('start', type=int),
+                                       request.args.get('end', type=int), limit=max(limit, 0))
+    return jsonify({'job_id': job_id, 'frame_statistics': frames})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Processing metrics across jobs in the Prometheus text format"""
+    gauges = job_manager.get_stats()
+    if 'detector' in _components:
+        # Don't load the detector just to report on it
+        pool = _components['detector'].get_stats()
+        gauges['detector_pool_size'] = pool['size']
+        gauges['detectors_in_use'] = pool['in_use']
+    with streams_lock:
+        gauges['active_streams'] = sum(1 for stream in streams.values() if stream.running)
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/streams', methods=['POST'])
+def api_start_stream():
+    """Start analyzing a live video source"""
+    from utils.stream_processor import StreamProcessor, FRAME_POLICIES
+    
+    if not STREAM_SOURCE_PREFIXES:
+        return jsonify({'status': 'error', 'message': 'Live streams are not enabled on this server'}), 403
+    
+    params = request.get_json(silent=True) or {}
+    source = str(params.get('source', ''))
+    if source and '://' not in source and not source.isdigit():
+        # Resolve '..' and symlinks before checking local paths against the allowed prefixes
+        source = os.path.realpath(source)
+    if not source.startswith(STREAM_SOURCE_PREFIXES):
+        return jsonify({'status': 'error', 'message': 'Unsupported stream source'}), 400
+    
+    try:
+        window_seconds = float(params.get('window_seconds', 60))
+        latency_budget = float(params.get('latency_budget', 0.5))
+        frame_policy = params.get('frame_policy', 'drop_oldest')
+        if window_seconds <= 0 or latency_budget <= 0 or frame_policy not in FRAME_POLICIES:
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'Invalid stream parameters'}), 400
+    
+    with streams_lock:
+        # Streams that ended on their own only hold their last frame and heatmap by now
+        ended = [stream_id for stream_id, stream in streams.items() if not stream.running]
+        ended = [streams.pop(stream_id) for stream_id in ended]
+        if len(streams) + len(starting_streams) >= MAX_STREAMS:
+            return jsonify({'status': 'error', 'message': 'Too many active streams'}), 503
+        stream_id = str(uuid.uuid4())
+        starting_streams.add(stream_id)
+    for stream in ended:
+        stream.stop()
+    
+    # Connecting can take as long as FFmpeg's timeout; don't hold up the other stream endpoints
+    stream = StreamProcessor(source, get_detector(), window_seconds=window_seconds,
+                             latency_budget=latency_budget, frame_policy=frame_policy)
+    try:
+        stream.start()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    finally:
+        with streams_lock:
+            starting_streams.discard(stream_id)
+            if stream.status != 'created':
+                streams[stream_id] = stream
+    
+    logging.info(f"Stream {stream_id} started: {source}")
+    return jsonify({
+        'status': stream.status,
+        'stream_id': stream_id,
+        'status_url': url_for('api_stream_status', stream_id=stream_id),
+        'frame_url': url_for('api_stream_frame', stream_id=stream_id)
+    }), 201
+
+@app.route('/api/streams/<stream_id>', methods=['GET'])
+def api_stream_status(stream_id):
+    """Get rolling-window statistics of a stream (final ones, once, if it has ended)"""
+    stream = streams.get(stream_id)
+    if stream is None:
+        return jsonify({'status': 'not_found'}), 404
+    if not stream.running:
+        with streams_lock:
+            streams.pop(stream_id, None)
+        stream.stop()
+    return jsonify(stream.get_stats())
+
+@app.route('/api/streams/<stream_id>/frame')
+def api_stream_frame(stream_id):
+    """Get the latest analyzed frame of a stream as a JPEG image"""
+    import cv2
+    
+    stream = streams.get(stream_id)
+    if stream is None:
+        return jsonify({'status': 'not_found'}), 404
+    
+    frame = stream.render_latest()
+    if frame is None:
+        return '', 204
+    ok, encoded = cv2.imencode('.jpg', frame)
+    if not ok:
+        return jsonify({'status': 'error', 'message': 'Could not encode frame'}), 500
+    return Response(encoded.tobytes(), mimetype='image/jpeg')
+
+@app.route('/api/streams/<stream_id>', methods=['DELETE'])
+def api_stop_stream(stream_id):
+    """Stop a stream and return its final statistics"""
+    with streams_lock:
+        stream = streams.pop(stream_id, None)
+    if stream is None:
+        return jsonify({'status': 'not_found'}), 404
+    stream.stop()
+    return jsonify(stream.get_stats())
 
 @app.errorhandler(413)
 def file_too_large(e):
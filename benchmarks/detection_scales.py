@@ -0,0 +1,132 @@
+"""
+Benchmark YOLODetector speed versus recall at different inference settings
+
+Detections at native resolution (no tiling) are the reference; every other
+configuration is scored by how many reference boxes it finds (IoU >= 0.5).
+
+Usage:
+    python -m benchmarks.detection_scales VIDEO [--frames 30]
+        [--widths 1280 960 640] [--tile-sizes 640 960] [--json results.json]
+"""
+import argparse
+import json
+import logging
+import time
+
+import cv2
+import numpy as np
+
+from utils.detection import YOLODetector
+
+
+def load_frames(video_path, num_frames):
+    """Read evenly spaced frames from a video"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video file: {video_path}")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or num_frames
+    frames = []
+    for index in np.linspace(0, max(total - 1, 0), num_frames).astype(int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+        ret, frame = cap.read()
+        if ret:
+            frames.append(frame)
+    cap.release()
+    return frames
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU between two sets of [x1, y1, x2, y2] boxes"""
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-6)
+
+
+def count_matches(reference, candidate, threshold=0.5):
+    """Number of reference boxes matched one-to-one by candidate boxes"""
+    if not reference or not candidate:
+        return 0
+    iou = iou_matrix(reference.boxes.astype(np.float32), candidate.boxes.astype(np.float32))
+    matched = 0
+    used = set()
+    for row in iou:
+        for col in np.argsort(-row):
+            if row[col] < threshold:
+                break
+            if col not in used:
+                used.add(col)
+                matched += 1
+                break
+    return matched
+
+
+def run_config(detector, frames):
+    """Detect on every frame, returning detections and per-frame latency in ms"""
+    detector.detect_people(frames[0])  # warm up
+    detections, latencies = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        detections.append(detector.detect_people(frame))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return detections, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video', help='Input video')
+    parser.add_argument('--frames', type=int, default=30, help='Number of frames to sample')
+    parser.add_argument('--widths', type=int, nargs='*', default=[1280, 960, 640],
+                        help='Inference widths to compare')
+    parser.add_argument('--tile-sizes', type=int, nargs='*', default=[640],
+                        help='Tile sizes to compare at native resolution')
+    parser.add_argument('--model', default='hog', help='Detector model_name')
+    parser.add_argument('--json', help='Also write results to this JSON file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    frames = load_frames(args.video, args.frames)
+    if not frames:
+        raise SystemExit("No frames could be read")
+    height, width = frames[0].shape[:2]
+
+    configs = [('native', {})]
+    configs += [(f'width={w}', {'inference_width': w}) for w in args.widths if w != width]
+    configs += [(f'tile={t}', {'tile_size': t}) for t in args.tile_sizes]
+
+    reference = None
+    rows = []
+    for name, options in configs:
+        detections, latencies = run_config(YOLODetector(model_name=args.model, **options), frames)
+        if reference is None:
+            reference = detections
+        ref_total = sum(len(d) for d in reference)
+        found_total = sum(len(d) for d in detections)
+        matched = sum(count_matches(r, d) for r, d in zip(reference, detections))
+        rows.append({
+            'config': name,
+            'options': options,
+            'mean_ms': round(float(np.mean(latencies)), 2),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+            'fps': round(1000 / float(np.mean(latencies)), 2),
+            'detections': found_total,
+            'recall': round(matched / ref_total, 3) if ref_total else None,
+            'precision': round(matched / found_total, 3) if found_total else None
+        })
+
+    print(f"{args.video}: {width}x{height}, {len(frames)} frames, "
+          f"{sum(len(d) for d in reference)} reference detections")
+    print(f"{'config':<14}{'mean ms':>10}{'p95 ms':>10}{'fps':>8}{'dets':>7}{'recall':>9}{'precision':>11}")
+    for row in rows:
+        print(f"{row['config']:<14}{row['mean_ms']:>10}{row['p95_ms']:>10}{row['fps']:>8}"
+              f"{row['detections']:>7}{str(row['recall']):>9}{str(row['precision']):>11}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'video': args.video, 'resolution': f"{width}x{height}", 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+"""
+Benchmark the processing pipeline on synthetic videos
+
+For every combination of resolution and crowd density a synthetic video is
+generated (see benchmarks.synthetic) and the main stages are timed on its
+frames: YOLODetector.detect_people (and detect_people_batch, per frame),
+HeatmapGenerator.update_heatmap,
+generate_heatmap_overlay and draw_detections (the last three with the
+video's ground-truth boxes), followed by an end-to-end
+VideoProcessor.process_video run. Each scenario runs in a fresh process so
+its peak RSS can be reported.
+
+Usage:
+    python -m benchmarks.pipeline [--sizes 640x360 1280x720] [--people 5 25]
+        [--frames 60] [--model hog|cascade|MODEL.onnx] [--batch-size 8]
+        [--json results.json] [--compare baseline.json] [--threshold 0.15]
+
+With --compare, every latency, fps and memory figure is checked against the
+baseline file (a previous --json output) and the command exits with status
+1 if any of them regressed by more than the threshold.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import generate_video, parse_size
+
+STAGES = ('detect_people', 'detect_people_batch', 'update_heatmap', 'generate_heatmap_overlay', 'draw_detections')
+
+
+def summarize(latencies):
+    """p50/p95/mean of a list of latencies in seconds, in ms"""
+    ms = np.array(latencies) * 1000
+    return {
+        'calls': len(ms),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'mean_ms': round(float(np.mean(ms)), 3)
+    }
+
+
+def timed(fn, *args, **kwargs):
+    """Call fn, returning (result, elapsed seconds)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_scenario(scenario):
+    """
+    Generate one synthetic video and benchmark every stage on it
+
+    Args:
+        scenario: Dictionary with name, size, frames, people, detect_frames,
+            batch_size, model and seed
+
+    Returns:
+        Dictionary with per-stage latency summaries, end-to-end fps and peak RSS
+    """
+    from utils.detection import YOLODetector
+    from utils.heatmap import HeatmapGenerator
+    from utils.video_processor import VideoProcessor
+
+    logging.basicConfig(level=logging.WARNING)
+    width, height = scenario['size']
+    with tempfile.TemporaryDirectory(prefix='crowdpulse_bench_') as tmp_dir:
+        video_path = os.path.join(tmp_dir, 'input.mp4')
+        ground_truth = generate_video(video_path, (width, height), scenario['frames'],
+                                      scenario['people'], seed=scenario['seed'])
+
+        frames = []
+        cap = cv2.VideoCapture(video_path)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+
+        detector = YOLODetector(model_name=scenario['model'])
+        heatmap_generator = HeatmapGenerator()
+        heatmap_generator.initialize_heatmap(frames[0].shape)
+        latencies = {stage: [] for stage in STAGES}
+
+        # The detector is the slowest stage; time it on evenly spaced frames
+        detector.detect_people(frames[0])  # warm up
+        sample = np.linspace(0, len(frames) - 1, min(scenario['detect_frames'], len(frames))).astype(int)
+        detected = 0
+        for index in sample:
+            detections, elapsed = timed(detector.detect_people, frames[index])
+            latencies['detect_people'].append(elapsed)
+            detected += len(detections)
+        
+        # Batched detection (one forward pass per batch with ONNX models), per frame
+        batch_size = scenario['batch_size']
+        for start in range(0, len(sample), batch_size):
+            batch = [frames[index] for index in sample[start:start + batch_size]]
+            _, elapsed = timed(detector.detect_people_batch, batch)
+            latencies['detect_people_batch'] += [elapsed / len(batch)] * len(batch)
+
+        for frame, detections in zip(frames, ground_truth):
+            centers = detector.get_person_centers(detections)
+            _, elapsed = timed(heatmap_generator.update_heatmap, centers)
+            latencies['update_heatmap'].append(elapsed)
+            drawn, elapsed = timed(detector.draw_detections, frame, detections)
+            latencies['draw_detections'].append(elapsed)
+            _, elapsed = timed(heatmap_generator.generate_heatmap_overlay, drawn, alpha=0.3)
+            latencies['generate_heatmap_overlay'].append(elapsed)
+
+        processor = VideoProcessor(detector)
+        _, elapsed = timed(processor.process_video, video_path, os.path.join(tmp_dir, 'output.mp4'),
+                           HeatmapGenerator())
+
+    return {
+        'name': scenario['name'],
+        'resolution': f"{width}x{height}",
+        'frames': len(frames),
+        'people': scenario['people'],
+        'detections_per_frame': round(detected / len(sample), 2),
+        'stages': {stage: summarize(values) for stage, values in latencies.items()},
+        'end_to_end': {
+            'seconds': round(elapsed, 3),
+            'fps': round(len(frames) / elapsed, 2)
+        },
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def environment():
+    """Versions and hardware the benchmark ran on"""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Find metrics that got worse than the baseline by more than threshold
+
+    Returns:
+        List of (scenario, metric, baseline value, current value) tuples
+    """
+    previous = {scenario['name']: scenario for scenario in baseline['scenarios']}
+    regressions = []
+    for scenario in results['scenarios']:
+        base = previous.get(scenario['name'])
+        if base is None:
+            continue
+
+        # (metric, current, baseline, higher is better)
+        checks = [('end_to_end.fps', scenario['end_to_end']['fps'], base['end_to_end']['fps'], True),
+                  ('peak_rss_mb', scenario['peak_rss_mb'], base['peak_rss_mb'], False)]
+        for stage, stats in scenario['stages'].items():
+            if stage in base['stages']:
+                for key in ('p50_ms', 'p95_ms'):
+                    checks.append((f"{stage}.{key}", stats[key], base['stages'][stage][key], False))
+
+        for metric, current, previous_value, higher_is_better in checks:
+            if higher_is_better:
+                regressed = current < previous_value * (1 - threshold)
+            else:
+                regressed = current > previous_value * (1 + threshold)
+            if regressed:
+                regressions.append((scenario['name'], metric, previous_value, current))
+    return regressions
+
+
+def print_results(results):
+    """Print a summary table"""
+    print(f"{'scenario':<22}{'e2e fps':>9}{'rss MB':>9}  " +
+          ''.join(f"{stage + ' p50/p95':>34}" for stage in STAGES))
+    for scenario in results['scenarios']:
+        row = f"{scenario['name']:<22}{scenario['end_to_end']['fps']:>9}{scenario['peak_rss_mb']:>9}  "
+        for stage in STAGES:
+            stats = scenario['stages'][stage]
+            row += f"{stats['p50_ms']:>24.2f} /{stats['p95_ms']:>8.2f}"
+        print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=parse_size, nargs='*', default=[(640, 360), (1280, 720)],
+                        help='Resolutions as WIDTHxHEIGHT')
+    parser.add_argument('--people', type=int, nargs='*', default=[5, 25], help='Crowd densities')
+    parser.add_argument('--frames', type=int, default=60, help='Frames per video')
+    parser.add_argument('--detect-frames', type=int, default=10,
+                        help='Frames to time detect_people on')
+    parser.add_argument('--model', default='hog', help='Detector model_name (hog, cascade or an .onnx path)')
+    parser.add_argument('--batch-size', type=int, default=8, help='Frames per detect_people_batch call')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic videos')
+    parser.add_argument('--json', help='Write results to this JSON file')
+    parser.add_argument('--compare', help='Baseline JSON file to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='Relative change that counts as a regression')
+    args = parser.parse_args()
+
+    scenarios = [{
+        'name': f"{width}x{height}-{people}p-{args.frames}f",
+        'size': (width, height),
+        'frames': args.frames,
+        'people': people,
+        'detect_frames': args.detect_frames,
+        'batch_size': args.batch_size,
+        'model': args.model,
+        'seed': args.seed
+    } for width, height in args.sizes for people in args.people]
+
+    # A fresh process per scenario, so peak RSS is the scenario's own
+    ctx = multiprocessing.get_context('spawn')
+    results = {'environment': environment(), 'scenarios': []}
+    for scenario in scenarios:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+            results['scenarios'].append(executor.submit(run_scenario, scenario).result())
+        print(f"Finished {scenario['name']}", file=sys.stderr)
+
+    print_results(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for name, metric, previous_value, current in regressions:
+                print(f"  {name} {metric}: {previous_value} -> {current}")
+            sys.exit(1)
+        print(f"\nNo regressions over {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
@@ -23,15 +23,179 @@ function showAlert(message, type) {
     }, 5000);
 }
 
+// Poll job progress on the processing page until the job finishes
+function checkProcessingStatus(statusElement) {
+    const progressUrl = statusElement.dataset.progressUrl;
+    const resultsUrl = statusElement.dataset.resultsUrl;
+    const bar = document.getElementById('processingBar');
+    const frames = document.getElementById('processingFrames');
+    const fps = document.getElementById('processingFps');
+    const eta = document.getElementById('processingEta');
+    const message = document.getElementById('processingMessage');
+    
+    fetch(progressUrl)
+        .then(response => response.json())
+        .then(data => {
+            if (data.status === 'completed' || data.status === 'failed' || data.status === 'not_found') {
+                window.location.href = resultsUrl;
+                return;
+            }
+            
+            bar.style.width = data.progress + '%';
+            frames.textContent = `${data.frames_processed} / ${data.total_frames}`;
+            fps.textContent = data.fps;
+            eta.textContent = data.eta_seconds !== null ? `${Math.ceil(data.eta_seconds)}s` : '--';
+            
+            if (data.playlist_url) {
+                showLivePreview(data.playlist_url);
+            }
+            
+            if (data.status === 'queued') {
+                const position = data.queue_position !== null ? data.queue_position + 1 : '?';
+                message.textContent = `Queued (position ${position}), waiting for a free worker...`;
+            } else {
+                message.textContent = `Processing... ${data.progress}% complete`;
+            }
+            
+            setTimeout(() => checkProcessingStatus(statusElement), 1000);
+        })
+        .catch(() => {
+            setTimeout(() => checkProcessingStatus(statusElement), 3000);
+        });
+}
+
+// Play the HLS playlist of the video being processed, natively where the
+// browser supports HLS (Safari) and through hls.js elsewhere
+function showLivePreview(playlistUrl) {
+    const card = document.getElementById('livePreviewCard');
+    const video = document.getElementById('livePreview');
+    if (!card || !video || video.dataset.playlistUrl) {
+        return;
+    }
+    
+    if (video.canPlayType('application/vnd.apple.mpegurl')) {
+        video.src = playlistUrl;
+    } else if (window.Hls && Hls.isSupported()) {
+        const hls = new Hls();
+        hls.loadSource(playlistUrl);
+        hls.attachMedia(video);
+    } else {
+        return;
+    }
+    video.dataset.playlistUrl = playlistUrl;
+    card.classList.remove('d-none');
+}
+
+// Draw the people count timeline on the results page: the min-max range,
+// 95th percentile and mean per bucket. Drag to zoom in, double-click to reset.
+function loadTimeline(chartElement, start, end) {
+    const width = chartElement.clientWidth || 800;
+    const height = 220;
+    const params = new URLSearchParams({max_points: Math.max(50, Math.floor(width / 3))});
+    if (start !== undefined) {
+        params.set('start', start);
+        params.set('end', end);
+    }
+    
+    fetch(`${chartElement.dataset.timelineUrl}?${params}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.status !== 'completed') {
+                return;
+            }
+            const buckets = data.buckets;
+            const count = buckets.start.length;
+            const span = Math.max(data.end - data.start, data.bucket_seconds);
+            const peak = Math.max(1, ...buckets.max);
+            const x = t => ((t - data.start) / span) * width;
+            const y = v => height - 20 - (v / peak) * (height - 30);
+            const mid = i => buckets.start[i] + data.bucket_seconds / 2;
+            const line = values => values.map((v, i) => `${x(mid(i)).toFixed(1)},${y(v).toFixed(1)}`).join(' ');
+            
+            let band = '';
+            if (count) {
+                const upper = line(buckets.max);
+                const lower = line(buckets.min).split(' ').reverse().join(' ');
+                band = `<polygon points="${upper} ${lower}" fill="rgba(13, 110, 253, 0.25)"></polygon>`;
+            }
+            chartElement.innerHTML = `
+                <svg width="${width}" height="${height}" style="cursor: crosshair;">
+                    ${band}
+                    <polyline points="${line(buckets.p95)}" fill="none" stroke="#ffc107" stroke-width="1"></polyline>
+                    <polyline points="${line(buckets.mean)}" fill="none" stroke="#0dcaf0" stroke-width="2"></polyline>
+                    <text x="4" y="12" fill="currentColor" font-size="11">${peak} people</text>
+                    <text x="4" y="${height - 4}" fill="currentColor" font-size="11">${data.start.toFixed(0)}s</text>
+                    <text x="${width - 4}" y="${height - 4}" fill="currentColor" font-size="11" text-anchor="end">${data.end.toFixed(0)}s</text>
+                    <rect class="timeline-selection" y="0" height="${height}" width="0" fill="rgba(255, 255, 255, 0.15)"></rect>
+                </svg>`;
+            
+            const legend = document.getElementById('timelineResolution');
+            if (legend) {
+                legend.textContent = `${data.bucket_seconds}s buckets`;
+            }
+            
+            // Drag across the chart to zoom into that range
+            const svg = chartElement.querySelector('svg');
+            const selection = chartElement.querySelector('.timeline-selection');
+            let dragStart = null;
+            const toTime = px => data.start + (px / width) * span;
+            svg.addEventListener('mousedown', event => {
+                dragStart = event.offsetX;
+                selection.setAttribute('x', dragStart);
+                selection.setAttribute('width', 0);
+            });
+            svg.addEventListener('mousemove', event => {
+                if (dragStart !== null) {
+                    selection.setAttribute('x', Math.min(dragStart, event.offsetX));
+                    selection.setAttribute('width', Math.abs(event.offsetX - dragStart));
+                }
+            });
+            svg.addEventListener('mouseup', event => {
+                if (dragStart === null) {
+                    return;
+                }
+                const from = Math.min(dragStart, event.offsetX);
+                const to = Math.max(dragStart, event.offsetX);
+                dragStart = null;
+                if (to - from > 5) {
+                    loadTimeline(chartElement, toTime(from), toTime(to));
+                }
+            });
+            svg.addEventListener('dblclick', () => loadTimeline(chartElement));
+        })
+        .catch(() => {
+            chartElement.textContent = 'Timeline unavailable';
+        });
+}
+
 document.addEventListener('DOMContentLoaded', function() {
+    // Processing page only needs status polling
+    const processingStatus = document.getElementById('processingStatus');
+    if (processingStatus) {
+        checkProcessingStatus(processingStatus);
+        return;
+    }
+    
+    // Results page only needs the timeline chart
+    const timelineChart = document.getElementById('timelineChart');
+    if (timelineChart) {
+        loadTimeline(timelineChart);
+        return;
+    }
+    
     const uploadForm = document.getElementById('uploadForm');
     const uploadBtn = document.getElementById('uploadBtn');
     const uploadProgress = document.getElementById('uploadProgress');
     const progressBar = document.getElementById('progressBar');
     const videoFile = document.getElementById('videoFile');
     
-    // File size limit (25MB)
-    const MAX_FILE_SIZE = 25 * 1024 * 1024;
+    // File size limit, set by the server
+    const MAX_FILE_SIZE = parseInt(uploadForm.dataset.maxSize, 10);
+    const MAX_FILE_SIZE_LABEL = formatFileSize(MAX_FILE_SIZE);
+    
+    // Chunked uploads: chunks stay below the server's per-request limit
+    const CHUNK_SIZE = 8 * 1024 * 1024;
+    const MAX_RETRIES = 5;
     
     // Supported video formats
     const SUPPORTED_FORMATS = [
@@ -76,7 +240,7 @@ document.addEventListener('DOMContentLoaded', function() {
     function validateFile(file) {
         // Check file size
         if (file.size > MAX_FILE_SIZE) {
-            showAlert('File size exceeds 25MB limit. Please choose a smaller file.', 'error');
+            showAlert(`File size exceeds ${MAX_FILE_SIZE_LABEL} limit. Please choose a smaller file.`, 'error');
             return false;
         }
         
@@ -111,36 +275,105 @@ document.addEventListener('DOMContentLoaded', function() {
         videoFile.parentNode.appendChild(fileInfo);
     }
     
-    function startUpload() {
+    async function startUpload() {
         // Disable form and show progress
         uploadBtn.disabled = true;
         uploadBtn.innerHTML = '<span class="loading-spinner"></span> Uploading...';
         uploadProgress.style.display = 'block';
         
-        // Simulate progress
-        simulateProgress();
+        const file = videoFile.files[0];
+        try {
+            const upload = await resumeOrCreateUpload(file);
+            const status = await sendChunks(file, upload);
+            localStorage.removeItem(uploadKey(file));
+            window.location.href = status.process_url;
+        } catch (error) {
+            showAlert(`Upload failed: ${error.message}`, 'error');
+            uploadBtn.disabled = false;
+            uploadBtn.innerHTML = '<i class="fas fa-play"></i> Start Analysis';
+        }
+    }
+    
+    // Uploads are remembered per file, so a reload resumes instead of starting over
+    function uploadKey(file) {
+        return `crowdpulse-upload:${file.name}:${file.size}:${file.lastModified}`;
+    }
+    
+    async function resumeOrCreateUpload(file) {
+        const uploadUrl = localStorage.getItem(uploadKey(file));
+        if (uploadUrl) {
+            const response = await fetch(uploadUrl, { cache: 'no-store' });
+            if (response.ok) {
+                return response.json();
+            }
+        }
         
-        // Submit form after short delay
-        setTimeout(() => {
-            uploadForm.submit();
-        }, 1000);
+        const formData = new FormData(uploadForm);
+        const response = await fetch(uploadForm.dataset.uploadsUrl, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                filename: file.name,
+                size: file.size,
+                overlay_alpha: formData.get('overlay_alpha'),
+                profile: formData.get('profile')
+            })
+        });
+        const upload = await response.json();
+        if (!response.ok) {
+            throw new Error(upload.message || response.statusText);
+        }
+        localStorage.setItem(uploadKey(file), upload.upload_url);
+        return upload;
     }
     
-    function simulateProgress() {
-        let progress = 0;
-        const interval = setInterval(() => {
-            progress += Math.random() * 10;
-            if (progress > 90) {
-                progress = 90;
+    async function sendChunks(file, upload) {
+        let status = upload;
+        let retries = 0;
+        
+        // An empty chunk at the final offset retries queueing the job
+        while (!status.complete || !status.process_url) {
+            const offset = status.offset;
+            progressBar.style.width = (offset / file.size * 100) + '%';
+            
+            let response;
+            try {
+                response = await fetch(upload.upload_url, {
+                    method: 'PATCH',
+                    headers: {
+                        'Upload-Offset': String(offset),
+                        'Content-Type': 'application/offset+octet-stream'
+                    },
+                    body: file.slice(offset, offset + CHUNK_SIZE)
+                });
+            } catch (error) {
+                response = null;
             }
             
-            progressBar.style.width = progress + '%';
+            if (response && (response.ok || response.status === 409)) {
+                // 409: the server has a different offset, continue from there
+                status = await response.json();
+                retries = 0;
+                continue;
+            }
+            if (response && response.status < 500) {
+                const body = await response.json().catch(() => ({}));
+                throw new Error(body.message || response.statusText);
+            }
             
-            if (progress >= 90) {
-                clearInterval(interval);
-                progressBar.className += ' progress-bar-striped progress-bar-animated';
+            // Network error or server busy: back off, then resume from the server's offset
+            if (++retries > MAX_RETRIES) {
+                throw new Error('Connection lost');
             }
-        }, 200);
+            await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** retries));
+            const current = await fetch(upload.upload_url, { cache: 'no-store' }).catch(() => null);
+            if (current && current.ok) {
+                status = await current.json();
+            }
+        }
+        
+        progressBar.style.width = '100%';
+        return status;
     }
     
     function initializeDragDrop() {
@@ -235,32 +468,6 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
     
-    // Progress tracking for results page
-    if (window.location.pathname.includes('/process/')) {
-        // Show processing status
-        const processingStatus = document.createElement('div');
-        processingStatus.className = 'alert alert-info text-center';
-        processingStatus.innerHTML = `
-            <div class="spinner-border text-primary" role="status">
-                <span class="visually-hidden">Loading...</span>
-            </div>
-            <p class="mt-2 mb-0">Processing video... This may take a few minutes.</p>
-        `;
-        
-        // Add to page if we're on processing page
-        const container = document.querySelector('.container');
-        if (container) {
-            container.insertBefore(processingStatus, container.firstElementChild);
-        }
-    }
-    
-    // Auto-refresh for processing status (if needed)
-    function checkProcessingStatus() {
-        // This function can be enhanced to check processing status via AJAX
-        // For now, it's a placeholder for future real-time updates
-        console.log('Checking processing status...');
-    }
-    
     // Initialize tooltips (if Bootstrap tooltips are used)
     const tooltipTriggerList = [].slice.call(document.querySelectorAll('[data-bs-toggle="tooltip"]'));
     const tooltipList = tooltipTriggerList.map(function(tooltipTriggerEl) {
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from utils import detection
+from utils.detection import DetectorPool, YOLODetector
+
+
+class StubHOG:
+    """HOG descriptor returning fixed windows and SVM margins, honouring hitThreshold"""
+
+    def __init__(self, margins):
+        self.margins = np.asarray(margins, dtype=np.float64)
+        self.hit_thresholds = []
+
+    def detectMultiScale(self, image, winStride, padding, scale, hitThreshold):
+        self.hit_thresholds.append(hitThreshold)
+        keep = self.margins >= hitThreshold
+        rects = np.array([[i * 100, 0, 64, 128] for i in range(len(self.margins))], dtype=np.int32)
+        return rects[keep], self.margins[keep].reshape(-1, 1)
+
+
+def detect_with_margins(margins, **kwargs):
+    detector = YOLODetector(**kwargs)
+    detector.hog = StubHOG(margins)
+    detections = detector.detect_people(np.zeros((256, 800, 3), dtype=np.uint8))
+    return detector, detections
+
+
+def test_default_hog_cutoff_is_margin_half():
+    detector, detections = detect_with_margins([0.2, 0.49, 0.5, 1.5])
+    assert detector.hog.hit_thresholds == [0.5]
+    assert len(detections.scores) == 2
+    assert detections.scores.min() == pytest.approx(1 / (1 + np.exp(-0.5)))
+
+
+def test_confidence_threshold_above_the_default_cutoff_filters_hog_boxes():
+    _, detections = detect_with_margins([0.5, 0.8, 1.5], confidence_threshold=0.7)
+    # sigmoid(0.8) is about 0.69
+    assert len(detections.scores) == 1
+    assert detections.scores[0] == pytest.approx(1 / (1 + np.exp(-1.5)))
+
+
+def test_pool_waiters_see_a_failed_creation(monkeypatch):
+    creating = threading.Event()
+    fail = threading.Event()
+
+    class FlakyDetector:
+        instances = 0
+
+        def __init__(self, **kwargs):
+            FlakyDetector.instances += 1
+            if FlakyDetector.instances > 1:
+                creating.set()
+                fail.wait(5)
+                raise RuntimeError("Failed to initialize detector")
+
+    monkeypatch.setattr(detection, 'YOLODetector', FlakyDetector)
+    pool = DetectorPool(size=2)
+    errors = []
+
+    def borrow():
+        try:
+            with pool.acquire():
+                pass
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    with pool.acquire():
+        creator = threading.Thread(target=borrow)
+        creator.start()
+        assert creating.wait(5)
+        # Both slots are taken, so this caller waits for the creation in progress
+        waiter = threading.Thread(target=borrow)
+        waiter.start()
+        deadline = time.monotonic() + 5
+        while pool.get_stats()['waits'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        fail.set()
+        creator.join(5)
+        waiter.join(5)
+        assert not creator.is_alive() and not waiter.is_alive()
+
+    assert errors == ["Failed to initialize detector"] * 2
+    assert pool.get_stats() == {'size': 2, 'created': 1, 'in_use': 0, 'waits': 1}
@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pytest
+
+from utils.detection import Detections
+from utils.detection_cache import DetectionCache
+
+CONFIG = {'model_name': 'hog', 'confidence_threshold': 0.5, 'hit_threshold': 0.5, 'tile_workers': 4,
+          'dnn_threads': None, 'roi_mask': None}
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / 'clip.mp4'
+    path.write_bytes(b'video content' * 100)
+    return str(path)
+
+
+def test_key_follows_content_not_file_name(tmp_path, video):
+    cache = DetectionCache(str(tmp_path / 'cache'))
+    copy = tmp_path / 'renamed.mp4'
+    copy.write_bytes(open(video, 'rb').read())
+    other = tmp_path / 'other.mp4'
+    other.write_bytes(b'other content')
+    assert cache.make_key(video, CONFIG) == cache.make_key(str(copy), CONFIG)
+    assert cache.make_key(video, CONFIG) != cache.make_key(str(other), CONFIG)
+
+
+@pytest.mark.parametrize('name, value', [('tile_workers', 1), ('dnn_threads', 8)])
+def test_speed_only_parameters_keep_the_key(tmp_path, video, name, value):
+    cache = DetectionCache(str(tmp_path / 'cache'))
+    assert cache.make_key(video, CONFIG) == cache.make_key(video, dict(CONFIG, **{name: value}))
+
+
+@pytest.mark.parametrize('name, value', [('confidence_threshold', 0.6), ('hit_threshold', 0.0),
+                                         ('roi_mask', np.ones((4, 4), dtype=np.uint8))])
+def test_result_parameters_change_the_key(tmp_path, video, name, value):
+    cache = DetectionCache(str(tmp_path / 'cache'))
+    assert cache.make_key(video, CONFIG) != cache.make_key(video, dict(CONFIG, **{name: value}))
+
+
+def test_store_and_load_round_trip(tmp_path, video):
+    cache = DetectionCache(str(tmp_path / 'cache'))
+    key = cache.make_key(video, CONFIG)
+    assert cache.load(key) is None
+
+    detections = {1: Detections([[0, 0, 10, 20], [5, 5, 15, 25]], [0.9, 0.7]), 4: Detections()}
+    cache.store(key, detections)
+    loaded = cache.load(key)
+    assert sorted(loaded) == [1, 4]
+    np.testing.assert_array_equal(loaded[1].boxes, detections[1].boxes)
+    np.testing.assert_allclose(loaded[1].scores, detections[1].scores)
+    assert len(loaded[4]) == 0
+    assert cache.get_stats()['hits'] == 1 and cache.get_stats()['misses'] == 1
+
+
+def test_evicts_least_recently_used_entries(tmp_path):
+    cache = DetectionCache(str(tmp_path / 'cache'), max_entries=2)
+    for age, key in enumerate(['a', 'b']):
+        cache.store(key, {1: Detections([[0, 0, 1, 1]], [0.9])})
+        os.utime(os.path.join(cache.cache_dir, f'{key}.npz'), (1000 + age, 1000 + age))
+
+    # Reading 'a' makes 'b' the least recently used entry
+    assert cache.load('a') is not None
+    cache.store('c', {1: Detections()})
+    assert cache.load('b') is None
+    assert cache.load('a') is not None and cache.load('c') is not None
+
+
+def test_evicts_down_to_the_size_limit(tmp_path):
+    cache = DetectionCache(str(tmp_path / 'cache'), max_bytes=1)
+    cache.store('a', {1: Detections([[0, 0, 1, 1]], [0.9])})
+    assert cache.get_stats()['entries'] == 0
@@ -0,0 +1,101 @@
+import threading
+
+import numpy as np
+
+from utils.encoding import EncodedVideoWriter
+
+
+class RecordingSink:
+    """Sink keeping what it was given: the array objects and a copy of their pixels"""
+
+    def __init__(self):
+        self.objects = []
+        self.frames = []
+        self.released = False
+
+    def isOpened(self):
+        return not self.released
+
+    def write(self, frame):
+        self.objects.append(frame)
+        self.frames.append(frame.copy())
+
+    def release(self):
+        self.released = True
+
+
+def frame(value, size=(32, 24)):
+    width, height = size
+    return np.full((height, width, 3), value, dtype=np.uint8)
+
+
+def test_borrowed_buffers_reach_the_sink_without_a_copy():
+    sink = RecordingSink()
+    writer = EncodedVideoWriter(sink, (32, 24), queue_size=2)
+    borrowed = []
+    for value in range(6):
+        buffer = writer.buffer((24, 32, 3))
+        buffer[:] = value
+        borrowed.append(buffer)
+        writer.write(buffer)
+    writer.release()
+
+    assert [int(f[0, 0, 0]) for f in sink.frames] == list(range(6))
+    assert all(written is lent for written, lent in zip(sink.objects, borrowed))
+    # The pool never grows beyond the queue size
+    assert len({id(buffer) for buffer in borrowed}) == 2
+
+
+def test_other_frames_are_copied_into_the_lent_buffer():
+    sink = RecordingSink()
+    writer = EncodedVideoWriter(sink, (32, 24), queue_size=2)
+    lent = writer.buffer((24, 32, 3))
+    own = frame(7)
+    writer.write(own)
+    own[:] = 0
+    writer.write(frame(9))
+    writer.release()
+
+    assert [int(f[0, 0, 0]) for f in sink.frames] == [7, 9]
+    assert sink.objects[0] is lent
+
+
+def test_no_buffers_lent_when_encoding_synchronously_or_resizing():
+    assert EncodedVideoWriter(RecordingSink(), (32, 24), queue_size=0).buffer((24, 32, 3)) is None
+    assert EncodedVideoWriter(RecordingSink(), (16, 12), queue_size=2).buffer((24, 32, 3)) is None
+
+
+def test_borrowing_and_writing_on_different_threads_keeps_order():
+    sink = RecordingSink()
+    writer = EncodedVideoWriter(sink, (32, 24), queue_size=3)
+    rendered = []
+    condition = threading.Condition()
+
+    def render():
+        for value in range(50):
+            buffer = writer.buffer((24, 32, 3))
+            buffer[:] = value
+            with condition:
+                rendered.append(buffer)
+                condition.notify()
+
+    thread = threading.Thread(target=render)
+    thread.start()
+    for _ in range(50):
+        with condition:
+            condition.wait_for(lambda: rendered)
+            buffer = rendered.pop(0)
+        writer.write(buffer)
+    thread.join()
+    writer.release()
+
+    assert [int(f[0, 0, 0]) for f in sink.frames] == list(range(50))
+
+
+def test_decimation_drops_frames():
+    sink = RecordingSink()
+    writer = EncodedVideoWriter(sink, (32, 24), frame_step=3, queue_size=2)
+    for value in range(7):
+        writer.write(frame(value))
+    writer.release()
+    assert [int(f[0, 0, 0]) for f in sink.frames] == [0, 3, 6]
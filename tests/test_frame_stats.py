@@ -0,0 +1,77 @@
+import json
+
+import numpy as np
+import pytest
+
+from utils.frame_stats import FrameStatsStore
+
+
+def filled_store(tmp_path, frames=100, spill_frames=16):
+    store = FrameStatsStore(spill_frames=spill_frames, spill_dir=str(tmp_path))
+    for frame in range(1, frames + 1):
+        store.append(frame, frame / 10, frame % 7, frame / 100)
+    return store
+
+
+def test_rows_survive_spilling_in_frame_order(tmp_path):
+    store = filled_store(tmp_path)
+    assert len(store) == 100
+    assert len(list(tmp_path.iterdir())) == len(FrameStatsStore.COLUMNS)
+    np.testing.assert_array_equal(store.column('frame'), np.arange(1, 101))
+    np.testing.assert_array_equal(store.column('people_count'), np.arange(1, 101) % 7)
+
+
+@pytest.mark.parametrize('start, end', [(None, None), (5, 20), (16, 17), (30, 99), (95, None), (200, 300)])
+def test_query_matches_filtering_all_rows(tmp_path, start, end):
+    store = filled_store(tmp_path)
+    frames = np.arange(1, 101)
+    expected = frames[(frames >= (start or 0)) & (frames <= (end or 1000))]
+    np.testing.assert_array_equal(store.query(start, end)['frame'], expected)
+
+
+@pytest.mark.parametrize('start, end', [(None, None), (0.45, 2.0), (1.6, 1.6), (3.05, None), (20.0, 30.0)])
+def test_query_time_matches_filtering_all_rows(tmp_path, start, end):
+    store = filled_store(tmp_path)
+    timestamps = store.column('timestamp')
+    keep = (timestamps >= (start if start is not None else -1)) & (timestamps <= (end if end is not None else 1e9))
+    rows = store.query_time(start, end)
+    np.testing.assert_array_equal(rows['timestamp'], timestamps[keep])
+    np.testing.assert_array_equal(rows['frame'], store.column('frame')[keep])
+
+
+def test_query_time_only_reads_the_requested_rows(tmp_path, monkeypatch):
+    store = filled_store(tmp_path)
+    read = []
+
+    def tracking_asarray(values, *args, **kwargs):
+        read.append(len(values))
+        return np.array(values, *args, **kwargs)
+
+    monkeypatch.setattr('utils.frame_stats.np.asarray', tracking_asarray)
+    store.query_time(2.0, 2.5)
+    assert sum(read) == 6 * len(FrameStatsStore.COLUMNS)
+
+
+def test_extend_npz_and_json_round_trip(tmp_path):
+    first = filled_store(tmp_path, frames=20)
+    second = FrameStatsStore(spill_frames=None)
+    for frame in range(21, 31):
+        second.append(frame, frame / 10, 1)
+    first.extend(second)
+    np.testing.assert_array_equal(first.column('frame'), np.arange(1, 31))
+
+    first.save_npz(str(tmp_path / 'stats.npz'))
+    loaded = FrameStatsStore.load_npz(str(tmp_path / 'stats.npz'))
+    assert loaded.to_records() == first.to_records()
+
+    first.save_json(str(tmp_path / 'stats.json'), fps=10)
+    with open(tmp_path / 'stats.json') as f:
+        data = json.load(f)
+    assert data['frame_statistics'] == first.to_records()
+    assert data['fps'] == 10
+
+
+def test_close_deletes_spill_files(tmp_path):
+    store = filled_store(tmp_path, frames=40)
+    store.close()
+    assert not any(path.name.startswith('frame_stats_') for path in tmp_path.iterdir())
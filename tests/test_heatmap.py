@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+
+from utils.heatmap import HeatmapGenerator
+
+
+class ReferenceHeatmap:
+    """The original per-point heatmap accumulation, kept as the reference"""
+
+    def __init__(self, grid_height, grid_width, grid_size, decay_factor, radius):
+        self.heatmap_data = np.zeros((grid_height, grid_width), dtype=np.float64)
+        self.grid_height = grid_height
+        self.grid_width = grid_width
+        self.grid_size = grid_size
+        self.decay_factor = decay_factor
+        self.radius = radius
+
+    def update_heatmap(self, person_centers):
+        self.heatmap_data *= self.decay_factor
+        for center_x, center_y in person_centers:
+            grid_x = min(center_x // self.grid_size, self.grid_width - 1)
+            grid_y = min(center_y // self.grid_size, self.grid_height - 1)
+            self.heatmap_data[grid_y, grid_x] += 1.0
+            self._apply_gaussian_around_point(grid_y, grid_x, self.radius)
+
+    def _apply_gaussian_around_point(self, grid_y, grid_x, radius=2):
+        kernel_size = 2 * radius + 1
+        kernel = np.zeros((kernel_size, kernel_size))
+        center = radius
+        sigma = radius / 3.0
+        for i in range(kernel_size):
+            for j in range(kernel_size):
+                x, y = i - center, j - center
+                kernel[i, j] = np.exp(-(x * x + y * y) / (2 * sigma * sigma))
+        kernel = kernel / np.sum(kernel) * 0.5
+
+        for i in range(kernel_size):
+            for j in range(kernel_size):
+                target_y = grid_y + i - center
+                target_x = grid_x + j - center
+                if 0 <= target_y < self.grid_height and 0 <= target_x < self.grid_width:
+                    self.heatmap_data[target_y, target_x] += kernel[i, j]
+
+
+def make_pair(decay_factor=0.95, radius=2, frame_shape=(480, 640, 3), grid_size=50):
+    generator = HeatmapGenerator(grid_size=grid_size, decay_factor=decay_factor, blur_radius=radius)
+    generator.initialize_heatmap(frame_shape)
+    reference = ReferenceHeatmap(generator.grid_height, generator.grid_width, grid_size, decay_factor, radius)
+    return generator, reference
+
+
+def assert_matches(generator, reference):
+    np.testing.assert_allclose(generator.heatmap_data, reference.heatmap_data, rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize('radius', [1, 2, 3])
+def test_stamp_matches_reference_kernel(radius):
+    reference = ReferenceHeatmap(2 * radius + 1, 2 * radius + 1, 1, 1.0, radius)
+    reference.update_heatmap([(radius, radius)])
+    stamp = HeatmapGenerator._build_stamp(radius).reshape(2 * radius + 1, 2 * radius + 1)
+    np.testing.assert_allclose(stamp, reference.heatmap_data, rtol=1e-12)
+
+
+def test_random_centers_match_reference():
+    rng = np.random.default_rng(0)
+    generator, reference = make_pair()
+    for _ in range(200):
+        centers = [tuple(point) for point in rng.integers(0, (640, 480), size=(rng.integers(0, 8), 2))]
+        generator.update_heatmap(centers)
+        reference.update_heatmap(centers)
+    assert_matches(generator, reference)
+
+
+def test_edge_and_out_of_frame_centers_match_reference():
+    generator, reference = make_pair()
+    # Corners, edges and centers past the right and bottom of the frame,
+    # whose stamps are partly cut off by the grid
+    centers = [(0, 0), (639, 0), (0, 479), (639, 479), (320, 0), (0, 240),
+               (700, 100), (100, 900), (5000, 5000), (649, 499)]
+    for _ in range(3):
+        generator.update_heatmap(centers)
+        reference.update_heatmap(centers)
+    assert_matches(generator, reference)
+
+
+def test_repeated_center_in_one_update_matches_reference():
+    generator, reference = make_pair()
+    centers = [(320, 240)] * 5 + [(325, 245)]
+    generator.update_heatmap(centers)
+    reference.update_heatmap(centers)
+    assert_matches(generator, reference)
+
+
+def test_renormalization_matches_reference():
+    # With a fast decay the lazy scale drops below RENORMALIZE_BELOW within a few frames
+    generator, reference = make_pair(decay_factor=0.3)
+    rng = np.random.default_rng(1)
+    renormalized = False
+    for _ in range(60):
+        centers = [tuple(point) for point in rng.integers(0, (640, 480), size=(3, 2))]
+        generator.update_heatmap(centers)
+        reference.update_heatmap(centers)
+        renormalized |= generator._scale == 1.0
+        assert generator._scale >= HeatmapGenerator.RENORMALIZE_BELOW
+    assert renormalized
+    assert_matches(generator, reference)
+
+
+def test_elapsed_frames_matches_repeated_decay():
+    generator, reference = make_pair()
+    generator.update_heatmap([(100, 100)])
+    reference.update_heatmap([(100, 100)])
+    generator.update_heatmap([(300, 200)], elapsed_frames=4)
+    for _ in range(3):
+        reference.update_heatmap([])
+    reference.update_heatmap([(300, 200)])
+    assert_matches(generator, reference)
+
+
+def test_empty_updates_only_decay():
+    generator, reference = make_pair()
+    generator.update_heatmap([(320, 240)])
+    reference.update_heatmap([(320, 240)])
+    for _ in range(10):
+        generator.update_heatmap([])
+        reference.update_heatmap([])
+    assert_matches(generator, reference)
+    assert generator.get_density_stats()['total_activity'] == pytest.approx(reference.heatmap_data.sum(), rel=1e-5)
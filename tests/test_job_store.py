@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+from utils.job_store import JobStore
+from utils.jobs import Job
+
+
+def exited_pid():
+    """Pid of a process that has already exited"""
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+
+def add_job(store, job_id, owner_pid):
+    store.add_job(Job(job_id, f'{job_id}.mp4', None))
+    with store._lock, store._connection:
+        store._connection.execute('UPDATE jobs SET owner_pid = ? WHERE id = ?', (owner_pid, job_id))
+
+
+def test_fail_unfinished_only_fails_jobs_of_exited_processes(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.db'))
+    add_job(store, 'running', os.getppid())
+    add_job(store, 'orphaned', exited_pid())
+    add_job(store, 'same_pid', os.getpid())
+    add_job(store, 'unowned', None)
+
+    assert store.fail_unfinished('restarted') == 3
+    assert store.get_job('running')['status'] == 'queued'
+    for job_id in ('orphaned', 'same_pid', 'unowned'):
+        job = store.get_job(job_id)
+        assert job['status'] == 'failed'
+        assert job['error'] == 'restarted'
+
+
+def test_add_job_records_owner(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.db'))
+    store.add_job(Job('job', 'job.mp4', None))
+    row = store._connection.execute('SELECT owner_pid FROM jobs').fetchone()
+    assert row['owner_pid'] == os.getpid()
+
+
+def test_adds_owner_column_to_older_databases(tmp_path):
+    db_path = str(tmp_path / 'jobs.db')
+    connection = sqlite3.connect(db_path)
+    connection.execute('CREATE TABLE jobs (id TEXT PRIMARY KEY, client_id TEXT, filename TEXT, kind TEXT NOT NULL, '
+                       'status TEXT NOT NULL, options TEXT NOT NULL, error TEXT, created_at REAL NOT NULL, '
+                       'started_at REAL, finished_at REAL)')
+    connection.execute("INSERT INTO jobs VALUES ('old', NULL, NULL, 'video', 'processing', '{}', NULL, 0, 0, NULL)")
+    connection.commit()
+    connection.close()
+
+    store = JobStore(db_path)
+    assert store.fail_unfinished('restarted') == 1
+    assert store.get_job('old')['status'] == 'failed'
+
+
+def test_cleanup_only_deletes_files_of_expired_jobs(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.db'))
+    uploads = tmp_path / 'uploads'
+    uploads.mkdir()
+    expired_input = uploads / 'expired.mp4'
+    kept_input = uploads / 'kept.mp4'
+    unrelated = uploads / 'sample.mp4'
+    media = tmp_path / 'media_expired'
+    media.mkdir()
+    (media / 'segment_00000.ts').write_bytes(b'ts')
+    for path in (expired_input, kept_input, unrelated):
+        path.write_bytes(b'video')
+    os.utime(unrelated, (0, 0))
+
+    for job_id, input_path in (('expired', expired_input), ('kept', kept_input)):
+        job = Job(job_id, str(input_path), None)
+        store.add_job(job)
+        job.status = 'completed'
+        job.finished_at = 0 if job_id == 'expired' else time.time()
+        store.update_job(job)
+    store.add_artifact('expired', 'media', str(media))
+
+    assert store.cleanup(3600) == 1
+    assert store.get_job('expired') is None
+    assert not expired_input.exists() and not media.exists()
+    assert store.get_job('kept') is not None and kept_input.exists()
+    assert unrelated.exists()
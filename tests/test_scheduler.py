@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from utils.scheduler import DetectionScheduler
+
+
+def still(value=100):
+    return np.full((120, 160, 3), value, dtype=np.uint8)
+
+
+def run(scheduler, frames):
+    """Feed frames the way the processing loop does; returns the detected frame indices"""
+    detected = []
+    for index, frame in enumerate(frames):
+        if scheduler.should_detect(frame if scheduler.needs_frame() else None):
+            detected.append(index)
+    return detected
+
+
+def test_fixed_scheduler_detects_every_interval_frames():
+    scheduler = DetectionScheduler.fixed(3)
+    assert run(scheduler, [still()] * 10) == [0, 3, 6, 9]
+    assert scheduler.get_stats() == {'detector_calls': 4, 'frames_skipped': 6, 'skip_ratio': 0.6}
+
+
+def test_fixed_scheduler_never_needs_skipped_frames():
+    scheduler = DetectionScheduler.fixed(3)
+    needed = []
+    for _ in range(7):
+        needed.append(scheduler.needs_frame())
+        scheduler.should_detect(still())
+    assert needed == [True, False, False, True, False, False, True]
+
+
+def test_static_scene_only_detects_at_max_interval():
+    scheduler = DetectionScheduler(min_interval=2, max_interval=5)
+    assert run(scheduler, [still()] * 16) == [0, 5, 10, 15]
+
+
+def test_motion_triggers_detection_after_min_interval():
+    scheduler = DetectionScheduler(min_interval=2, max_interval=10)
+    frames = [still()] * 4 + [still(200)] * 6
+    # Frame 4 changes the scene; nothing changes after it
+    assert run(scheduler, frames) == [0, 4]
+    assert scheduler.last_motion == 0.0
+
+
+def test_motion_is_measured_against_the_last_detected_frame():
+    scheduler = DetectionScheduler(min_interval=1, max_interval=100, motion_threshold=0.5)
+    # A slow drift: each step is below the pixel threshold, two steps are not
+    frames = [still(value) for value in range(100, 200, 10)]
+    assert run(scheduler, frames) == [0, 2, 4, 6, 8]
+
+
+def test_reset_starts_with_a_detection():
+    scheduler = DetectionScheduler.fixed(4)
+    run(scheduler, [still()] * 3)
+    scheduler.reset()
+    assert scheduler.should_detect(still())
+    assert scheduler.get_stats()['detector_calls'] == 1
+
+
+def test_config_round_trip():
+    scheduler = DetectionScheduler(min_interval=3, max_interval=9, motion_threshold=0.1)
+    assert DetectionScheduler(**scheduler.get_config()).get_config() == scheduler.get_config()
+
+
+@pytest.mark.parametrize('min_interval, max_interval', [(0, 5), (6, 5)])
+def test_rejects_invalid_intervals(min_interval, max_interval):
+    with pytest.raises(ValueError):
+        DetectionScheduler(min_interval=min_interval, max_interval=max_interval)
@@ -0,0 +1,39 @@
+import numpy as np
+
+from utils.segmented_output import SegmentedVideoWriter
+
+
+class StubWriter:
+    def __init__(self, path):
+        self.path = path
+        self.frames = 0
+
+    def write(self, frame):
+        self.frames += 1
+
+    def release(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'ts')
+
+
+class StubEncoder:
+    def open_backend(self, path, fps, size):
+        return StubWriter(path)
+
+
+def test_playlist_marks_boundaries_between_separately_encoded_segments(tmp_path):
+    writer = SegmentedVideoWriter(None, str(tmp_path), 10, (64, 48), segment_seconds=1.0, encoder=StubEncoder())
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    for _ in range(25):
+        writer.write(frame)
+    writer.release()
+
+    lines = (tmp_path / 'index.m3u8').read_text().splitlines()
+    segments = [line for line in lines if line.endswith('.ts')]
+    assert segments == ['segment_00000.ts', 'segment_00001.ts', 'segment_00002.ts']
+    assert lines.count('#EXT-X-DISCONTINUITY') == 2
+    # Each discontinuity directly precedes a later segment's entry, never the first
+    for index, line in enumerate(lines):
+        if line == '#EXT-X-DISCONTINUITY':
+            assert lines[index + 1].startswith('#EXTINF') and lines[index + 2] != segments[0]
+    assert lines[-1] == '#EXT-X-ENDLIST'
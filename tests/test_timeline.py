@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from utils.frame_stats import FrameStatsStore
+from utils.timeline import FIELDS, DensityTimeline
+from utils.zones import ZoneCounter, parse_zones
+
+FPS = 10
+
+
+def stats_for(counts):
+    store = FrameStatsStore(spill_frames=None)
+    for frame, count in enumerate(counts, start=1):
+        store.append(frame, frame / FPS, count, count / 100)
+    return store
+
+
+def reference_buckets(counts, width):
+    """Aggregates of one level computed bucket by bucket"""
+    buckets = []
+    for start in range(0, len(counts), width * FPS):
+        values = np.sort(counts[start:start + width * FPS])
+        buckets.append({
+            'start': start / FPS,
+            'frames': len(values),
+            'min': values[0],
+            'max': values[-1],
+            'mean': values.mean(),
+            'p95': values[int(np.ceil(0.95 * len(values))) - 1],
+            'people_total': values.sum(),
+            'density_max': values[-1] / 100
+        })
+    return buckets
+
+
+@pytest.mark.parametrize('width', [1, 10, 60])
+def test_levels_match_bucket_by_bucket_aggregates(width):
+    counts = np.random.default_rng(1).integers(0, 30, size=1234)
+    timeline = DensityTimeline.from_frame_stats(stats_for(counts), FPS)
+    buckets = timeline.levels[width]
+    expected = reference_buckets(counts, width)
+    for name in FIELDS:
+        np.testing.assert_allclose(buckets[name], [bucket[name] for bucket in expected])
+    assert timeline.duration == pytest.approx(123.4)
+
+
+def test_query_picks_the_finest_level_within_max_points():
+    timeline = DensityTimeline.from_frame_stats(stats_for(np.arange(1200) % 9), FPS)
+    assert timeline.query(max_points=500)['bucket_seconds'] == 1
+    assert timeline.query(max_points=50)['bucket_seconds'] == 10
+    assert timeline.query(max_points=5)['bucket_seconds'] == 60
+    # Nothing fits: the coarsest level is used
+    assert timeline.query(max_points=1)['bucket_seconds'] == 60
+
+
+def test_query_returns_the_buckets_overlapping_the_range():
+    timeline = DensityTimeline.from_frame_stats(stats_for(np.arange(1200) % 9), FPS)
+    result = timeline.query(15.5, 42.0, max_points=10)
+    assert result['bucket_seconds'] == 10
+    assert result['buckets']['start'] == [10.0, 20.0, 30.0, 40.0]
+    assert result['end'] == 42.0
+    # Ranges are clamped to the video
+    assert timeline.query(-5, 1000)['end'] == 120.0
+
+
+def test_zone_series_and_save_load_round_trip(tmp_path):
+    zones = ZoneCounter(parse_zones([{'name': 'door', 'points': [[0, 0], [50, 0], [50, 50], [0, 50]]}]))
+    counts = np.arange(300) % 5
+    for frame, count in enumerate(counts, start=1):
+        zones.update([(10, 10)] * int(count), frame, (100, 100, 3))
+    timeline = DensityTimeline.from_frame_stats(stats_for(counts), FPS, zones=zones)
+    np.testing.assert_allclose(timeline.levels[10]['zone_mean'][:, 0], [2.0] * 3)
+    np.testing.assert_array_equal(timeline.levels[1]['zone_max'][:, 0], [4] * 30)
+
+    timeline.save(str(tmp_path / 'timeline.npz'))
+    loaded = DensityTimeline.load(str(tmp_path / 'timeline.npz'))
+    assert loaded.zone_names == ['door']
+    assert loaded.query(0, 30) == timeline.query(0, 30)
+
+
+def test_empty_statistics_give_an_empty_timeline():
+    timeline = DensityTimeline.from_frame_stats(stats_for([]), FPS)
+    result = timeline.query()
+    assert result['duration'] == 0.0
+    assert all(values == [] for values in result['buckets'].values())
@@ -0,0 +1,93 @@
+import numpy as np
+
+from utils.detection import Detections
+from utils.tracking import PersonTracker, track_stats
+
+
+def people(*boxes):
+    return Detections(np.array(boxes, dtype=np.int32).reshape(-1, 4), np.full(len(boxes), 0.9))
+
+
+def walker(frame_number, x0=10, speed=4):
+    """Box of a person walking right"""
+    x = x0 + speed * frame_number
+    return [x, 50, x + 40, 130]
+
+
+def track(tracker, detections_by_frame, frames):
+    ids = {}
+    for frame_number in frames:
+        detections = tracker.update(None, detections_by_frame(frame_number), frame_number)
+        ids[frame_number] = detections.track_ids.tolist()
+    return ids
+
+
+def test_moving_person_keeps_one_id():
+    tracker = PersonTracker(use_optical_flow=False)
+    ids = track(tracker, lambda n: people(walker(n)), range(1, 11))
+    assert set(sum(ids.values(), [])) == {1}
+    stats = tracker.get_stats(fps=10)
+    assert stats['unique_people'] == 1
+    assert stats['max_dwell_time'] == 1.0
+
+
+def test_new_and_far_detections_start_new_tracks():
+    tracker = PersonTracker(use_optical_flow=False)
+    tracker.update(None, people([0, 0, 40, 80]), 1)
+    detections = tracker.update(None, people([2, 0, 42, 80], [400, 0, 440, 80]), 2)
+    assert detections.track_ids.tolist() == [1, 2]
+
+
+def test_tracks_retire_after_max_age_and_need_min_hits():
+    tracker = PersonTracker(max_age=5, min_hits=2, use_optical_flow=False)
+    tracker.update(None, people([0, 0, 40, 80]), 1)
+    tracker.update(None, people([0, 0, 40, 80], [300, 0, 340, 80]), 2)
+    # The first person is gone; after max_age frames they are retired
+    tracker.update(None, people([300, 0, 340, 80]), 8)
+    tracks = tracker.get_tracks()
+    assert tracks['active'].tolist() == [False, True]
+    assert tracks['hits'].tolist() == [2, 2]
+    # Same spot, but the old track is retired, so this is someone new
+    detections = tracker.update(None, people([0, 0, 40, 80]), 9)
+    assert detections.track_ids.tolist() == [3]
+    assert track_stats(tracker.get_tracks(), 2, fps=1)['unique_people'] == 2
+
+
+def test_predict_moves_boxes_at_the_last_velocity():
+    tracker = PersonTracker(use_optical_flow=False)
+    tracker.update(None, people(walker(0)), 0)
+    tracker.update(None, people(walker(2)), 2)
+    predicted = tracker.predict(None, 3)
+    np.testing.assert_array_equal(predicted.boxes, [walker(3)])
+    assert predicted.track_ids.tolist() == [1]
+
+
+def test_stitched_chunks_match_a_serial_run():
+    def scene(n):
+        boxes = [walker(n)]
+        if n <= 12:
+            boxes.append([500, 40, 540, 120])  # leaves before the chunk boundary
+        if n >= 15:
+            boxes.append([700 - 3 * n, 200, 740 - 3 * n, 280])  # enters shortly before the boundary
+        return people(*boxes)
+
+    serial = PersonTracker(use_optical_flow=False)
+    track(serial, scene, range(1, 41))
+
+    first, second = PersonTracker(use_optical_flow=False), PersonTracker(use_optical_flow=False)
+    track(first, scene, range(1, 21))
+    track(second, scene, range(21, 41))
+    stitched = first.stitch_tracks(first.get_tracks(), second.get_tracks(), 21)
+
+    assert track_stats(stitched, 2, fps=10) == serial.get_stats(fps=10)
+    assert track_stats(stitched, 2, fps=10)['unique_people'] == 3
+    assert stitched['active'].sum() == 2
+
+
+def test_stitching_respects_max_age():
+    first, second = PersonTracker(max_age=5, use_optical_flow=False), PersonTracker(max_age=5, use_optical_flow=False)
+    track(first, lambda n: people([0, 0, 40, 80]), range(1, 11))
+    # Same place, but the person was gone for longer than max_age
+    track(second, lambda n: people([0, 0, 40, 80]) if n >= 17 else people(), range(11, 21))
+    stitched = first.stitch_tracks(first.get_tracks(), second.get_tracks(), 11)
+    assert track_stats(stitched, 2, fps=1)['unique_people'] == 2
@@ -0,0 +1,100 @@
+import io
+import struct
+import threading
+import time
+
+import pytest
+
+from utils.uploads import Upload, UploadManager, UploadOffsetMismatch, UploadTooLarge
+
+DATA = bytes(range(256)) * 40
+
+
+def upload(tmp_path, filename='clip.mkv', size=len(DATA)):
+    return Upload('u1', str(tmp_path / filename), filename, size)
+
+
+def test_reader_reports_the_declared_size_and_reads_what_arrived(tmp_path):
+    u = upload(tmp_path)
+    u.append(io.BytesIO(DATA[:4000]), 0)
+    reader = u.open_reader(stall_timeout=1)
+    assert reader.seek(0, io.SEEK_END) == len(DATA)
+    reader.seek(3990)
+    assert reader.read(10) == DATA[3990:4000]
+    assert reader.tell() == 4000
+
+
+def test_reader_blocks_until_the_bytes_arrive(tmp_path):
+    u = upload(tmp_path)
+    u.append(io.BytesIO(DATA[:1000]), 0)
+    reader = u.open_reader(stall_timeout=5)
+    reader.seek(900)
+
+    def finish():
+        time.sleep(0.1)
+        u.append(io.BytesIO(DATA[1000:]), 1000)
+
+    thread = threading.Thread(target=finish)
+    thread.start()
+    assert reader.read(5000) == DATA[900:5900]
+    thread.join()
+    assert reader.read() == DATA[5900:]
+    assert reader.read() == b''
+
+
+def test_stalled_upload_reads_as_an_early_end_of_file(tmp_path):
+    u = upload(tmp_path)
+    u.append(io.BytesIO(DATA[:1000]), 0)
+    reader = u.open_reader(stall_timeout=0.05)
+    reader.seek(500)
+    assert reader.read(1000) == DATA[500:1000]
+    assert reader.read(1000) == b''
+
+
+def test_append_checks_offsets_and_size(tmp_path):
+    u = upload(tmp_path, size=100)
+    assert u.append(io.BytesIO(DATA[:60]), 0) == 60
+    with pytest.raises(UploadOffsetMismatch) as error:
+        u.append(io.BytesIO(DATA[:40]), 0)
+    assert error.value.offset == 60
+    with pytest.raises(UploadTooLarge):
+        u.append(io.BytesIO(DATA[60:110]), 60, length=50)
+    assert u.offset == 60
+    # Without a length the bytes that fit are kept before the error
+    with pytest.raises(UploadTooLarge):
+        u.append(io.BytesIO(DATA[60:110]), 60)
+    assert u.complete
+    with open(u.path, 'rb') as f:
+        assert f.read() == DATA[:100]
+
+
+def atom(box_type, payload=b''):
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+@pytest.mark.parametrize('filename, content, streamable', [
+    ('clip.mp4', atom(b'ftyp', b'isom') + atom(b'moov') + atom(b'mdat'), True),
+    ('clip.mp4', atom(b'ftyp', b'isom') + atom(b'mdat') + atom(b'moov'), False),
+    ('clip.mp4', atom(b'ftyp', b'isom'), None),
+    ('clip.webm', b'\x1aE\xdf\xa3', True),
+    ('clip.avi', b'RIFF', False)
+])
+def test_streamable_containers(tmp_path, filename, content, streamable):
+    u = upload(tmp_path, filename, size=1000)
+    u.append(io.BytesIO(content), 0)
+    assert u.is_streamable() is streamable
+
+
+def test_manager_expires_stalled_incomplete_uploads(tmp_path):
+    manager = UploadManager(str(tmp_path), max_size=1000, expire_seconds=60)
+    stalled = manager.create('old', 'a.mkv', 100)
+    queued = manager.create('queued', 'b.mkv', 100)
+    queued.job_id = 'queued'
+    stalled.updated_at = queued.updated_at = time.time() - 120
+    manager.expire_stale()
+    assert manager.get('old') is None and manager.get('queued') is None
+    assert not (tmp_path / 'old.mkv').exists()
+    # A job is reading the file, so it stays on disk
+    assert (tmp_path / 'queued.mkv').exists()
+    with pytest.raises(UploadTooLarge):
+        manager.create('big', 'c.mkv', 1001)
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from utils.zones import MAX_ALERTS_PER_ZONE, ZoneCounter, parse_zones
+
+SHAPE = (200, 300, 3)
+
+
+def counter(*thresholds):
+    """Two overlapping zones: 'left' covers x 0-100, 'right' x 50-150"""
+    return ZoneCounter(parse_zones([
+        {'name': 'left', 'points': [[0, 0], [100, 0], [100, 100], [0, 100]], 'threshold': thresholds[0]},
+        {'name': 'right', 'points': [[50, 0], [150, 0], [150, 100], [50, 100]], 'threshold': thresholds[1]}
+    ]))
+
+
+def reference_alerts(series, threshold, first_frame, fps):
+    """Alert runs found frame by frame"""
+    alerts = []
+    for index, count in enumerate(series):
+        if count > threshold:
+            if index == 0 or series[index - 1] <= threshold:
+                alerts.append({'start_frame': index + first_frame,
+                               'start_timestamp': round((index + first_frame) / fps, 2), 'peak': 0})
+            alerts[-1]['end_timestamp'] = round((index + first_frame) / fps, 2)
+            alerts[-1]['peak'] = max(alerts[-1]['peak'], int(count))
+    return alerts
+
+
+def test_overlapping_zones_count_the_same_person():
+    zones = counter(None, None)
+    counts = zones.update([(75, 50), (20, 50), (140, 50), (75, 150)], 1, SHAPE)
+    assert counts.tolist() == [2, 2]
+
+
+def test_alert_runs_match_a_frame_by_frame_scan():
+    rng = np.random.default_rng(0)
+    zones = counter(2, 0)
+    for frame_number in range(5, 305):
+        centers = rng.integers(0, [160, 110], size=(rng.integers(0, 6), 2))
+        zones.update(centers, frame_number, SHAPE)
+
+    counts = zones.counts()
+    for i, result in enumerate(zones.get_results(fps=10)):
+        expected = reference_alerts(counts[:, i], result['threshold'], 5, 10)
+        assert result['alert_count'] == len(expected)
+        assert result['alerts'] == [{k: a[k] for k in ('start_frame', 'start_timestamp', 'end_timestamp', 'peak')}
+                                    for a in expected[:MAX_ALERTS_PER_ZONE]]
+        assert result['peak'] == counts[:, i].max()
+        assert result['seconds_over_threshold'] == round((counts[:, i] > result['threshold']).sum() / 10, 2)
+
+
+def test_runs_touching_the_first_and_last_frame():
+    zones = counter(0, None)
+    for frame_number, inside in enumerate([2, 1, 0, 0, 3, 0, 1], start=1):
+        zones.update([(20, 20)] * inside, frame_number, SHAPE)
+    left, right = zones.get_results(fps=1)
+    assert [(a['start_frame'], a['end_timestamp'], a['peak']) for a in left['alerts']] == [(1, 2.0, 2), (5, 5.0, 3), (7, 7.0, 1)]
+    # No threshold, no alerts
+    assert right['alert_count'] == 0 and right['alerts'] == []
+
+
+def test_extended_chunks_match_one_counter():
+    frames = [[(20, 20)] * (n % 4) for n in range(1, 41)]
+    whole, first, second = counter(1, 1), counter(1, 1), counter(1, 1)
+    for frame_number, centers in enumerate(frames, start=1):
+        whole.update(centers, frame_number, SHAPE)
+        (first if frame_number <= 20 else second).update(centers, frame_number, SHAPE)
+    first.extend(second)
+    assert first.get_results(fps=5) == whole.get_results(fps=5)
+
+
+def test_empty_counter_reports_no_alerts():
+    results = counter(1, None).get_results(fps=10)
+    assert [(r['name'], r['peak'], r['alert_count']) for r in results] == [('left', 0, 0), ('right', 0, 0)]
+
+
+@pytest.mark.parametrize('spec', [
+    {},
+    [{'name': 'a', 'points': [[0, 0], [1, 1]]}],
+    [{'name': 'a', 'points': [[0, 0], [1, 0], [1, 1]], 'threshold': -1}],
+    [{'name': 'a', 'points': [[0, 0], [1, 0], [1, 1]]}, {'name': 'a', 'points': [[0, 0], [1, 0], [1, 1]]}]
+])
+def test_parse_zones_rejects_invalid_configurations(spec):
+    with pytest.raises(ValueError):
+        parse_zones(spec)
@@ -0,0 +1,123 @@
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+@lru_cache(maxsize=4096)
+def text_size(text, font_scale=0.5, thickness=2):
+    """
+    Get the size of a text in the annotation font, cached per text
+
+    Args:
+        text: Text to measure
+        font_scale: Font scale
+        thickness: Stroke thickness
+
+    Returns:
+        ((width, height), baseline) as returned by cv2.getTextSize
+    """
+    return cv2.getTextSize(text, FONT, font_scale, thickness)
+
+
+class InfoPanel:
+    """Box of labelled values in the top-left corner of a frame, drawn from a cached template"""
+
+    def __init__(self, labels, width=150, border=True, font_scale=0.6, thickness=2, line_height=25):
+        """
+        Initialize info panel
+
+        The box and the labels are rendered once into a template. The panel
+        itself is kept between frames, and only the values that changed
+        since the previous frame are redrawn into it before it is copied
+        onto the frame. The box grows to the right if a value no longer
+        fits.
+
+        Args:
+            labels: Label of each line, e.g. 'People: '
+            width: Minimum width of the box in pixels
+            border: Draw a white border around the box
+            font_scale: Font scale of the text
+            thickness: Stroke thickness of the text
+            line_height: Distance between lines in pixels
+        """
+        self.labels = list(labels)
+        self.width = width
+        self.border = border
+        self.font_scale = font_scale
+        self.thickness = thickness
+        self.line_height = line_height
+        self.height = len(self.labels) * line_height + 10
+
+        # Values are drawn right after their label (the measured width includes the stroke)
+        self._value_x = [6 + text_size(label, font_scale, thickness)[0][0] - thickness for label in self.labels]
+        self._build()
+
+    def draw(self, frame, values):
+        """
+        Draw the panel onto a frame in place
+
+        Args:
+            frame: Frame to draw on
+            values: Value of each line (converted with str)
+        """
+        values = [str(value) for value in values]
+        changed = [i for i, value in enumerate(values) if value != self._values[i]]
+        if changed:
+            needed = max(self._value_x[i] + text_size(values[i], self.font_scale, self.thickness)[0][0] + 5
+                         for i in changed)
+            if needed > self.width:
+                self.width = needed
+                self._build()
+                changed = range(len(values))
+
+        for i in changed:
+            # Restore the line's value area from the template, then draw the new value
+            baseline = 26 + i * self.line_height
+            rows = slice(baseline - 19, baseline + 6)
+            columns = slice(self._value_x[i] - 3, self.width + 1)
+            self._panel[rows, columns] = self._template[rows, columns]
+            cv2.putText(self._panel, values[i], (self._value_x[i], baseline), FONT, self.font_scale,
+                        (255, 255, 255), self.thickness)
+            self._values[i] = values[i]
+
+        # Copy the box, clipped to the frame; pixels the box does not cover
+        # (the border's rounded corners) keep the frame's content
+        top, left = self._origin
+        box = self._panel[self._box]
+        height = min(len(box), frame.shape[0] - top)
+        width = min(box.shape[1], frame.shape[1] - left)
+        if height <= 0 or width <= 0:
+            return
+        region = frame[top:top + height, left:left + width]
+        if (height, width) == box.shape[:2]:
+            uncovered = region[self._holes]
+            region[:] = box
+            region[self._holes] = uncovered
+        else:
+            np.copyto(region, box[:height, :width], where=self._mask[:height, :width, None])
+
+    def _build(self):
+        """Render the box and labels into the template and reset the panel"""
+        # One pixel of margin on each side for the border's outer half
+        template = np.zeros((self.height + 3, self.width + 3, 3), dtype=np.uint8)
+        mask = np.zeros(template.shape[:2], dtype=np.uint8)
+        cv2.rectangle(mask, (1, 1), (1 + self.width, 1 + self.height), 1, -1)
+        if self.border:
+            cv2.rectangle(template, (1, 1), (1 + self.width, 1 + self.height), (255, 255, 255), 2)
+            cv2.rectangle(mask, (1, 1), (1 + self.width, 1 + self.height), 1, 2)
+        for i, label in enumerate(self.labels):
+            cv2.putText(template, label, (6, 26 + i * self.line_height), FONT, self.font_scale,
+                        (255, 255, 255), self.thickness)
+
+        # The template's origin is at (9, 9) in the frame; copies are limited
+        # to the bounding box of the pixels the box covers
+        rows, columns = np.nonzero(mask)
+        self._box = (slice(rows.min(), rows.max() + 1), slice(columns.min(), columns.max() + 1))
+        self._origin = (9 + rows.min(), 9 + columns.min())
+        self._mask = mask[self._box] > 0
+        self._holes = np.nonzero(~self._mask)
+        self._template = template
+        self._panel = template.copy()
+        self._values = [None] * len(self.labels)
@@ -2,23 +2,169 @@ import cv2
 import numpy as np
 import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from utils.annotation import text_size
+
+class Detections:
+    """Detected people of one frame, stored as NumPy arrays"""
+    
+    __slots__ = ('boxes', 'scores', 'track_ids')
+    
+    def __init__(self, boxes=None, scores=None, track_ids=None):
+        """
+        Initialize detections
+        
+        The detector, tracker and cache pass these arrays along unchanged,
+        and the later stages (centers, drawing, zone and heatmap updates)
+        read them directly. For compatibility the object still behaves like
+        the former list of detection dictionaries: len(), truthiness,
+        iteration and indexing with an integer yield dictionaries with
+        'bbox', 'confidence', 'class_id', 'class_name' (and 'track_id').
+        
+        Args:
+            boxes: (N, 4) array of [x1, y1, x2, y2] in frame coordinates
+            scores: (N,) array of confidences
+            track_ids: Optional (N,) array of track IDs
+        """
+        self.boxes = (np.empty((0, 4), dtype=np.int32) if boxes is None
+                      else np.asarray(boxes, dtype=np.int32).reshape(-1, 4))
+        self.scores = (np.empty(0, dtype=np.float32) if scores is None
+                       else np.asarray(scores, dtype=np.float32).reshape(-1))
+        self.track_ids = None if track_ids is None else np.asarray(track_ids, dtype=np.int64).reshape(-1)
+    
+    @classmethod
+    def from_list(cls, detections):
+        """
+        Convert detections to Detections
+        
+        Args:
+            detections: Detections (returned as is), or a list of detection
+                dictionaries
+            
+        Returns:
+            Detections
+        """
+        if isinstance(detections, cls):
+            return detections
+        detections = list(detections)
+        track_ids = None
+        if detections and all('track_id' in d for d in detections):
+            track_ids = [d['track_id'] for d in detections]
+        return cls([d['bbox'] for d in detections], [d['confidence'] for d in detections], track_ids)
+    
+    def __len__(self):
+        return len(self.boxes)
+    
+    def __iter__(self):
+        for i in range(len(self.boxes)):
+            yield self[i]
+    
+    def __getitem__(self, index):
+        """A detection dictionary for an integer index, Detections for a slice or mask"""
+        if isinstance(index, (int, np.integer)):
+            detection = {
+                'bbox': self.boxes[index].tolist(),
+                'confidence': float(self.scores[index]),
+                'class_id': 0,
+                'class_name': 'person'
+            }
+            if self.track_ids is not None:
+                detection['track_id'] = int(self.track_ids[index])
+            return detection
+        return Detections(self.boxes[index], self.scores[index],
+                          None if self.track_ids is None else self.track_ids[index])
+    
+    def __repr__(self):
+        return f"Detections({len(self)} people)"
+    
+    def to_list(self):
+        """Get the detections as a list of dictionaries"""
+        return list(self)
+    
+    def centers(self):
+        """Get the box centers as an (N, 2) integer array"""
+        return (self.boxes[:, :2] + self.boxes[:, 2:]) // 2
+
 
 class YOLODetector:
     """OpenCV-based person detection class"""
     
-    def __init__(self, model_name='hog', confidence_threshold=0.5):
+    def __init__(self, model_name='hog', confidence_threshold=0.5, win_stride=(16, 16),
+                 padding=(16, 16), scale=1.1, hit_threshold=0.5, inference_width=None,
+                 tile_size=None, tile_overlap=128, tile_workers=None, roi_mask=None,
+                 input_size=640, nms_threshold=0.45, person_class_id=0, dnn_threads=None):
         """
         Initialize OpenCV detector
         
         Args:
-            model_name: Detection method ('hog' or 'cascade')
+            model_name: Detection method ('hog' or 'cascade'), or the path of
+                a YOLO-style ONNX model (*.onnx) run with OpenCV DNN on the CPU
             confidence_threshold: Minimum confidence for detections
+            win_stride: HOG window stride
+            padding: HOG padding
+            scale: Scale step between detection pyramid levels
+            hit_threshold: SVM margin below which OpenCV drops HOG windows.
+                HOG confidences are the sigmoid of the margin, so the default
+                of 0.5 keeps confidences of about 0.62 and up; confidence_threshold
+                only filters HOG boxes further when it is set above that
+            inference_width: Resize frames to this width before detection
+                (None keeps the native resolution); boxes are mapped back
+            tile_size: Split frames wider or taller than this (at inference
+                resolution) into overlapping square tiles processed in parallel
+            tile_overlap: Overlap between neighbouring tiles in pixels; should be
+                at least the height of a person so nobody is only seen cut in half
+            tile_workers: Threads used for tiles (defaults to the CPU count)
+            roi_mask: Optional mask at frame resolution; detection is restricted
+                to its non-zero area
+            input_size: Square input size of the ONNX model; frames are
+                letterboxed to it
+            nms_threshold: IoU above which the lower-scoring of two
+                overlapping boxes is suppressed
+            person_class_id: Class index of 'person' in the ONNX model's
+                output (0 for COCO-trained models)
+            dnn_threads: Threads OpenCV uses for inference (None keeps
+                OpenCV's default); this is a process-wide OpenCV setting
         """
         self.confidence_threshold = confidence_threshold
         self.model_name = model_name
+        self.win_stride = tuple(win_stride)
+        self.padding = tuple(padding)
+        self.scale = scale
+        self.hit_threshold = hit_threshold
+        self.inference_width = inference_width
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.tile_workers = tile_workers or os.cpu_count() or 1
+        self.input_size = input_size
+        self.nms_threshold = nms_threshold
+        self.person_class_id = person_class_id
+        self.dnn_threads = dnn_threads
+        self._tile_executor = None
+        # Set once an ONNX model turns out to have a fixed batch size of 1
+        self._single_batch = False
+        self.set_roi_mask(roi_mask)
+        
+        if model_name == 'hog':
+            self.backend = 'hog'
+        elif model_name.lower().endswith('.onnx'):
+            self.backend = 'dnn'
+        else:
+            self.backend = 'cascade'
         
         try:
-            if model_name == 'hog':
+            if self.backend == 'dnn':
+                if not os.path.isfile(model_name):
+                    raise FileNotFoundError(f"Model file not found: {model_name}")
+                self.net = cv2.dnn.readNetFromONNX(model_name)
+                self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+                self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+                if dnn_threads:
+                    cv2.setNumThreads(dnn_threads)
+                logging.info(f"DNN person detector loaded from {model_name}")
+            elif self.backend == 'hog':
                 # Initialize HOG people detector
                 self.hog = cv2.HOGDescriptor()
                 self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
@@ -34,99 +180,447 @@ class YOLODetector:
             logging.error(f"Error initializing detector: {str(e)}")
             raise RuntimeError(f"Failed to initialize detector: {str(e)}")
     
-    def detect_people(self, frame):
+    def get_config(self):
+        """Get constructor arguments, e.g. to rebuild the detector in another process"""
+        return {
+            'model_name': self.model_name,
+            'confidence_threshold': self.confidence_threshold,
+            'win_stride': self.win_stride,
+            'padding': self.padding,
+            'scale': self.scale,
+            'hit_threshold': self.hit_threshold,
+            'inference_width': self.inference_width,
+            'tile_size': self.tile_size,
+            'tile_overlap': self.tile_overlap,
+            'tile_workers': self.tile_workers,
+            'roi_mask': self.roi_mask,
+            'input_size': self.input_size,
+            'nms_threshold': self.nms_threshold,
+            'person_class_id': self.person_class_id,
+            'dnn_threads': self.dnn_threads
+        }
+    
+    def set_roi_mask(self, roi_mask):
+        """
+        Restrict detection to a region of interest
+        
+        Args:
+            roi_mask: Mask at frame resolution (non-zero = detect), or None for the full frame
+        """
+        self.roi_mask = None if roi_mask is None else (np.asarray(roi_mask) > 0).astype(np.uint8)
+        self._scaled_roi = None
+    
+    def detect_people(self, frame, timer=None):
         """
         Detect people in a frame
         
         Args:
             frame: Input frame (numpy array)
+            timer: Optional StageTimer recording the resize, inference and
+                postprocess steps as 'detect.*' stages
             
         Returns:
-            List of detection results with bounding boxes and confidence scores
+            Detections in frame coordinates
         """
         try:
-            detections = []
-            
-            if self.model_name == 'hog':
-                # Use HOG detector with faster settings
-                try:
-                    rects, weights = self.hog.detectMultiScale(
-                        frame,
-                        winStride=(16, 16),  # Larger stride for faster processing
-                        padding=(16, 16),    # Smaller padding
-                        scale=1.1,          # Faster scale step
-                        hitThreshold=0.5    # Higher threshold
-                    )
-                    
-                    # Handle case where no detections found
-                    if len(rects) == 0:
-                        return []
-                    
-                    for i, (x, y, w, h) in enumerate(rects):
-                        # Simple confidence calculation
-                        confidence = 0.7  # Fixed confidence to avoid weight parsing issues
-                        
-                        if confidence >= self.confidence_threshold:
-                            detections.append({
-                                'bbox': [int(x), int(y), int(x + w), int(y + h)],
-                                'confidence': float(confidence),
-                                'class_id': 0,
-                                'class_name': 'person'
-                            })
-                except Exception as e:
-                    logging.error(f"HOG detection failed: {str(e)}")
-                    return []
+            started = time.perf_counter()
+            
+            # Resize to the inference resolution
+            image, factor = self._resize_for_inference(frame)
+            mask = self._roi_at(image.shape[:2])
+            resized = time.perf_counter()
+            
+            image_height, image_width = image.shape[:2]
+            if self.tile_size and max(image_height, image_width) > self.tile_size:
+                boxes, scores = self._detect_tiled(image, mask)
             else:
-                # Use cascade classifier
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                rects = self.cascade.detectMultiScale(
-                    gray,
-                    scaleFactor=1.1,
-                    minNeighbors=5,
-                    minSize=(30, 30)
-                )
-                
-                for (x, y, w, h) in rects:
-                    detections.append({
-                        'bbox': [int(x), int(y), int(x + w), int(y + h)],
-                        'confidence': 0.8,  # Fixed confidence for cascade
-                        'class_id': 0,
-                        'class_name': 'person'
-                    })
+                # Crop to the ROI's bounding box to skip dead areas
+                x0, y0, x1, y1 = 0, 0, image_width, image_height
+                if mask is not None:
+                    points = cv2.findNonZero(mask)
+                    if points is None:
+                        return Detections()
+                    x0, y0, w, h = cv2.boundingRect(points)
+                    x1, y1 = x0 + w, y0 + h
+                boxes, scores = self._detect_region(image[y0:y1, x0:x1])
+                boxes[:, [0, 2]] += x0
+                boxes[:, [1, 3]] += y0
+            inferred = time.perf_counter()
+            if timer is not None:
+                timer.add('detect.resize', resized - started)
+                timer.add('detect.inference', inferred - resized)
             
+            detections = self._to_detections(boxes, scores, mask, factor)
+            if timer is not None:
+                timer.add('detect.postprocess', time.perf_counter() - inferred)
             return detections
             
         except Exception as e:
             logging.error(f"Detection error: {str(e)}")
-            return []
+            return Detections()
+    
+    def detect_people_batch(self, frames, timer=None):
+        """
+        Detect people in several frames
+        
+        With an ONNX model all frames go through the network in one batched
+        forward pass (tiled detection still runs frame by frame); HOG and
+        the cascade classifier always detect frame by frame.
+        
+        Args:
+            frames: List of input frames
+            timer: Optional StageTimer (see detect_people)
+            
+        Returns:
+            List with the Detections of each frame
+        """
+        if self.backend != 'dnn' or self.tile_size or not frames:
+            return [self.detect_people(frame, timer=timer) for frame in frames]
+        
+        try:
+            started = time.perf_counter()
+            images, factors = zip(*(self._resize_for_inference(frame) for frame in frames))
+            resized = time.perf_counter()
+            
+            # The ROI is applied to box centers only; there is no per-frame crop to batch
+            boxes, scores = self._dnn_detect(images)
+            inferred = time.perf_counter()
+            
+            detections = [self._to_detections(frame_boxes, frame_scores, self._roi_at(image.shape[:2]), factor)
+                          for frame_boxes, frame_scores, image, factor in zip(boxes, scores, images, factors)]
+            if timer is not None:
+                timer.add('detect.resize', resized - started)
+                timer.add('detect.inference', inferred - resized)
+                timer.add('detect.postprocess', time.perf_counter() - inferred)
+            return detections
+            
+        except Exception as e:
+            logging.error(f"Batch detection error: {str(e)}")
+            return [Detections() for _ in frames]
+    
+    def _resize_for_inference(self, frame):
+        """
+        Resize a frame to the inference width
+        
+        Returns:
+            (image, factor): the resized image and its scale relative to the frame
+        """
+        frame_height, frame_width = frame.shape[:2]
+        if not self.inference_width or self.inference_width == frame_width:
+            return frame, 1.0
+        factor = self.inference_width / frame_width
+        image = cv2.resize(frame, (self.inference_width, max(1, int(round(frame_height * factor)))),
+                           interpolation=cv2.INTER_AREA if factor < 1 else cv2.INTER_LINEAR)
+        return image, factor
     
-    def draw_detections(self, frame, detections):
+    def _to_detections(self, boxes, scores, mask, factor):
+        """
+        Filter boxes in inference coordinates and convert them to detections
+        
+        Args:
+            boxes: (N, 4) array of [x1, y1, x2, y2] in inference image coordinates
+            scores: (N,) array of confidences
+            mask: ROI mask at inference resolution, or None
+            factor: Scale of the inference image relative to the frame
+            
+        Returns:
+            Detections in frame coordinates
+        """
+        if len(boxes) == 0:
+            return Detections()
+        
+        # Drop boxes whose center falls outside the ROI
+        if mask is not None:
+            image_height, image_width = mask.shape[:2]
+            centers_x = np.clip((boxes[:, 0] + boxes[:, 2]) // 2, 0, image_width - 1)
+            centers_y = np.clip((boxes[:, 1] + boxes[:, 3]) // 2, 0, image_height - 1)
+            inside = mask[centers_y.astype(int), centers_x.astype(int)] > 0
+            boxes, scores = boxes[inside], scores[inside]
+        
+        # Map boxes back to frame coordinates
+        if factor != 1.0:
+            boxes = boxes / factor
+        
+        keep = scores >= self.confidence_threshold
+        return Detections(boxes[keep].astype(np.int32), scores[keep])
+    
+    def _detect_region(self, image):
+        """
+        Run the underlying detector on an image
+        
+        Returns:
+            (boxes, confidences): (N, 4) float array of [x1, y1, x2, y2] and (N,) array
+        """
+        empty = (np.empty((0, 4), dtype=np.float32), np.empty(0))
+        if image.shape[0] == 0 or image.shape[1] == 0:
+            return empty
+        
+        if self.backend == 'dnn':
+            boxes, scores = self._dnn_detect([image])
+            return boxes[0], scores[0]
+        
+        if self.backend == 'hog':
+            # HOG needs at least one full detection window
+            if image.shape[0] < 128 or image.shape[1] < 64:
+                return empty
+            try:
+                rects, weights = self.hog.detectMultiScale(
+                    image,
+                    winStride=self.win_stride,
+                    padding=self.padding,
+                    scale=self.scale,
+                    hitThreshold=self.hit_threshold
+                )
+            except Exception as e:
+                logging.error(f"HOG detection failed: {str(e)}")
+                return empty
+            # Map the SVM margins to (0, 1), so confidence_threshold applies;
+            # a margin of 0 (the SVM decision boundary) is a confidence of 0.5,
+            # and the default hitThreshold of 0.5 one of about 0.62
+            scores = 1 / (1 + np.exp(-np.asarray(weights, dtype=np.float64).reshape(-1)))
+        else:
+            # Use cascade classifier
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            rects = self.cascade.detectMultiScale(
+                gray,
+                scaleFactor=self.scale,
+                minNeighbors=5,
+                minSize=(30, 30)
+            )
+            scores = np.full(len(rects), 0.8)  # Fixed confidence for cascade
+        
+        # Handle case where no detections found
+        if len(rects) == 0:
+            return empty
+        
+        # Suppress overlapping boxes the detector's own grouping left behind
+        rects = np.asarray(rects, dtype=np.float32).reshape(-1, 4)
+        keep = np.asarray(cv2.dnn.NMSBoxes(rects, scores, 0.0, self.nms_threshold), dtype=np.int64).reshape(-1)
+        rects, scores = rects[keep], scores[keep]
+        boxes = np.concatenate([rects[:, :2], rects[:, :2] + rects[:, 2:]], axis=1)
+        return boxes, scores
+    
+    def _detect_tiled(self, image, mask):
+        """
+        Detect on overlapping tiles in parallel and merge boxes across seams
+        
+        Returns:
+            (boxes, confidences) in image coordinates
+        """
+        image_height, image_width = image.shape[:2]
+        tile = self.tile_size
+        step = max(tile - self.tile_overlap, 1)
+        
+        tiles = []
+        for y0 in self._tile_starts(image_height, tile, step):
+            for x0 in self._tile_starts(image_width, tile, step):
+                y1, x1 = min(y0 + tile, image_height), min(x0 + tile, image_width)
+                # Skip tiles entirely outside the ROI
+                if mask is not None and not np.any(mask[y0:y1, x0:x1]):
+                    continue
+                tiles.append((x0, y0, x1, y1))
+        if not tiles:
+            return np.empty((0, 4), dtype=np.float32), np.empty(0)
+        
+        def offset(bounds, boxes, scores):
+            boxes[:, [0, 2]] += bounds[0]
+            boxes[:, [1, 3]] += bounds[1]
+            return boxes, scores
+        
+        def run(bounds):
+            x0, y0, x1, y1 = bounds
+            return offset(bounds, *self._detect_region(image[y0:y1, x0:x1]))
+        
+        # cv2 releases the GIL, so HOG tiles run concurrently in threads; the
+        # cascade classifier is not thread-safe and runs tiles in sequence,
+        # and an ONNX model takes all tiles as one batch
+        if self.backend == 'dnn':
+            crops = [image[y0:y1, x0:x1] for x0, y0, x1, y1 in tiles]
+            results = [offset(bounds, boxes, scores)
+                       for bounds, boxes, scores in zip(tiles, *self._dnn_detect(crops))]
+        elif self.backend == 'hog' and self.tile_workers > 1 and len(tiles) > 1:
+            if self._tile_executor is None:
+                self._tile_executor = ThreadPoolExecutor(max_workers=self.tile_workers,
+                                                         thread_name_prefix='detect-tile')
+            results = list(self._tile_executor.map(run, tiles))
+        else:
+            results = [run(bounds) for bounds in tiles]
+        
+        boxes = np.concatenate([r[0] for r in results])
+        scores = np.concatenate([r[1] for r in results])
+        keep = self._merge_seam_duplicates(boxes, scores)
+        return boxes[keep], scores[keep]
+    
+    def _dnn_detect(self, images):
+        """
+        Run the ONNX model on a batch of images
+        
+        Each image is letterboxed into the model's square input (scaled to
+        fit, padded at the bottom and right), so all images form one blob.
+        
+        Returns:
+            (boxes, confidences): lists with one (N, 4) array of [x1, y1, x2, y2]
+            in image coordinates and one (N,) array per image
+        """
+        size = self.input_size
+        ratios = np.empty(len(images))
+        canvases = []
+        for i, image in enumerate(images):
+            height, width = image.shape[:2]
+            ratios[i] = size / max(height, width)
+            resized = cv2.resize(image, (max(1, int(round(width * ratios[i]))), max(1, int(round(height * ratios[i])))),
+                                 interpolation=cv2.INTER_AREA if ratios[i] < 1 else cv2.INTER_LINEAR)
+            canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+            canvas[:resized.shape[0], :resized.shape[1]] = resized
+            canvases.append(canvas)
+        
+        blob = cv2.dnn.blobFromImages(canvases, scalefactor=1 / 255.0, size=(size, size), swapRB=True, crop=False)
+        return self._decode_dnn_output(self._dnn_forward(blob), ratios)
+    
+    def _dnn_forward(self, blob):
+        """Run the network on a blob, one image at a time if the model has a fixed batch size of 1"""
+        if not self._single_batch:
+            try:
+                self.net.setInput(blob)
+                output = self.net.forward()
+                if len(output) == len(blob):
+                    return output
+            except cv2.error:
+                if len(blob) == 1:
+                    raise
+            self._single_batch = True
+            logging.info("ONNX model has a fixed batch size; running batches image by image")
+        
+        outputs = []
+        for i in range(len(blob)):
+            self.net.setInput(blob[i:i + 1])
+            outputs.append(self.net.forward())
+        return np.concatenate(outputs)
+    
+    def _decode_dnn_output(self, output, ratios):
+        """
+        Decode YOLO-style model output for a batch of letterboxed images
+        
+        Supports (batch, boxes, 5 + classes) output with an objectness
+        score (YOLOv5) and (batch, 4 + classes, boxes) output without one
+        (YOLOv8). Candidates of all images are filtered, converted and
+        suppressed together; the image index keeps NMS from mixing images.
+        
+        Args:
+            output: Network output
+            ratios: Letterbox scale of each image
+            
+        Returns:
+            (boxes, confidences) lists, one entry per image
+        """
+        output = np.asarray(output, dtype=np.float32).reshape(len(ratios), *output.shape[-2:])
+        if output.shape[1] < output.shape[2]:
+            output = output.transpose(0, 2, 1)
+            scores = output[:, :, 4 + self.person_class_id]
+        else:
+            scores = output[:, :, 4] * output[:, :, 5 + self.person_class_id]
+        
+        image_index, box_index = np.nonzero(scores >= self.confidence_threshold)
+        if len(image_index) == 0:
+            return ([np.empty((0, 4), dtype=np.float32)] * len(ratios), [np.empty(0)] * len(ratios))
+        centers = output[image_index, box_index, :2]
+        sizes = output[image_index, box_index, 2:4]
+        scores = scores[image_index, box_index]
+        
+        # Centre and size to corners, from letterbox to image coordinates
+        boxes = np.concatenate([centers - sizes / 2, centers + sizes / 2], axis=1) / ratios[image_index, None]
+        xywh = np.concatenate([boxes[:, :2], boxes[:, 2:] - boxes[:, :2]], axis=1)
+        keep = np.asarray(cv2.dnn.NMSBoxesBatched(xywh, scores, image_index, self.confidence_threshold,
+                                                  self.nms_threshold), dtype=np.int64).reshape(-1)
+        
+        # Group the kept boxes by image, highest score first
+        keep = keep[np.lexsort((-scores[keep], image_index[keep]))]
+        bounds = np.searchsorted(image_index[keep], np.arange(len(ratios) + 1))
+        per_image = [keep[bounds[i]:bounds[i + 1]] for i in range(len(ratios))]
+        return ([boxes[indices].astype(np.float32) for indices in per_image],
+                [scores[indices].astype(np.float64) for indices in per_image])
+    
+    @staticmethod
+    def _tile_starts(length, tile, step):
+        """Tile offsets covering [0, length), with the last tile flush to the end"""
+        if length <= tile:
+            return [0]
+        starts = list(range(0, length - tile, step))
+        starts.append(length - tile)
+        return starts
+    
+    @staticmethod
+    def _merge_seam_duplicates(boxes, scores, overlap_threshold=0.6):
+        """
+        Suppress duplicate boxes produced by overlapping tiles
+        
+        Overlap is measured as intersection over the smaller box, so a person
+        partly cut off by one tile's edge is merged with the full detection
+        from the neighbouring tile.
+        
+        Returns:
+            Indices of boxes to keep
+        """
+        if len(boxes) < 2:
+            return np.arange(len(boxes))
+        
+        areas = np.prod(boxes[:, 2:] - boxes[:, :2], axis=1)
+        top_left = np.maximum(boxes[:, None, :2], boxes[None, :, :2])
+        bottom_right = np.minimum(boxes[:, None, 2:], boxes[None, :, 2:])
+        intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+        overlap = intersection / np.maximum(np.minimum(areas[:, None], areas[None, :]), 1e-6)
+        
+        # Prefer higher scores, then larger boxes
+        order = np.lexsort((-areas, -scores))
+        suppressed = np.zeros(len(boxes), dtype=bool)
+        keep = []
+        for i in order:
+            if suppressed[i]:
+                continue
+            keep.append(i)
+            suppressed |= overlap[i] > overlap_threshold
+        return np.array(keep, dtype=np.int64)
+    
+    def _roi_at(self, shape):
+        """Get the ROI mask resized to the given (height, width), cached"""
+        if self.roi_mask is None:
+            return None
+        if self._scaled_roi is None or self._scaled_roi.shape != tuple(shape):
+            height, width = shape
+            self._scaled_roi = cv2.resize(self.roi_mask, (width, height), interpolation=cv2.INTER_NEAREST)
+        return self._scaled_roi
+    
+    def draw_detections(self, frame, detections, in_place=False):
         """
         Draw bounding boxes and labels on frame
         
         Args:
             frame: Input frame
-            detections: List of detection results
+            detections: Detections (or a list of detection dictionaries)
+            in_place: Draw onto frame itself instead of a copy
             
         Returns:
             Frame with drawn detections
         """
-        if not detections:
+        if not len(detections):
             return frame
+        detections = Detections.from_list(detections)
         
         # Create a copy to avoid modifying original
-        result_frame = frame.copy()
+        result_frame = frame if in_place else frame.copy()
         
-        for detection in detections:
-            x1, y1, x2, y2 = detection['bbox']
-            confidence = detection['confidence']
-            
+        track_ids = detections.track_ids
+        for i, ((x1, y1, x2, y2), confidence) in enumerate(zip(detections.boxes.tolist(),
+                                                              detections.scores.tolist())):
             # Draw bounding box
             cv2.rectangle(result_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
             
-            # Draw label
-            label = f"Person: {confidence:.2f}"
-            label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
+            # Draw label (with the track ID when the detection is tracked)
+            if track_ids is not None:
+                label = f"ID {track_ids[i]}: {confidence:.2f}"
+            else:
+                label = f"Person: {confidence:.2f}"
+            label_size = text_size(label, 0.5, 2)[0]
             
             # Background rectangle for label
             cv2.rectangle(result_frame, (x1, y1 - label_size[1] - 10), 
@@ -143,16 +637,135 @@ class YOLODetector:
         Get center points of detected persons
         
         Args:
-            detections: List of detection results
+            detections: Detections (or a list of detection dictionaries)
             
         Returns:
-            List of center points [(x, y), ...]
+            (N, 2) integer array of (x, y) center points
+        """
+        return Detections.from_list(detections).centers()
+
+
+class DetectorPool:
+    """Thread-safe pool of YOLODetector instances behind the detector interface"""
+    
+    def __init__(self, size=None, **detector_kwargs):
         """
-        centers = []
-        for detection in detections:
-            x1, y1, x2, y2 = detection['bbox']
-            center_x = (x1 + x2) // 2
-            center_y = (y1 + y2) // 2
-            centers.append((center_x, center_y))
+        Initialize detector pool
         
-        return centers
+        A detector keeps per-instance state (the scaled ROI mask, the tile
+        thread pool) and OpenCV does not guarantee its detectors are safe to
+        share between threads, so every detect_people call borrows an
+        instance for its duration. Instances are created on demand up to
+        size; further callers wait for one to be returned. The pool can be
+        passed wherever a YOLODetector is expected.
+        
+        Args:
+            size: Maximum number of instances (defaults to the CPU count)
+            **detector_kwargs: YOLODetector arguments shared by all instances
+        """
+        self.size = max(1, size or os.cpu_count() or 1)
+        self._detector_kwargs = detector_kwargs
+        self._condition = threading.Condition()
+        self._idle = []
+        self._created = 0
+        self._in_use = 0
+        self._waits = 0
+        
+        # Created up front to validate the settings; also serves the stateless helpers
+        self._primary = YOLODetector(**detector_kwargs)
+        self._instances = [self._primary]
+        self._idle.append(self._primary)
+        self._created = 1
+    
+    @contextmanager
+    def acquire(self):
+        """
+        Borrow a detector for exclusive use
+        
+        Raises:
+            RuntimeError: If a new instance can't be created; its slot is
+                freed, so waiting callers try again (and see the error too)
+        """
+        with self._condition:
+            if not self._idle and self._created >= self.size:
+                self._waits += 1
+                # Wait for a returned instance, or for a slot freed by a failed creation
+                while not self._idle and self._created >= self.size:
+                    self._condition.wait()
+            detector = self._idle.pop() if self._idle else None
+            if detector is None:
+                self._created += 1
+            self._in_use += 1
+        
+        if detector is None:
+            created = False
+            try:
+                detector = YOLODetector(**self._detector_kwargs)
+                created = True
+            finally:
+                with self._condition:
+                    if created:
+                        self._instances.append(detector)
+                    else:
+                        self._created -= 1
+                        self._in_use -= 1
+                        self._condition.notify()
+        
+        try:
+            yield detector
+        finally:
+            with self._condition:
+                self._idle.append(detector)
+                self._in_use -= 1
+                self._condition.notify()
+    
+    def detect_people(self, frame, timer=None):
+        """Detect people in a frame on a borrowed detector (see YOLODetector.detect_people)"""
+        started = time.perf_counter()
+        with self.acquire() as detector:
+            if timer is not None:
+                timer.add('detect.wait', time.perf_counter() - started)
+            return detector.detect_people(frame, timer=timer)
+    
+    def detect_people_batch(self, frames, timer=None):
+        """Detect people in several frames on one borrowed detector (see YOLODetector.detect_people_batch)"""
+        started = time.perf_counter()
+        with self.acquire() as detector:
+            if timer is not None:
+                timer.add('detect.wait', time.perf_counter() - started)
+            return detector.detect_people_batch(frames, timer=timer)
+    
+    def set_roi_mask(self, roi_mask):
+        """Set the ROI mask of every instance, current and future"""
+        with self._condition:
+            self._detector_kwargs['roi_mask'] = roi_mask
+            for detector in self._instances:
+                detector.set_roi_mask(roi_mask)
+    
+    def get_config(self):
+        """Get constructor arguments of the pooled detectors"""
+        return self._primary.get_config()
+    
+    def draw_detections(self, frame, detections, in_place=False):
+        """Draw bounding boxes and labels on frame (see YOLODetector.draw_detections)"""
+        return self._primary.draw_detections(frame, detections, in_place=in_place)
+    
+    def get_person_centers(self, detections):
+        """Get center points of detected persons"""
+        return self._primary.get_person_centers(detections)
+    
+    def get_stats(self):
+        """
+        Get pool usage
+        
+        Returns:
+            Dictionary with the pool size, instances created and in use, and
+            how many borrows had to wait for an instance
+        """
+        with self._condition:
+            return {
+                'size': self.size,
+                'created': self._created,
+                'in_use': self._in_use,
+                'waits': self._waits
+            }
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+
+import numpy as np
+
+from utils.detection import Detections
+
+# Bumped whenever the detector's output changes for the same parameters
+# (2: real HOG scores and non-maximum suppression)
+CACHE_VERSION = 2
+
+# Detector parameters that change how fast detection runs but not its results
+_NON_RESULT_PARAMS = {'tile_workers', 'dnn_threads'}
+
+class DetectionCache:
+    """Persistent, content-addressed store of per-frame detector output"""
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024, max_entries=None):
+        """
+        Initialize detection cache
+
+        Entries are keyed by a hash of the video content plus the detector
+        parameters, so re-uploads of the same clip (under a new file name) and
+        re-renders with different overlay settings reuse earlier detections.
+        Least recently used entries are evicted once the cache grows past its
+        limits.
+
+        Args:
+            cache_dir: Directory holding cache entries
+            max_bytes: Maximum total size of all entries
+            max_entries: Optional maximum number of entries
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, video_path, detector_config):
+        """
+        Build the cache key for a video and detector configuration
+
+        Args:
+            video_path: Path to the input video
+            detector_config: Detector constructor arguments (YOLODetector.get_config)
+
+        Returns:
+            Hex digest identifying the detections
+        """
+        digest = hashlib.sha256(f"v{CACHE_VERSION}".encode())
+        with open(video_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+
+        for name in sorted(detector_config):
+            if name in _NON_RESULT_PARAMS:
+                continue
+            value = detector_config[name]
+            digest.update(name.encode())
+            if isinstance(value, np.ndarray):
+                digest.update(str(value.shape).encode())
+                digest.update(np.ascontiguousarray(value).tobytes())
+            else:
+                digest.update(json.dumps(value).encode())
+        return digest.hexdigest()
+
+    def load(self, key):
+        """
+        Load cached detections
+
+        Args:
+            key: Cache key from make_key
+
+        Returns:
+            Dictionary mapping frame number to its Detections, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                frames = data['frames']
+                counts = data['counts']
+                boxes = data['boxes']
+                scores = data['scores']
+            # Mark as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            logging.error(f"Detection cache read error: {str(e)}")
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        detections = {}
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        for frame, start, end in zip(frames.tolist(), offsets[:-1], offsets[1:]):
+            detections[frame] = Detections(boxes[start:end], scores[start:end])
+        return detections
+
+    def store(self, key, detections):
+        """
+        Save detections and evict old entries if the cache is over its limits
+
+        Args:
+            key: Cache key from make_key
+            detections: Dictionary mapping frame number to its Detections
+        """
+        frames = sorted(detections)
+        per_frame = [Detections.from_list(detections[frame]) for frame in frames] or [Detections()]
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            # Write to a temporary file first so readers never see a partial entry
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(
+                    f,
+                    frames=np.array(frames, dtype=np.int32),
+                    counts=np.array([len(detections[frame]) for frame in frames], dtype=np.int32),
+                    boxes=np.concatenate([d.boxes for d in per_frame]),
+                    scores=np.concatenate([d.scores for d in per_frame])
+                )
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.error(f"Detection cache write error: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits its limits"""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith('.npz'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+            entries.sort()
+            total_bytes = sum(size for _, size, _ in entries)
+            while entries and (total_bytes > self.max_bytes or
+                               (self.max_entries is not None and len(entries) > self.max_entries)):
+                _, size, name = entries.pop(0)
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    pass
+                total_bytes -= size
+                logging.info(f"Evicted detection cache entry: {name}")
+
+    def get_stats(self):
+        """
+        Get cache statistics
+
+        Returns:
+            Dictionary with hits, misses, entries and total size in bytes
+        """
+        sizes = [os.path.getsize(os.path.join(self.cache_dir, name))
+                 for name in os.listdir(self.cache_dir) if name.endswith('.npz')]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(sizes),
+            'total_bytes': sum(sizes)
+        }
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
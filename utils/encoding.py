@@ -0,0 +1,377 @@
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+from utils.segmented_output import PLAYLIST_NAME, SegmentedVideoWriter
+
+# Encoder backends; 'auto' picks ffmpeg when it is installed
+ENCODER_BACKENDS = ('ffmpeg', 'opencv')
+
+# File names of the HLS segments written by ffmpeg
+SEGMENT_PATTERN = 'segment_%05d.ts'
+
+# Marks the end of the frame stream in the encoder queue
+_END = object()
+
+class FFmpegWriter:
+    """cv2.VideoWriter replacement piping raw frames to an ffmpeg process"""
+
+    def __init__(self, output_path, fps, size, preset='veryfast', crf=23, ffmpeg='ffmpeg', segment_dir=None,
+                 segment_seconds=2.0):
+        """
+        Initialize ffmpeg writer
+
+        Frames are encoded with libx264 into browser-compatible H.264
+        (yuv420p). MP4 files get their index moved to the front
+        (+faststart) so playback can start before the whole file has
+        downloaded; .ts paths are written as MPEG-TS.
+
+        With a segment_dir the same encoded stream is also published as an
+        HLS event playlist whose segments ffmpeg adds as each one finishes.
+        All segments come from one encoder, so timestamps run on across
+        segment boundaries, and the MP4 needs no joining afterwards.
+
+        Args:
+            output_path: Path of the video file
+            fps: Frame rate
+            size: (width, height) of the frames
+            preset: x264 preset (speed versus compression)
+            crf: x264 constant rate factor (lower is better quality)
+            ffmpeg: ffmpeg executable
+            segment_dir: Optional directory for the HLS playlist and segments
+                (output_path may then be None for segments only)
+            segment_seconds: Target HLS segment duration
+        """
+        width, height = size
+        self.output_path = output_path
+        self.size = size
+        if segment_dir:
+            os.makedirs(segment_dir, exist_ok=True)
+            outputs = [f"[f=hls:hls_time={segment_seconds:g}:hls_playlist_type=event:hls_flags=temp_file:"
+                       f"hls_segment_filename={os.path.join(segment_dir, SEGMENT_PATTERN)}]"
+                       f"{os.path.join(segment_dir, PLAYLIST_NAME)}"]
+            if output_path:
+                outputs.append(f"[f=mp4:movflags=+faststart]{output_path}")
+            # Segments can only be cut on keyframes
+            output = ['-force_key_frames', f'expr:gte(t,n_forced*{segment_seconds:g})',
+                      '-map', '0:v', '-f', 'tee', '|'.join(outputs)]
+        elif output_path.endswith('.ts'):
+            output = ['-f', 'mpegts', output_path]
+        else:
+            output = ['-movflags', '+faststart', output_path]
+        command = [
+            ffmpeg, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', f'{fps:g}', '-i', '-',
+            '-an', '-c:v', 'libx264', '-preset', preset, '-crf', str(crf),
+            # yuv420p needs even dimensions
+            '-vf', 'crop=trunc(iw/2)*2:trunc(ih/2)*2', '-pix_fmt', 'yuv420p',
+            *output
+        ]
+        # ffmpeg's messages go to a file, so a full stderr pipe can never block it
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self._stderr)
+        self._released = False
+
+    def isOpened(self):
+        return not self._released and self._process.poll() is None
+
+    def write(self, frame):
+        """Send a BGR frame of the configured size to the encoder"""
+        try:
+            self._process.stdin.write(np.ascontiguousarray(frame).data)
+        except (BrokenPipeError, OSError):
+            self._process.wait()
+            raise RuntimeError(f"ffmpeg encoding failed: {self._error_output()}")
+
+    def release(self):
+        """Finish encoding and wait for ffmpeg to write the file"""
+        if self._released:
+            return
+        self._released = True
+        try:
+            self._process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        returncode = self._process.wait()
+        error = self._error_output()
+        self._stderr.close()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg encoding failed: {error}")
+
+    def _error_output(self):
+        """Last lines ffmpeg wrote to stderr"""
+        self._stderr.seek(0)
+        lines = self._stderr.read().decode(errors='replace').strip().splitlines()
+        return ' '.join(lines[-3:]) or f"exit code {self._process.returncode}"
+
+
+class EncodedVideoWriter:
+    """Video writer that downscales, decimates and encodes frames in the background"""
+
+    def __init__(self, sink, size, frame_step=1, frame_offset=0, queue_size=0):
+        """
+        Initialize encoded writer
+
+        Only every frame_step-th frame is kept. Kept frames are resized to
+        the output size if needed and passed to the sink. With a queue they
+        are encoded on a background thread from a pool of preallocated
+        buffers, so encoding overlaps with processing. Callers render into a
+        buffer borrowed with buffer() and write that, which hands it to the
+        encoder without a copy; any other frame is copied (or resized) into a
+        pool buffer, so the caller may reuse it right away. Running out of
+        buffers blocks, so a slow encoder applies backpressure.
+
+        Args:
+            sink: Writer receiving the output frames (write/release/isOpened)
+            size: Output (width, height)
+            frame_step: Keep one frame in this many
+            frame_offset: Index of the first frame written (keeps decimation
+                aligned when a video is written in several parts)
+            queue_size: Frames buffered for the background thread, or 0 to
+                encode synchronously in write
+        """
+        self.sink = sink
+        self.size = tuple(size)
+        self.frame_step = max(1, int(frame_step))
+        self.queue_size = queue_size
+        self._index = frame_offset
+        self._released = False
+        self._error = None
+
+        if queue_size:
+            self._buffers = []
+            self._buffers_lock = threading.Lock()
+            self._free = queue.Queue()
+            # Buffers lent by buffer() that have not been written yet, oldest first
+            self._lent = deque()
+            self._pending = queue.Queue()
+            self._thread = threading.Thread(target=self._encode_loop, name='encode', daemon=True)
+            self._thread.start()
+
+    def isOpened(self):
+        return not self._released and self.sink.isOpened()
+
+    def keeps_frame(self, index):
+        """
+        Check whether a frame will be encoded or dropped by decimation
+
+        Callers can skip rendering frames that would be dropped.
+
+        Args:
+            index: 0-based index of the frame in the whole video
+        """
+        return index % self.frame_step == 0
+
+    def skip(self):
+        """Advance past a dropped frame without passing it"""
+        self._index += 1
+
+    def buffer(self, shape):
+        """
+        Borrow a buffer to render the next kept frame into
+
+        Writing the buffer hands it to the encoder thread instead of copying
+        it. Buffers must be written in the order they were borrowed.
+
+        Args:
+            shape: Shape of the frames that will be written
+
+        Returns:
+            Array of that shape, or None when frames are encoded synchronously
+            or resized (render into a buffer of your own then)
+        """
+        width, height = self.size
+        if not self.queue_size or tuple(shape) != (height, width, 3):
+            return None
+        buffer = self._take_buffer()
+        self._lent.append(buffer)
+        return buffer
+
+    def write(self, frame):
+        """
+        Write the next frame (dropped if decimation does not keep it)
+
+        Raises:
+            RuntimeError: If encoding an earlier frame failed
+        """
+        keep = self.keeps_frame(self._index)
+        self._index += 1
+        if not keep:
+            return
+        if self._error is not None:
+            raise RuntimeError(f"Encoding failed: {self._error}")
+
+        if not self.queue_size:
+            self.sink.write(self._scaled(frame))
+            return
+
+        buffer = self._lent.popleft() if self._lent else self._take_buffer()
+        if frame is not buffer:
+            if frame.shape[1::-1] == self.size:
+                np.copyto(buffer, frame)
+            else:
+                cv2.resize(frame, self.size, dst=buffer, interpolation=cv2.INTER_AREA)
+        self._pending.put(buffer)
+
+    def release(self):
+        """Encode the remaining frames and release the sink"""
+        if self._released:
+            return
+        self._released = True
+        if self.queue_size:
+            self._pending.put(_END)
+            self._thread.join()
+        self.sink.release()
+        if self._error is not None:
+            raise RuntimeError(f"Encoding failed: {self._error}")
+
+    def _scaled(self, frame):
+        """Frame at the output size"""
+        if frame.shape[1::-1] == self.size:
+            return frame
+        return cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+
+    def _take_buffer(self):
+        """Get a free frame buffer, allocating up to queue_size of them"""
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            # Buffers may be borrowed and taken by write on different threads
+            with self._buffers_lock:
+                if len(self._buffers) < self.queue_size:
+                    width, height = self.size
+                    buffer = np.empty((height, width, 3), dtype=np.uint8)
+                    self._buffers.append(buffer)
+                    return buffer
+            return self._free.get()
+
+    def _encode_loop(self):
+        """Encode queued frames until the end marker arrives"""
+        while True:
+            buffer = self._pending.get()
+            if buffer is _END:
+                break
+            # After a failure keep returning buffers so write never blocks forever
+            if self._error is None:
+                try:
+                    self.sink.write(buffer)
+                except Exception as e:
+                    logging.error(f"Encoding error: {str(e)}")
+                    self._error = e
+            self._free.put(buffer)
+
+
+class VideoEncoder:
+    """Output video encoding settings, opening writers for processed videos"""
+
+    def __init__(self, backend='auto', preset='veryfast', crf=23, max_width=None, frame_step=1,
+                 queue_size=8):
+        """
+        Initialize video encoder
+
+        Args:
+            backend: 'ffmpeg' (libx264 through an ffmpeg pipe), 'opencv'
+                (cv2.VideoWriter with mp4v) or 'auto' (ffmpeg if installed);
+                'ffmpeg' falls back to OpenCV when ffmpeg is not installed
+            preset: x264 preset of the ffmpeg backend
+            crf: x264 constant rate factor of the ffmpeg backend
+            max_width: Downscale output wider than this (None keeps the
+                input resolution)
+            frame_step: Keep one frame in this many (frame-rate decimation)
+            queue_size: Frames buffered for background encoding (0 encodes
+                in the processing loop)
+        """
+        if backend not in ENCODER_BACKENDS + ('auto',):
+            raise ValueError(f"Unknown encoder backend: {backend}")
+        self.ffmpeg = shutil.which('ffmpeg')
+        if backend == 'auto':
+            backend = 'ffmpeg' if self.ffmpeg else 'opencv'
+        elif backend == 'ffmpeg' and not self.ffmpeg:
+            logging.warning("ffmpeg not found; encoding with OpenCV instead")
+            backend = 'opencv'
+        self.backend = backend
+        self.preset = preset
+        self.crf = crf
+        self.max_width = max_width
+        self.frame_step = max(1, int(frame_step))
+        self.queue_size = queue_size
+
+    def get_config(self):
+        """Get constructor arguments, e.g. to rebuild the encoder in another process"""
+        return {
+            'backend': self.backend,
+            'preset': self.preset,
+            'crf': self.crf,
+            'max_width': self.max_width,
+            'frame_step': self.frame_step,
+            'queue_size': self.queue_size
+        }
+
+    def output_format(self, fps, size):
+        """
+        Get the output frame rate and size for an input video
+
+        Args:
+            fps: Input frame rate
+            size: Input (width, height)
+
+        Returns:
+            (fps, (width, height)) after decimation and downscaling
+        """
+        width, height = size
+        if self.max_width and width > self.max_width:
+            # Keep the aspect ratio, with even dimensions for H.264
+            height = max(2, int(round(height * self.max_width / width / 2)) * 2)
+            width = self.max_width - self.max_width % 2
+        return fps / self.frame_step, (width, height)
+
+    def open_backend(self, output_path, fps, size):
+        """
+        Open a plain writer of the configured backend, without scaling or decimation
+
+        Returns:
+            FFmpegWriter or cv2.VideoWriter
+        """
+        if self.backend == 'ffmpeg':
+            return FFmpegWriter(output_path, fps, size, preset=self.preset, crf=self.crf, ffmpeg=self.ffmpeg)
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        return cv2.VideoWriter(output_path, fourcc, fps, size)
+
+    def open(self, output_path, fps, size, segment_dir=None, segment_seconds=2.0, frame_offset=0,
+             asynchronous=True):
+        """
+        Open a writer for a processed video
+
+        Args:
+            output_path: Path of the output video
+            fps: Input frame rate
+            size: Input (width, height) of the frames that will be written
+            segment_dir: Optional directory to also publish HLS segments in
+                (from the ffmpeg process itself, or see SegmentedVideoWriter)
+            segment_seconds: Target HLS segment duration
+            frame_offset: Index of the first frame in the whole video
+            asynchronous: Encode on a background thread (if queue_size > 0)
+
+        Returns:
+            EncodedVideoWriter
+        """
+        output_fps, output_size = self.output_format(fps, size)
+        if segment_dir and self.backend == 'ffmpeg':
+            sink = FFmpegWriter(output_path, output_fps, output_size, preset=self.preset, crf=self.crf,
+                                ffmpeg=self.ffmpeg, segment_dir=segment_dir, segment_seconds=segment_seconds)
+        elif segment_dir:
+            sink = SegmentedVideoWriter(output_path, segment_dir, output_fps, output_size,
+                                        segment_seconds=segment_seconds, encoder=self)
+        else:
+            sink = self.open_backend(output_path, output_fps, output_size)
+        logging.info(f"Encoding {output_size[0]}x{output_size[1]} @ {output_fps:g}fps with {self.backend}")
+        return EncodedVideoWriter(sink, output_size, frame_step=self.frame_step, frame_offset=frame_offset,
+                                  queue_size=self.queue_size if asynchronous else 0)
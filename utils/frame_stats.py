@@ -0,0 +1,282 @@
+import json
+import logging
+import os
+import tempfile
+import weakref
+
+import numpy as np
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+class FrameStatsStore:
+    """Columnar per-frame statistics with bounded memory use"""
+
+    COLUMNS = {
+        'frame': np.int32,
+        'timestamp': np.float64,
+        'people_count': np.int32,
+        'density': np.float32
+    }
+
+    def __init__(self, spill_frames=4096, spill_dir=None):
+        """
+        Initialize frame statistics store
+
+        Rows are appended to preallocated NumPy columns. Once spill_frames rows
+        are held in memory they are appended to one raw binary file per column
+        (in frame order), which is memory-mapped for queries and export, so
+        memory use stays constant however long the video is.
+
+        Args:
+            spill_frames: Rows kept in memory before spilling to disk, or None
+                to keep everything in memory
+            spill_dir: Directory for spill files (defaults to the system temp directory)
+        """
+        self.spill_frames = spill_frames
+        self.spill_dir = spill_dir
+
+        capacity = min(1024, spill_frames) if spill_frames else 1024
+        self._columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.COLUMNS.items()}
+        self._size = 0
+        self._spilled = 0
+        self._spill_paths = None
+        self._finalizer = None
+
+    def __len__(self):
+        return self._spilled + self._size
+
+    def append(self, frame, timestamp, people_count, density=0.0):
+        """
+        Add statistics for one frame
+
+        Args:
+            frame: 1-based frame number (frames must be appended in increasing order)
+            timestamp: Frame time in seconds
+            people_count: People detected or tracked on the frame
+            density: Peak heatmap density after the frame
+        """
+        if self._size == len(self._columns['frame']):
+            self._grow(self._size + 1)
+
+        index = self._size
+        self._columns['frame'][index] = frame
+        self._columns['timestamp'][index] = timestamp
+        self._columns['people_count'][index] = people_count
+        self._columns['density'][index] = density
+        self._size += 1
+
+        if self.spill_frames and self._size >= self.spill_frames:
+            self._spill()
+
+    def extend(self, other):
+        """
+        Append all rows of another store (e.g. a later chunk of the same video)
+
+        Args:
+            other: FrameStatsStore whose frames follow this store's frames
+        """
+        for chunk in other.iter_chunks():
+            self._append_columns(chunk)
+
+    def iter_chunks(self):
+        """
+        Iterate over the rows in frame order, a block at a time
+
+        Yields:
+            Dictionaries mapping column name to an array of values
+        """
+        if self._spilled:
+            spilled = self._spilled_columns()
+            step = self.spill_frames or self._spilled
+            for start in range(0, self._spilled, step):
+                yield {name: column[start:start + step] for name, column in spilled.items()}
+        if self._size:
+            yield {name: column[:self._size] for name, column in self._columns.items()}
+
+    def column(self, name):
+        """
+        Get one column for all frames
+
+        Args:
+            name: Column name (see COLUMNS)
+
+        Returns:
+            NumPy array with the column's values in frame order
+        """
+        parts = [chunk[name] for chunk in self.iter_chunks()]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=self.COLUMNS[name])
+
+    def query(self, start_frame=None, end_frame=None):
+        """
+        Get statistics for a range of frames
+
+        Only the requested rows are read from the spill files.
+
+        Args:
+            start_frame: First frame number to include (None for the start)
+            end_frame: Last frame number to include (None for the end)
+
+        Returns:
+            Dictionary mapping column name to an array of values
+        """
+        return self._range('frame', start_frame, end_frame)
+
+    def query_time(self, start_time=None, end_time=None):
+        """
+        Get statistics for a time range
+
+        Like query, this binary-searches the (increasing) timestamps and only
+        reads the requested rows from the spill files.
+
+        Args:
+            start_time: Start of the range in seconds (None for the start)
+            end_time: End of the range in seconds, inclusive (None for the end)
+
+        Returns:
+            Dictionary mapping column name to an array of values
+        """
+        return self._range('timestamp', start_time, end_time)
+
+    def to_records(self, start_frame=None, end_frame=None):
+        """
+        Get statistics as one dictionary per frame (the legacy frame_stats format)
+
+        Args:
+            start_frame: First frame number to include (None for the start)
+            end_frame: Last frame number to include (None for the end)
+
+        Returns:
+            List of dictionaries with frame, people_count, timestamp and density
+        """
+        return self._records(self.query(start_frame, end_frame))
+
+    def save_npz(self, output_path):
+        """
+        Save all columns to an uncompressed NumPy archive
+
+        Args:
+            output_path: Path of the .npz file
+        """
+        np.savez(output_path, **{name: self.column(name) for name in self.COLUMNS})
+
+    @classmethod
+    def load_npz(cls, input_path, spill_frames=None):
+        """
+        Load a store saved with save_npz
+
+        Args:
+            input_path: Path of the .npz file
+            spill_frames: Spill threshold of the new store
+
+        Returns:
+            FrameStatsStore with the saved rows
+        """
+        store = cls(spill_frames=spill_frames)
+        with np.load(input_path) as data:
+            store._append_columns({name: data[name] for name in cls.COLUMNS})
+        return store
+
+    def save_json(self, output_path, **extra):
+        """
+        Stream all rows to a JSON file without building them in memory
+
+        Args:
+            output_path: Path of the JSON file
+            **extra: Additional top-level keys to write after the statistics
+        """
+        with open(output_path, 'w') as f:
+            f.write('{"frame_statistics": [')
+            separator = ''
+            for chunk in self.iter_chunks():
+                for record in self._records(chunk):
+                    f.write(separator)
+                    f.write(json.dumps(record))
+                    separator = ', '
+            f.write(']')
+            for key, value in extra.items():
+                f.write(f', {json.dumps(key)}: {json.dumps(value)}')
+            f.write('}')
+
+    def close(self):
+        """Delete spill files; the store keeps only rows still in memory"""
+        if self._finalizer is not None:
+            self._finalizer()
+            self._finalizer = None
+        self._spill_paths = None
+        self._spilled = 0
+
+    def _append_columns(self, columns):
+        """Append a block of rows given as column arrays"""
+        count = len(columns['frame'])
+        self._grow(self._size + count)
+        for name in self.COLUMNS:
+            self._columns[name][self._size:self._size + count] = columns[name]
+        self._size += count
+
+        if self.spill_frames and self._size >= self.spill_frames:
+            self._spill()
+
+    def _grow(self, min_capacity):
+        """Reallocate the in-memory columns to hold at least min_capacity rows"""
+        capacity = len(self._columns['frame'])
+        if min_capacity <= capacity:
+            return
+        capacity = max(min_capacity, capacity * 2)
+        for name, column in self._columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def _spill(self):
+        """Append the in-memory rows to the spill files"""
+        if self._spill_paths is None:
+            fd, base = tempfile.mkstemp(prefix='frame_stats_', dir=self.spill_dir)
+            os.close(fd)
+            os.remove(base)
+            self._spill_paths = {name: f"{base}.{name}" for name in self.COLUMNS}
+            self._finalizer = weakref.finalize(self, _remove_files, list(self._spill_paths.values()))
+
+        for name, path in self._spill_paths.items():
+            with open(path, 'ab') as f:
+                self._columns[name][:self._size].tofile(f)
+        self._spilled += self._size
+        self._size = 0
+        logging.debug(f"Spilled frame statistics to disk: {self._spilled} frames")
+
+    def _spilled_columns(self):
+        """Memory-map the spilled rows"""
+        return {name: np.memmap(path, dtype=self.COLUMNS[name], mode='r', shape=(self._spilled,))
+                for name, path in self._spill_paths.items()}
+
+    def _range(self, key, start, end):
+        """Rows whose value of an increasing column falls in [start, end], from disk and memory"""
+        parts = []
+        if self._spilled:
+            parts.append(self._slice(self._spilled_columns(), self._spilled, key, start, end))
+        parts.append(self._slice(self._columns, self._size, key, start, end))
+        return {name: np.concatenate([part[name] for part in parts]) for name in self.COLUMNS}
+
+    @staticmethod
+    def _slice(columns, size, key, start, end):
+        """Rows of a set of columns, ordered by the key column, that fall in a range of it"""
+        keys = columns[key][:size]
+        low = 0 if start is None else np.searchsorted(keys, start, side='left')
+        high = size if end is None else np.searchsorted(keys, end, side='right')
+        return {name: np.asarray(column[low:high]) for name, column in columns.items()}
+
+    @staticmethod
+    def _records(columns):
+        """Convert a block of columns to per-frame dictionaries"""
+        return [{
+            'frame': frame,
+            'people_count': people_count,
+            'timestamp': timestamp,
+            'density': round(density, 4)
+        } for frame, people_count, timestamp, density in zip(
+            columns['frame'].tolist(), columns['people_count'].tolist(),
+            columns['timestamp'].tolist(), columns['density'].tolist())]
@@ -1,26 +1,103 @@
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
-from matplotlib.backends.backend_agg import FigureCanvasAgg
 import logging
+import time
+
+def _build_hot_lut():
+    """
+    Build a 256-entry BGR lookup table matching matplotlib's 'hot' colormap
+    
+    Returns:
+        uint8 array of shape (256, 1, 3) usable with cv2.LUT
+    """
+    x = np.linspace(0.0, 1.0, 256)
+    red = np.interp(x, [0.0, 0.365079, 1.0], [0.0416, 1.0, 1.0])
+    green = np.interp(x, [0.0, 0.365079, 0.746032, 1.0], [0.0, 0.0, 1.0, 1.0])
+    blue = np.interp(x, [0.0, 0.746032, 1.0], [0.0, 0.0, 1.0])
+    lut = np.stack([blue, green, red], axis=-1) * 255
+    return lut.astype(np.uint8).reshape(256, 1, 3)
+
+HOT_COLORMAP_LUT = _build_hot_lut()
 
 class HeatmapGenerator:
     """Generate heatmaps for crowd density visualization"""
     
-    def __init__(self, grid_size=50, decay_factor=0.95):
+    # Fold the lazy decay scale back into the data once it drops below this
+    RENORMALIZE_BELOW = 1e-4
+    
+    def __init__(self, grid_size=50, decay_factor=0.95, blur_radius=2):
         """
         Initialize heatmap generator
         
         Args:
             grid_size: Size of grid cells for heatmap
             decay_factor: Temporal decay factor for heatmap
+            blur_radius: Radius of the Gaussian spread around each detection
         """
         self.grid_size = grid_size
         self.decay_factor = decay_factor
-        self.heatmap_data = None
+        self.blur_radius = blur_radius
         self.frame_shape = None
         
+        # Heatmap values are _heatmap_raw * _scale; decay only touches _scale.
+        # _heatmap_raw is the interior of a buffer padded by blur_radius so
+        # kernels near the edges can be splatted without bounds checks.
+        self._padded = None
+        self._heatmap_raw = None
+        self._scale = 1.0
+        
+        # Overlay render cache: the colorized layer is rebuilt only when the
+        # normalized heatmap changes (decay alone leaves it unchanged)
+        self._version = 0
+        self._layer = None
+        self._layer_version = -1
+        self._overlay_buffer = None
+        self._snapshot = None
+        
+        self._stamp = self._build_stamp(blur_radius)
+        offsets = np.arange(2 * blur_radius + 1)
+        self._stamp_dy, self._stamp_dx = [o.ravel() for o in np.meshgrid(offsets, offsets, indexing='ij')]
+    
+    @staticmethod
+    def _build_stamp(radius):
+        """
+        Build the per-detection increment: 1.0 at the center plus a Gaussian
+        kernel normalized to a total weight of 0.5
+        """
+        offsets = np.arange(-radius, radius + 1)
+        sigma = radius / 3.0
+        kernel = np.exp(-(offsets[:, None] ** 2 + offsets[None, :] ** 2) / (2 * sigma * sigma))
+        kernel = kernel / np.sum(kernel) * 0.5
+        kernel[radius, radius] += 1.0
+        return kernel.ravel()
+    
+    @property
+    def heatmap_data(self):
+        """Current heatmap grid (folds any pending decay into the data)"""
+        if self._heatmap_raw is not None:
+            self._renormalize()
+        return self._heatmap_raw
+    
+    @heatmap_data.setter
+    def heatmap_data(self, data):
+        if data is None:
+            self._padded = None
+            self._heatmap_raw = None
+        else:
+            r = self.blur_radius
+            height, width = data.shape
+            self._padded = np.zeros((height + 2 * r, width + 2 * r), dtype=np.float32)
+            self._heatmap_raw = self._padded[r:r + height, r:r + width]
+            self._heatmap_raw[:] = data
+        self._scale = 1.0
+        self._version += 1
+    
+    def _renormalize(self):
+        """Fold the lazy decay scale into the stored data"""
+        if self._scale != 1.0:
+            self._padded *= self._scale
+            self._scale = 1.0
+    
     def initialize_heatmap(self, frame_shape):
         """
         Initialize heatmap data structure
@@ -40,108 +117,169 @@ class HeatmapGenerator:
         
         logging.info(f"Heatmap initialized: {self.grid_height}x{self.grid_width} grid")
     
-    def update_heatmap(self, person_centers):
+    def update_heatmap(self, person_centers, elapsed_frames=1):
         """
         Update heatmap with new person detections
         
         Args:
-            person_centers: List of person center points [(x, y), ...]
+            person_centers: Person center points, as [(x, y), ...] or an (N, 2) array
+            elapsed_frames: Frames since the previous update, i.e. how many
+                decay steps to apply (more than 1 when frames were dropped)
         """
-        if self.heatmap_data is None:
+        if self._heatmap_raw is None:
             logging.warning("Heatmap not initialized")
             return
         
-        # Apply temporal decay
-        self.heatmap_data *= self.decay_factor
+        # Apply temporal decay lazily
+        self._scale *= self.decay_factor ** elapsed_frames
+        if self._scale < self.RENORMALIZE_BELOW:
+            self._renormalize()
         
-        # Add new detections
-        for center_x, center_y in person_centers:
-            # Convert to grid coordinates
-            grid_x = min(center_x // self.grid_size, self.grid_width - 1)
-            grid_y = min(center_y // self.grid_size, self.grid_height - 1)
-            
-            # Increment heatmap value
-            self.heatmap_data[grid_y, grid_x] += 1.0
-            
-            # Apply Gaussian blur for smooth transitions
-            self._apply_gaussian_around_point(grid_y, grid_x)
+        centers = np.asarray(person_centers, dtype=np.int64).reshape(-1, 2)
+        if len(centers) == 0:
+            return
+        
+        # Convert to grid coordinates (offset into the padded buffer)
+        grid_x = np.clip(centers[:, 0] // self.grid_size, 0, self.grid_width - 1)
+        grid_y = np.clip(centers[:, 1] // self.grid_size, 0, self.grid_height - 1)
+        
+        # Splat the Gaussian stamp around every center in one operation;
+        # contributions that fall into the padding are outside the grid
+        rows = grid_y[:, None] + self._stamp_dy
+        cols = grid_x[:, None] + self._stamp_dx
+        np.add.at(self._padded, (rows, cols), self._stamp / self._scale)
+        self._version += 1
     
-    def _apply_gaussian_around_point(self, grid_y, grid_x, radius=2):
+    def merge_heatmap(self, chunk_heatmap, num_frames):
         """
-        Apply Gaussian blur around a specific grid point
-        
+        Append a heatmap accumulated from zero over the frames that follow
+
+        Equivalent to having run update_heatmap over those frames directly: the
+        current data decays once per frame and the chunk's data is added on top.
+
         Args:
-            grid_y: Y coordinate in grid
-            grid_x: X coordinate in grid
-            radius: Radius of Gaussian effect
+            chunk_heatmap: Heatmap data of the following chunk of frames
+            num_frames: Number of frames in that chunk
         """
-        # Define Gaussian kernel
-        kernel_size = 2 * radius + 1
-        kernel = np.zeros((kernel_size, kernel_size))
-        
-        center = radius
-        sigma = radius / 3.0
+        if self.heatmap_data is None:
+            logging.warning("Heatmap not initialized")
+            return
+
+        self.heatmap_data *= self.decay_factor ** num_frames
+        self.heatmap_data += chunk_heatmap
+        self._version += 1
+
+    def get_overlay_snapshot(self):
+        """
+        Capture the current heatmap in the small form needed to render it
         
-        for i in range(kernel_size):
-            for j in range(kernel_size):
-                x, y = i - center, j - center
-                kernel[i, j] = np.exp(-(x*x + y*y) / (2 * sigma * sigma))
+        Snapshots let rendering run on another thread while the heatmap keeps
+        updating.
         
-        # Normalize kernel
-        kernel = kernel / np.sum(kernel) * 0.5
+        Returns:
+            (version, indices) with the grid normalized to 8-bit colormap
+            indices, or None if the heatmap is not initialized
+        """
+        if self._heatmap_raw is None:
+            return None
         
-        # Apply kernel to heatmap
-        for i in range(kernel_size):
-            for j in range(kernel_size):
-                target_y = grid_y + i - center
-                target_x = grid_x + j - center
-                
-                if (0 <= target_y < self.grid_height and 
-                    0 <= target_x < self.grid_width):
-                    self.heatmap_data[target_y, target_x] += kernel[i, j]
+        if self._snapshot is None or self._snapshot[0] != self._version:
+            # Normalize the raw grid (this cancels the lazy decay scale)
+            max_value = float(np.max(self._heatmap_raw))
+            if max_value > 0:
+                indices = cv2.convertScaleAbs(self._heatmap_raw, alpha=255.0 / max_value)
+            else:
+                indices = np.zeros(self._heatmap_raw.shape, dtype=np.uint8)
+            self._snapshot = (self._version, indices)
+        return self._snapshot
     
-    def generate_heatmap_overlay(self, frame, alpha=0.4):
+    def generate_heatmap_overlay(self, frame, alpha=0.4, snapshot=None, out=None, timer=None):
         """
         Generate heatmap overlay on frame
         
+        Without an explicit output buffer, the returned frame is an internal
+        buffer that is reused by the next call, so it must be consumed (written
+        or copied) before then.
+        
         Args:
             frame: Input frame
             alpha: Transparency of heatmap overlay
+            snapshot: Heatmap state from get_overlay_snapshot (defaults to the current state)
+            out: Optional output buffer with the frame's shape
+            timer: Optional StageTimer recording the 'overlay.colorize' and
+                'overlay.blend' steps
             
         Returns:
             Frame with heatmap overlay
         """
-        if self.heatmap_data is None:
-            return frame
+        if snapshot is None:
+            snapshot = self.get_overlay_snapshot()
+            if snapshot is None:
+                return frame
         
         try:
-            # Resize heatmap to match frame dimensions
-            frame_height, frame_width = frame.shape[:2]
-            heatmap_resized = cv2.resize(self.heatmap_data, (frame_width, frame_height))
-            
-            # Normalize heatmap values
-            if np.max(heatmap_resized) > 0:
-                heatmap_normalized = heatmap_resized / np.max(heatmap_resized)
-            else:
-                heatmap_normalized = heatmap_resized
-            
-            # Create colormap
-            colormap = plt.get_cmap('hot')
-            heatmap_colored = colormap(heatmap_normalized)
+            started = time.perf_counter()
+            layer = self._colorize(frame.shape[:2], snapshot)
+            colorized = time.perf_counter()
             
-            # Convert to BGR format
-            heatmap_bgr = (heatmap_colored[:, :, :3] * 255).astype(np.uint8)
-            heatmap_bgr = cv2.cvtColor(heatmap_bgr, cv2.COLOR_RGB2BGR)
+            # Blend into a preallocated output buffer
+            if out is None:
+                if self._overlay_buffer is None or self._overlay_buffer.shape != frame.shape:
+                    self._overlay_buffer = np.empty_like(frame)
+                out = self._overlay_buffer
+            cv2.addWeighted(frame, 1 - alpha, layer, alpha, 0, dst=out)
             
-            # Create overlay
-            overlay = cv2.addWeighted(frame, 1 - alpha, heatmap_bgr, alpha, 0)
-            
-            return overlay
+            if timer is not None:
+                timer.add('overlay.colorize', colorized - started)
+                timer.add('overlay.blend', time.perf_counter() - colorized)
+            return out
             
         except Exception as e:
             logging.error(f"Heatmap overlay error: {str(e)}")
             return frame
     
+    def _colorize(self, frame_size, snapshot):
+        """
+        Get the colorized heatmap layer at frame resolution
+        
+        The snapshot's 8-bit colormap indices are upsampled and mapped through
+        the precomputed LUT. Indices are upsampled rather than colors so the
+        colormap's knees are preserved. The result is cached until the heatmap
+        changes.
+        
+        Args:
+            frame_size: (height, width) of the target frame
+            snapshot: (version, indices) from get_overlay_snapshot
+            
+        Returns:
+            BGR uint8 layer of shape (height, width, 3)
+        """
+        version, indices = snapshot
+        frame_height, frame_width = frame_size
+        if (self._layer is not None and self._layer_version == version
+                and self._layer.shape[:2] == (frame_height, frame_width)):
+            return self._layer
+        
+        # Upsample the 8-bit indices and colorize into the cached layer
+        indices = cv2.resize(indices, (frame_width, frame_height), interpolation=cv2.INTER_LINEAR)
+        if self._layer is None or self._layer.shape[:2] != (frame_height, frame_width):
+            self._layer = np.empty((frame_height, frame_width, 3), dtype=np.uint8)
+        cv2.applyColorMap(indices, HOT_COLORMAP_LUT, dst=self._layer)
+        
+        self._layer_version = version
+        return self._layer
+    
+    def get_max_density(self):
+        """
+        Get the current peak heatmap density (cheap enough to call every frame)
+        
+        Returns:
+            Maximum heatmap value, or 0.0 if the heatmap is not initialized
+        """
+        if self._heatmap_raw is None:
+            return 0.0
+        return float(np.max(self._heatmap_raw)) * self._scale
+    
     def get_density_stats(self):
         """
         Get density statistics from current heatmap
@@ -149,12 +287,12 @@ class HeatmapGenerator:
         Returns:
             Dictionary with density statistics
         """
-        if self.heatmap_data is None:
+        if self._heatmap_raw is None:
             return {'max_density': 0, 'avg_density': 0, 'total_activity': 0}
         
-        max_density = np.max(self.heatmap_data)
-        avg_density = np.mean(self.heatmap_data)
-        total_activity = np.sum(self.heatmap_data)
+        max_density = np.max(self._heatmap_raw) * self._scale
+        avg_density = np.mean(self._heatmap_raw) * self._scale
+        total_activity = np.sum(self._heatmap_raw) * self._scale
         
         return {
             'max_density': float(max_density),
@@ -174,6 +312,11 @@ class HeatmapGenerator:
             return
         
         try:
+            # Only needed for this static export; keep matplotlib off the frame path
+            import matplotlib
+            matplotlib.use('Agg')
+            import matplotlib.pyplot as plt
+            
             fig, ax = plt.subplots(figsize=(10, 8))
             
             # Create heatmap plot
@@ -198,5 +341,7 @@ class HeatmapGenerator:
     
     def reset_heatmap(self):
         """Reset heatmap data"""
-        if self.heatmap_data is not None:
-            self.heatmap_data.fill(0)
+        if self._padded is not None:
+            self._padded.fill(0)
+            self._scale = 1.0
+            self._version += 1
@@ -0,0 +1,349 @@
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    client_id TEXT,
+    filename TEXT,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    options TEXT NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    owner_pid INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created_at);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_client_created ON jobs (client_id, created_at);
+
+CREATE TABLE IF NOT EXISTS results (
+    job_id TEXT PRIMARY KEY REFERENCES jobs (id) ON DELETE CASCADE,
+    total_frames INTEGER,
+    max_people_count INTEGER,
+    avg_people_per_frame REAL,
+    video_duration REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_max_people ON results (max_people_count);
+
+CREATE TABLE IF NOT EXISTS artifacts (
+    job_id TEXT NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (job_id, kind)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS frame_stats (
+    job_id TEXT NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+    frame INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    people_count INTEGER NOT NULL,
+    density REAL NOT NULL,
+    PRIMARY KEY (job_id, frame)
+) WITHOUT ROWID;
+"""
+
+# Columns of a job listing, with the result summary of completed jobs
+_JOB_COLUMNS = ('id', 'client_id', 'filename', 'kind', 'status', 'options', 'error',
+                'created_at', 'started_at', 'finished_at',
+                'total_frames', 'max_people_count', 'avg_people_per_frame', 'video_duration')
+
+class JobStore:
+    """Persistent record of jobs, their results, files and per-frame statistics"""
+
+    def __init__(self, db_path):
+        """
+        Initialize job store
+
+        Jobs are kept in a SQLite database, so results and downloads outlive
+        the in-memory job manager, the browser session and server restarts.
+        Every job's files (upload, processed video, segments, timeline) are
+        recorded as artifacts and deleted with the job by cleanup.
+
+        Args:
+            db_path: Path of the SQLite database file
+        """
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # One connection shared by all threads; writes are short and serialized
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('PRAGMA foreign_keys=ON')
+        with self._lock, self._connection:
+            self._connection.executescript(_SCHEMA)
+            # Databases created before jobs recorded the process running them
+            columns = {row['name'] for row in self._connection.execute('PRAGMA table_info(jobs)')}
+            if 'owner_pid' not in columns:
+                self._connection.execute('ALTER TABLE jobs ADD COLUMN owner_pid INTEGER')
+
+    def add_job(self, job):
+        """
+        Record a newly queued job and its input and output files
+
+        The job is owned by this process, which is the only one that will run it.
+
+        Args:
+            job: Job instance
+        """
+        kind = 'analysis' if job.options.get('analytics_only') else 'video'
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO jobs (id, client_id, filename, kind, status, options, created_at, owner_pid) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job.id, job.client_id, job.filename, kind, job.status, json.dumps(job.options), job.created_at,
+                 os.getpid()))
+            self._connection.execute('INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?)',
+                                     (job.id, 'input', job.input_path))
+            if job.output_path:
+                self._connection.execute('INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?)',
+                                         (job.id, 'output', job.output_path))
+
+    def update_job(self, job):
+        """
+        Record a job's status, and its results once it has completed
+
+        Args:
+            job: Job instance
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                'UPDATE jobs SET status = ?, error = ?, started_at = ?, finished_at = ? WHERE id = ?',
+                (job.status, job.error, job.started_at, job.finished_at, job.id))
+            if job.status == 'completed' and job.results is not None:
+                results = job.results
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                    (job.id, results.get('total_frames'), results.get('max_people_count'),
+                     results.get('avg_people_per_frame'), results.get('video_duration'), json.dumps(results)))
+
+    def delete_job(self, job_id):
+        """Forget a job and everything recorded for it (its files are kept)"""
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+    def fail_unfinished(self, error):
+        """
+        Mark queued or processing jobs whose process has exited as failed
+
+        Jobs run in memory of the process that accepted them, so those it
+        left unfinished will never finish. Jobs of other live processes (e.g.
+        the other workers of the same server) are left alone. Call this before
+        the process accepts jobs: anything recorded under its own pid then
+        belongs to an earlier process that had the same pid.
+
+        Args:
+            error: Error message to record
+
+        Returns:
+            Number of jobs marked as failed
+        """
+        with self._lock, self._connection:
+            rows = self._connection.execute(
+                "SELECT id, owner_pid FROM jobs WHERE status IN ('queued', 'processing')").fetchall()
+            orphaned = [(row['id'],) for row in rows
+                        if row['owner_pid'] is None or row['owner_pid'] == os.getpid()
+                        or not _process_alive(row['owner_pid'])]
+            finished_at = time.time()
+            self._connection.executemany(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? "
+                "WHERE id = ? AND status IN ('queued', 'processing')",
+                [(error, finished_at, job_id) for job_id, in orphaned])
+        return len(orphaned)
+
+    def get_job(self, job_id):
+        """
+        Get a job by id
+
+        Returns:
+            Dictionary of the job's fields and result summary, or None if unknown
+        """
+        with self._lock:
+            row = self._connection.execute(
+                f'SELECT {", ".join(_JOB_COLUMNS)} FROM jobs LEFT JOIN results ON results.job_id = jobs.id '
+                'WHERE jobs.id = ?', (job_id,)).fetchone()
+        return _job_dict(row) if row is not None else None
+
+    def get_results(self, job_id):
+        """Get a completed job's results dictionary, or None"""
+        with self._lock:
+            row = self._connection.execute('SELECT data FROM results WHERE job_id = ?', (job_id,)).fetchone()
+        return json.loads(row['data']) if row is not None else None
+
+    def list_jobs(self, client_id=None, status=None, kind=None, since=None, until=None, min_people=None,
+                  limit=50, offset=0):
+        """
+        List past and current jobs, newest first
+
+        Args:
+            client_id: Only jobs submitted by this client
+            status: Only jobs with this status
+            kind: Only 'video' or 'analysis' jobs
+            since: Only jobs created at or after this Unix time
+            until: Only jobs created before this Unix time
+            min_people: Only completed jobs with at least this many people on one frame
+            limit: Maximum number of jobs returned
+            offset: Number of matching jobs to skip
+
+        Returns:
+            List of job dictionaries (see get_job)
+        """
+        conditions, params = [], []
+        for condition, value in (('client_id = ?', client_id), ('status = ?', status), ('kind = ?', kind),
+                                 ('created_at >= ?', since), ('created_at < ?', until),
+                                 ('max_people_count >= ?', min_people)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        where = f'WHERE {" AND ".join(conditions)} ' if conditions else ''
+        with self._lock:
+            rows = self._connection.execute(
+                f'SELECT {", ".join(_JOB_COLUMNS)} FROM jobs LEFT JOIN results ON results.job_id = jobs.id '
+                f'{where}ORDER BY created_at DESC LIMIT ? OFFSET ?', params + [limit, offset]).fetchall()
+        return [_job_dict(row) for row in rows]
+
+    def add_artifact(self, job_id, kind, path):
+        """
+        Record a file or directory belonging to a job
+
+        Args:
+            job_id: Job id
+            kind: Artifact kind, e.g. 'output', 'media' or 'timeline' (one path per kind)
+            path: Path of the file or directory
+        """
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?)', (job_id, kind, path))
+
+    def get_artifact(self, job_id, kind):
+        """Get the path of a job's artifact, or None"""
+        with self._lock:
+            row = self._connection.execute('SELECT path FROM artifacts WHERE job_id = ? AND kind = ?',
+                                           (job_id, kind)).fetchone()
+        return row['path'] if row is not None else None
+
+    def save_frame_stats(self, job_id, frame_stats):
+        """
+        Store a job's per-frame statistics
+
+        Args:
+            job_id: Job id
+            frame_stats: FrameStatsStore of the job's video
+        """
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM frame_stats WHERE job_id = ?', (job_id,))
+            for chunk in frame_stats.iter_chunks():
+                columns = [chunk[name].tolist() for name in ('frame', 'timestamp', 'people_count', 'density')]
+                rows = zip([job_id] * len(columns[0]), *columns)
+                self._connection.executemany('INSERT INTO frame_stats VALUES (?, ?, ?, ?, ?)', rows)
+
+    def get_frame_stats(self, job_id, start_frame=None, end_frame=None, limit=None):
+        """
+        Get a job's per-frame statistics for a range of frames
+
+        Args:
+            job_id: Job id
+            start_frame: First frame number to include (None for the start)
+            end_frame: Last frame number to include (None for the end)
+            limit: Maximum number of frames returned
+
+        Returns:
+            List of dictionaries with frame, people_count, timestamp and density
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT frame, people_count, timestamp, density FROM frame_stats '
+                'WHERE job_id = ? AND frame >= ? AND frame <= ? ORDER BY frame LIMIT ?',
+                (job_id, start_frame if start_frame is not None else 0,
+                 end_frame if end_frame is not None else 2 ** 62,
+                 limit if limit is not None else -1)).fetchall()
+        return [dict(row) for row in rows]
+
+    def cleanup(self, max_age):
+        """
+        Delete finished jobs older than max_age together with their files
+
+        Only files recorded as artifacts of the expired jobs (their upload,
+        outputs, segments, timeline and profile) are deleted; nothing else in
+        the upload and output folders is touched.
+
+        Args:
+            max_age: Retention in seconds, counted from when a job finished
+
+        Returns:
+            Number of jobs deleted
+        """
+        cutoff = time.time() - max_age
+        with self._lock, self._connection:
+            expired = [row['id'] for row in self._connection.execute(
+                "SELECT id FROM jobs WHERE status IN ('completed', 'failed') AND finished_at < ?", (cutoff,))]
+            paths = []
+            for job_id in expired:
+                paths += [row['path'] for row in self._connection.execute(
+                    'SELECT path FROM artifacts WHERE job_id = ?', (job_id,))]
+                self._connection.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+        for path in paths:
+            _remove_path(path)
+        if expired:
+            logging.info(f"Cleaned up {len(expired)} expired jobs ({len(paths)} files)")
+        return len(expired)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def _job_dict(row):
+    """Job dictionary of a listing row"""
+    job = dict(row)
+    job['job_id'] = job.pop('id')
+    job['options'] = json.loads(job['options'])
+    return job
+
+
+def _process_alive(pid):
+    """Whether a process with this pid is running"""
+    if os.name == 'nt':
+        # os.kill(pid, 0) would send a Ctrl+C on Windows
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        try:
+            exit_code = ctypes.c_ulong()
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+            return exit_code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _remove_path(path):
+    """Delete a file or directory if it still exists"""
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,287 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class JobQueueFull(Exception):
+    """Raised when the job queue cannot accept more work"""
+
+
+class Job:
+    """A single video processing job and its live progress"""
+
+    def __init__(self, job_id, input_path, output_path, client_id=None, options=None, filename=None):
+        """
+        Initialize job
+
+        Args:
+            job_id: Unique job identifier (the upload file_id)
+            input_path: Path to the uploaded video
+            output_path: Path to save the processed video
+            client_id: Identifier of the submitting client, used for fair scheduling
+            options: Optional dictionary of processing options
+            filename: Original name of the uploaded file
+        """
+        self.id = job_id
+        self.input_path = input_path
+        self.output_path = output_path
+        self.client_id = client_id or job_id
+        self.options = options or {}
+        self.filename = filename
+
+        self.status = 'queued'
+        self.frames_processed = 0
+        self.total_frames = 0
+        self.results = None
+        self.error = None
+
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+        self._lock = threading.Lock()
+
+    def mark_started(self):
+        """Mark job as picked up by a worker"""
+        with self._lock:
+            self.status = 'processing'
+            self.started_at = time.time()
+
+    def update_progress(self, frames_processed, total_frames):
+        """
+        Record progress reported by the processing loop
+
+        Args:
+            frames_processed: Number of frames processed so far
+            total_frames: Total number of frames in the video (0 if unknown)
+        """
+        with self._lock:
+            self.frames_processed = frames_processed
+            self.total_frames = max(total_frames, 0)
+
+    def mark_completed(self, results):
+        """Mark job as completed with its results"""
+        with self._lock:
+            self.status = 'completed'
+            self.results = results
+            self.finished_at = time.time()
+            if self.total_frames < self.frames_processed:
+                self.total_frames = self.frames_processed
+
+    def mark_failed(self, error):
+        """Mark job as failed with an error message"""
+        with self._lock:
+            self.status = 'failed'
+            self.error = str(error)
+            self.finished_at = time.time()
+
+    @property
+    def finished(self):
+        return self.status in ('completed', 'failed')
+
+    def to_dict(self):
+        """
+        Get a JSON-serializable progress snapshot
+
+        Returns:
+            Dictionary with status, frame counts, throughput and ETA
+        """
+        with self._lock:
+            frames_processed = self.frames_processed
+            total_frames = self.total_frames
+            status = self.status
+            started_at = self.started_at
+            finished_at = self.finished_at
+            error = self.error
+
+        # Throughput and ETA from the processing loop's frame counter
+        fps = 0.0
+        eta_seconds = None
+        if started_at is not None:
+            elapsed = (finished_at or time.time()) - started_at
+            if elapsed > 0 and frames_processed > 0:
+                fps = frames_processed / elapsed
+            if status == 'processing' and fps > 0 and total_frames > 0:
+                eta_seconds = max(total_frames - frames_processed, 0) / fps
+
+        if status == 'completed':
+            progress = 100.0
+        elif total_frames > 0:
+            progress = min(frames_processed / total_frames * 100, 99.9)
+        else:
+            progress = 0.0
+
+        return {
+            'job_id': self.id,
+            'status': status,
+            'progress': round(progress, 1),
+            'frames_processed': frames_processed,
+            'total_frames': total_frames,
+            'fps': round(fps, 2),
+            'eta_seconds': round(eta_seconds, 1) if eta_seconds is not None else None,
+            'error': error
+        }
+
+
+class JobManager:
+    """Bounded pool of background workers for video processing jobs"""
+
+    def __init__(self, process_fn, num_workers=2, max_queued=20, max_finished=200, store=None):
+        """
+        Initialize job manager
+
+        Jobs are queued per client and workers take them round-robin across
+        clients, so one client submitting long videos cannot starve others.
+
+        Args:
+            process_fn: Callable taking a Job and returning its results dict
+            num_workers: Number of background worker threads
+            max_queued: Maximum number of jobs waiting for a worker
+            max_finished: Number of finished jobs kept in memory for status
+                lookups
+            store: Optional JobStore recording every job's status and results,
+                for lookups of jobs no longer kept in memory
+        """
+        self.process_fn = process_fn
+        self.num_workers = max(1, num_workers)
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.store = store
+
+        self._jobs = OrderedDict()
+        self._queues = OrderedDict()  # client_id -> deque of pending jobs
+        self._queued_count = 0
+        self._condition = threading.Condition()
+        self._workers = []
+
+    def submit(self, job):
+        """
+        Enqueue a job for background processing
+
+        Args:
+            job: Job instance
+
+        Raises:
+            JobQueueFull: If the queue is at capacity
+        """
+        with self._condition:
+            if self._queued_count >= self.max_queued:
+                raise JobQueueFull("Processing queue is full, please try again later")
+            if self.store is not None:
+                self.store.add_job(job)
+
+            self._jobs[job.id] = job
+            self._queues.setdefault(job.client_id, deque()).append(job)
+            self._queued_count += 1
+            self._prune_finished()
+            self._ensure_workers()
+            self._condition.notify()
+
+        logging.info(f"Job {job.id} queued ({self._queued_count} waiting)")
+
+    def get(self, job_id):
+        """Get a job by id, or None if unknown"""
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def get_stats(self):
+        """
+        Get queue and worker gauges
+
+        Returns:
+            Dictionary with queued, active and retained job counts and the
+            number of workers
+        """
+        with self._condition:
+            active = sum(1 for job in self._jobs.values() if job.status == 'processing')
+            return {
+                'queued_jobs': self._queued_count,
+                'active_jobs': active,
+                'tracked_jobs': len(self._jobs),
+                'workers': self.num_workers
+            }
+
+    def queue_position(self, job_id):
+        """
+        Get the number of queued jobs a worker will take before this one
+
+        Returns:
+            Position (0 = next), or None if the job is not queued
+        """
+        with self._condition:
+            order = self._dispatch_order()
+        for position, job in enumerate(order):
+            if job.id == job_id:
+                return position
+        return None
+
+    def _dispatch_order(self):
+        """Simulate round-robin dispatch over the per-client queues"""
+        queues = [list(q) for q in self._queues.values()]
+        order = []
+        depth = 0
+        while any(depth < len(q) for q in queues):
+            for q in queues:
+                if depth < len(q):
+                    order.append(q[depth])
+            depth += 1
+        return order
+
+    def _next_job(self):
+        """Pop the next job, rotating across clients (caller holds the lock)"""
+        client_id, queue = next(iter(self._queues.items()))
+        job = queue.popleft()
+        del self._queues[client_id]
+        if queue:
+            # Move client to the back of the rotation
+            self._queues[client_id] = queue
+        self._queued_count -= 1
+        return job
+
+    def _ensure_workers(self):
+        """Start worker threads on first use (caller holds the lock)"""
+        self._workers = [w for w in self._workers if w.is_alive()]
+        while len(self._workers) < self.num_workers:
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"job-worker-{len(self._workers)}",
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def _prune_finished(self):
+        """Drop the oldest finished jobs beyond the retention limit"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job_id]
+
+    def _worker_loop(self):
+        """Worker thread main loop"""
+        while True:
+            with self._condition:
+                while not self._queued_count:
+                    self._condition.wait()
+                job = self._next_job()
+
+            job.mark_started()
+            self._record(job)
+            logging.info(f"Job {job.id} started")
+            try:
+                results = self.process_fn(job)
+                job.mark_completed(results)
+                logging.info(f"Job {job.id} completed")
+            except Exception as e:
+                logging.error(f"Job {job.id} failed: {str(e)}")
+                job.mark_failed(e)
+            self._record(job)
+
+    def _record(self, job):
+        """Save a job's status (and results) to the store, if there is one"""
+        if self.store is None:
+            return
+        try:
+            self.store.update_job(job)
+        except Exception as e:
+            logging.error(f"Job {job.id} could not be recorded: {str(e)}")
@@ -0,0 +1,195 @@
+import bisect
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Upper bounds (seconds) of the job duration histogram buckets
+JOB_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+class StageTimer:
+    """Low-overhead per-stage timings and counters for one processing run"""
+
+    def __init__(self):
+        """
+        Initialize stage timer
+
+        Each stage keeps a call count, total and maximum time and histogram
+        bucket counts, so timers from several chunks or jobs can be merged
+        without keeping individual samples. Recording takes no locks: each
+        stage should be recorded from a single thread.
+        """
+        self.stages = {}
+        self.counters = {}
+
+    def add(self, stage, seconds):
+        """
+        Record one timing of a stage
+
+        Args:
+            stage: Stage name, e.g. 'decode'
+            seconds: Elapsed time in seconds
+        """
+        entry = self.stages.get(stage)
+        if entry is None:
+            entry = self.stages[stage] = [0, 0.0, 0.0, [0] * (len(LATENCY_BUCKETS) + 1)]
+        entry[0] += 1
+        entry[1] += seconds
+        if seconds > entry[2]:
+            entry[2] = seconds
+        entry[3][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    @contextmanager
+    def measure(self, stage):
+        """Time the body of a with block as one call of a stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def count(self, counter, amount=1):
+        """Increase a counter, e.g. detections or skipped frames"""
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def merge(self, other):
+        """Add another timer's timings and counters to this one"""
+        for stage, (calls, total, maximum, buckets) in other.stages.items():
+            entry = self.stages.get(stage)
+            if entry is None:
+                self.stages[stage] = [calls, total, maximum, list(buckets)]
+                continue
+            entry[0] += calls
+            entry[1] += total
+            entry[2] = max(entry[2], maximum)
+            entry[3] = [a + b for a, b in zip(entry[3], buckets)]
+        for counter, value in other.counters.items():
+            self.count(counter, value)
+
+    def summary(self):
+        """
+        Get the timing breakdown
+
+        Returns:
+            Dictionary with per-stage calls, total/mean/max time and share of
+            the total recorded time, plus the counters
+        """
+        # Nested stages (e.g. 'detect.inference' inside 'detect') don't add to the total
+        recorded = sum(entry[1] for stage, entry in self.stages.items() if '.' not in stage)
+        stages = {}
+        for stage, (calls, total, maximum, _) in sorted(self.stages.items(), key=lambda item: -item[1][1]):
+            stages[stage] = {
+                'calls': calls,
+                'total_seconds': round(total, 4),
+                'mean_ms': round(total / calls * 1000, 3) if calls else 0.0,
+                'max_ms': round(maximum * 1000, 3),
+                'share': round(total / recorded, 3) if recorded > 0 else 0.0
+            }
+        return {'stages': stages, 'counters': dict(self.counters)}
+
+
+class MetricsRegistry:
+    """Process-wide metrics across jobs, exported in Prometheus text format"""
+
+    def __init__(self, prefix='crowdpulse'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._stages = StageTimer()
+        self._jobs = {}
+        self._job_durations = [0] * (len(JOB_BUCKETS) + 1)
+        self._job_duration_sum = 0.0
+
+    def observe_job(self, status, duration, timer=None):
+        """
+        Record a finished job
+
+        Args:
+            status: Final job status ('completed' or 'failed')
+            duration: Job processing time in seconds
+            timer: StageTimer of the job, if it got as far as processing
+        """
+        with self._lock:
+            self._jobs[status] = self._jobs.get(status, 0) + 1
+            self._job_durations[bisect.bisect_left(JOB_BUCKETS, duration)] += 1
+            self._job_duration_sum += duration
+            if timer is not None:
+                self._stages.merge(timer)
+
+    def render(self, gauges=None):
+        """
+        Render all metrics in the Prometheus text exposition format
+
+        Args:
+            gauges: Optional dictionary of extra gauge values, e.g. queue depth
+
+        Returns:
+            Metrics text
+        """
+        p = self.prefix
+        lines = []
+        with self._lock:
+            lines += [f"# HELP {p}_jobs_total Finished processing jobs by status",
+                      f"# TYPE {p}_jobs_total counter"]
+            for status, value in sorted(self._jobs.items()):
+                lines.append(f'{p}_jobs_total{{status="{status}"}} {value}')
+
+            lines += [f"# HELP {p}_job_duration_seconds Processing time of finished jobs",
+                      f"# TYPE {p}_job_duration_seconds histogram"]
+            lines += self._histogram(f"{p}_job_duration_seconds", '', JOB_BUCKETS,
+                                     self._job_durations, self._job_duration_sum)
+
+            lines += [f"# HELP {p}_stage_seconds Time spent per call of each processing stage",
+                      f"# TYPE {p}_stage_seconds histogram"]
+            for stage, (_, total, _, buckets) in sorted(self._stages.stages.items()):
+                lines += self._histogram(f"{p}_stage_seconds", f'stage="{stage}"', LATENCY_BUCKETS,
+                                         buckets, total)
+
+            for counter, value in sorted(self._stages.counters.items()):
+                name = f"{p}_{counter}_total"
+                lines += [f"# TYPE {name} counter", f"{name} {value}"]
+
+        for gauge, value in sorted((gauges or {}).items()):
+            name = f"{p}_{gauge}"
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _histogram(name, labels, bounds, buckets, total):
+        """Lines of one Prometheus histogram from per-bucket (non-cumulative) counts"""
+        separator = ',' if labels else ''
+        lines = []
+        cumulative = 0
+        for bound, count in zip(bounds, buckets):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{separator}le="{bound}"}} {cumulative}')
+        cumulative += buckets[-1]
+        lines.append(f'{name}_bucket{{{labels}{separator}le="+Inf"}} {cumulative}')
+        suffix = f'{{{labels}}}' if labels else ''
+        lines.append(f'{name}_sum{suffix} {round(total, 6)}')
+        lines.append(f'{name}_count{suffix} {cumulative}')
+        return lines
+
+
+def profile_summary(profiler, limit=20):
+    """
+    Summarize a cProfile capture
+
+    Args:
+        profiler: Finished cProfile.Profile
+        limit: Number of functions to include
+
+    Returns:
+        List of the functions with the most own time, with call counts and
+        own and cumulative time
+    """
+    profile = pstats.Stats(profiler).get_stats_profile()
+    functions = sorted(profile.func_profiles.items(), key=lambda item: -item[1].tottime)
+    return [{
+        'function': f"{entry.file_name}:{entry.line_number}({name})",
+        'calls': entry.ncalls,
+        'own_seconds': round(entry.tottime, 4),
+        'cumulative_seconds': round(entry.cumtime, 4)
+    } for name, entry in functions[:limit]]
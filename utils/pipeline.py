@@ -0,0 +1,234 @@
+import logging
+import queue
+import threading
+import time
+
+import numpy as np
+
+# Marks the end of the frame stream in a queue
+_END = object()
+
+class StageStats:
+    """Busy-time and input-queue-depth counters for one pipeline stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.frames = 0
+        self.busy_time = 0.0
+        self.wait_time = 0.0
+        self._depth_total = 0
+        self._depth_samples = 0
+        self.max_queue_depth = 0
+
+    def sample_depth(self, depth):
+        self._depth_total += depth
+        self._depth_samples += 1
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def to_dict(self, wall_time):
+        return {
+            'frames': self.frames,
+            'busy_time': round(self.busy_time, 3),
+            'wait_time': round(self.wait_time, 3),
+            'utilization': round(self.busy_time / wall_time, 3) if wall_time > 0 else 0.0,
+            'avg_queue_depth': round(self._depth_total / self._depth_samples, 2) if self._depth_samples else 0.0,
+            'max_queue_depth': self.max_queue_depth
+        }
+
+
+class FramePipeline:
+    """Run decode, analysis, rendering and encoding as threaded stages"""
+
+    STAGES = ('decode', 'analyze', 'render', 'encode')
+
+    def __init__(self, processor, heatmap_generator, queue_size=8):
+        """
+        Initialize pipeline
+
+        Each stage runs on its own thread and hands frames to the next stage
+        through a bounded queue, so a slow stage applies backpressure instead of
+        frames piling up in memory. One thread per stage keeps frames in order,
+        and the stages call the same VideoProcessor steps as the serial loop, so
+        the output is frame-for-frame identical.
+
+        Args:
+            processor: VideoProcessor providing the per-frame steps
+            heatmap_generator: Initialized HeatmapGenerator instance
+            queue_size: Capacity of each queue between stages
+        """
+        self.processor = processor
+        self.heatmap_generator = heatmap_generator
+        self.queue_size = queue_size
+        self.stats = {name: StageStats(name) for name in self.STAGES}
+
+        self._stop = threading.Event()
+        self._errors = []
+
+    def run(self, cap, out, fps, total_frames, start_frame=0, end_frame=None, progress_callback=None,
+            cached_detections=None):
+        """
+        Process a range of frames through the pipeline
+
+        Args:
+            cap: Opened cv2.VideoCapture positioned at start_frame
+            out: EncodedVideoWriter receiving rendered frames
+            fps: Video frame rate
+            total_frames: Total number of frames (for progress logging)
+            start_frame: 0-based index of the first frame to process
+            end_frame: 0-based index to stop before, or None to read to the end
+            progress_callback: Optional callable(frame_count) invoked after every frame
+            cached_detections: Detections to replay, by frame number
+
+        Returns:
+            Per-range statistics, as VideoProcessor._process_frames, plus pipeline_stats
+        """
+        processor = self.processor
+        run = processor._start_run(fps, start_frame, cached_detections)
+        timer = run['timer']
+        last_frame = [start_frame]
+
+        decoded = queue.Queue(maxsize=self.queue_size)
+        analyzed = queue.Queue(maxsize=self.queue_size)
+        rendered = queue.Queue(maxsize=self.queue_size)
+
+        # Frames are rendered into the encoder's own buffers when it lends them;
+        # otherwise rendered frames wait in the encode queue, so the render stage
+        # cycles through enough buffers that none is reused before it is written
+        buffers = [None] * (self.queue_size + 2)
+
+        def decode():
+            frame_count = start_frame
+            while end_frame is None or frame_count < end_frame:
+                with timer.measure('decode'):
+                    ret, frame = cap.read()
+                if not ret:
+                    break
+                frame_count += 1
+                yield frame_count, frame
+
+        def analyze(item):
+            frame_count, frame = item
+            return frame, processor._analyze_frame(run, frame, frame_count, self.heatmap_generator,
+                                                   render=out.keeps_frame(frame_count - 1))
+
+        def render(item):
+            frame, analysis = item
+            # Frames the encoder drops are not rendered
+            if not out.keeps_frame(analysis['frame'] - 1):
+                return analysis['frame'], None
+            buffer = out.buffer(frame.shape)
+            if buffer is None:
+                index = (analysis['frame'] - start_frame - 1) % len(buffers)
+                if buffers[index] is None:
+                    buffers[index] = np.empty_like(frame)
+                buffer = buffers[index]
+            return analysis['frame'], processor._render_frame(frame, analysis, self.heatmap_generator,
+                                                              out=buffer, timer=timer)
+
+        def encode(item):
+            frame_count, frame = item
+            if frame is None:
+                out.skip()
+            else:
+                with timer.measure('encode'):
+                    out.write(frame)
+            last_frame[0] = frame_count
+            processor._frame_done(frame_count, total_frames, progress_callback)
+
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._source_stage, args=('decode', decode, decoded), daemon=True),
+            threading.Thread(target=self._stage, args=('analyze', analyze, decoded, analyzed), daemon=True),
+            threading.Thread(target=self._stage, args=('render', render, analyzed, rendered), daemon=True),
+            threading.Thread(target=self._stage, args=('encode', encode, rendered, None), daemon=True)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall_time = time.perf_counter() - started
+
+        if self._errors:
+            raise self._errors[0]
+
+        results = processor._finish_run(run, last_frame[0])
+        results['pipeline_stats'] = self.get_stats(wall_time)
+        return results
+
+    def get_stats(self, wall_time):
+        """
+        Get per-stage counters
+
+        Returns:
+            Dictionary with per-stage statistics and the busiest (bottleneck) stage
+        """
+        stages = {name: stat.to_dict(wall_time) for name, stat in self.stats.items()}
+        bottleneck = max(self.stats.values(), key=lambda stat: stat.busy_time).name
+        return {'wall_time': round(wall_time, 3), 'bottleneck': bottleneck, 'stages': stages}
+
+    def _source_stage(self, name, generate, output_queue):
+        """Run the first stage, timing each item it produces"""
+        stat = self.stats[name]
+        try:
+            items = generate()
+            while not self._stop.is_set():
+                started = time.perf_counter()
+                item = next(items, _END)
+                stat.busy_time += time.perf_counter() - started
+                if item is _END:
+                    break
+                stat.frames += 1
+                self._put(output_queue, item, stat)
+        except Exception as e:
+            self._fail(name, e)
+        finally:
+            self._put(output_queue, _END, stat, force=True)
+
+    def _stage(self, name, work, input_queue, output_queue):
+        """Run a middle or final stage until the end marker arrives"""
+        stat = self.stats[name]
+        try:
+            while True:
+                stat.sample_depth(input_queue.qsize())
+                item = self._get(input_queue, stat)
+                if item is _END:
+                    break
+                # After a failure keep draining so upstream stages can finish
+                if self._stop.is_set():
+                    continue
+                try:
+                    started = time.perf_counter()
+                    result = work(item)
+                    stat.busy_time += time.perf_counter() - started
+                    stat.frames += 1
+                except Exception as e:
+                    self._fail(name, e)
+                    continue
+                if output_queue is not None:
+                    self._put(output_queue, result, stat)
+        finally:
+            if output_queue is not None:
+                self._put(output_queue, _END, stat, force=True)
+
+    def _put(self, output_queue, item, stat, force=False):
+        """Put with backpressure; gives up on a stopped pipeline unless forced"""
+        started = time.perf_counter()
+        while True:
+            try:
+                output_queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                if self._stop.is_set() and not force:
+                    break
+        stat.wait_time += time.perf_counter() - started
+
+    def _get(self, input_queue, stat):
+        started = time.perf_counter()
+        item = input_queue.get()
+        stat.wait_time += time.perf_counter() - started
+        return item
+
+    def _fail(self, name, error):
+        logging.error(f"Pipeline stage '{name}' failed: {str(error)}")
+        self._errors.append(error)
+        self._stop.set()
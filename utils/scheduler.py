@@ -0,0 +1,128 @@
+import cv2
+import numpy as np
+
+class DetectionScheduler:
+    """Decide which frames need a detector run based on scene motion"""
+
+    def __init__(self, min_interval=2, max_interval=15, motion_threshold=0.02,
+                 pixel_threshold=15, probe_width=160):
+        """
+        Initialize detection scheduler
+
+        Args:
+            min_interval: Minimum number of frames between detector runs
+            max_interval: Maximum number of frames a detection may be reused
+            motion_threshold: Fraction of changed probe pixels (since the last
+                detection) that triggers a new detection; None disables motion
+                gating, giving a fixed detection interval
+            pixel_threshold: Gray-level difference for a probe pixel to count as changed
+            probe_width: Width of the downscaled grayscale motion probe
+        """
+        if min_interval < 1 or max_interval < min_interval:
+            raise ValueError("Scheduler intervals must satisfy 1 <= min_interval <= max_interval")
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.motion_threshold = motion_threshold
+        self.pixel_threshold = pixel_threshold
+        self.probe_width = probe_width
+        self.reset()
+
+    @classmethod
+    def fixed(cls, interval):
+        """Create a scheduler that detects on every interval-th frame"""
+        return cls(min_interval=interval, max_interval=interval, motion_threshold=None)
+
+    def get_config(self):
+        """Get constructor arguments, e.g. to rebuild the scheduler in another process"""
+        return {
+            'min_interval': self.min_interval,
+            'max_interval': self.max_interval,
+            'motion_threshold': self.motion_threshold,
+            'pixel_threshold': self.pixel_threshold,
+            'probe_width': self.probe_width
+        }
+
+    def reset(self):
+        """Reset state and counters for a new video"""
+        self._reference = None
+        # Start "stale" so the first frame is always detected
+        self._frames_since_detection = self.max_interval
+        self.last_motion = 0.0
+        self.detector_calls = 0
+        self.frames_skipped = 0
+
+    def needs_frame(self):
+        """
+        Check whether the next should_detect call will look at the frame
+
+        When it does not, the caller may skip decoding that frame (e.g. with
+        cv2.VideoCapture.grab) and pass None instead.
+
+        Returns:
+            True if the next frame must be decoded
+        """
+        frames_since_detection = self._frames_since_detection + 1
+        if frames_since_detection >= self.max_interval:
+            return True
+        return frames_since_detection >= self.min_interval and self.motion_threshold is not None
+
+    def should_detect(self, frame):
+        """
+        Decide whether to run the detector on a frame
+
+        Args:
+            frame: Current BGR frame, or None if needs_frame() was False
+
+        Returns:
+            True if the detector should run on this frame
+        """
+        self._frames_since_detection += 1
+        probe = None
+
+        if self._frames_since_detection >= self.max_interval:
+            detect = True
+        elif self._frames_since_detection < self.min_interval or self.motion_threshold is None:
+            detect = False
+        else:
+            probe = self._probe(frame)
+            self.last_motion = self._motion(probe)
+            detect = self.last_motion >= self.motion_threshold
+
+        if not detect:
+            self.frames_skipped += 1
+            return False
+
+        # The detected frame becomes the reference for measuring further motion
+        if self.motion_threshold is not None:
+            self._reference = probe if probe is not None else self._probe(frame)
+        self._frames_since_detection = 0
+        self.detector_calls += 1
+        return True
+
+    def _probe(self, frame):
+        """Downscaled, blurred grayscale version of a frame for motion measurement"""
+        height, width = frame.shape[:2]
+        probe_height = max(1, int(round(height * self.probe_width / width)))
+        small = cv2.resize(frame, (self.probe_width, probe_height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def _motion(self, probe):
+        """Fraction of probe pixels that changed since the last detection"""
+        diff = cv2.absdiff(probe, self._reference)
+        return np.count_nonzero(diff > self.pixel_threshold) / diff.size
+
+    def get_stats(self):
+        """
+        Get scheduling statistics
+
+        Returns:
+            Dictionary with detector calls and skipped frames
+        """
+        total = self.detector_calls + self.frames_skipped
+        return {
+            'detector_calls': self.detector_calls,
+            'frames_skipped': self.frames_skipped,
+            'skip_ratio': round(self.frames_skipped / total, 3) if total else 0.0
+        }
@@ -0,0 +1,157 @@
+import logging
+import math
+import os
+import shutil
+import subprocess
+
+import cv2
+
+PLAYLIST_NAME = 'index.m3u8'
+
+def concatenate_videos(paths, output_path, fps, size):
+    """
+    Concatenate video files, in order, into one video
+
+    Uses ffmpeg stream copy when available, otherwise re-encodes with OpenCV.
+
+    Args:
+        paths: Paths of the videos to join
+        output_path: Path of the joined .mp4 file
+        fps: Frame rate (for the OpenCV fallback)
+        size: (width, height) of the frames (for the OpenCV fallback)
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg:
+        list_path = f"{os.path.splitext(output_path)[0]}_segments.txt"
+        with open(list_path, 'w') as f:
+            for path in paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        try:
+            subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                            '-i', list_path, '-c', 'copy', '-movflags', '+faststart', output_path],
+                           check=True, capture_output=True)
+        finally:
+            os.remove(list_path)
+    else:
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        out = cv2.VideoWriter(output_path, fourcc, fps, size)
+        for path in paths:
+            cap = cv2.VideoCapture(path)
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                out.write(frame)
+            cap.release()
+        out.release()
+
+
+class SegmentedVideoWriter:
+    """Drop-in cv2.VideoWriter replacement publishing the video as HLS segments"""
+
+    def __init__(self, output_path, segment_dir, fps, size, segment_seconds=2.0, encoder=None):
+        """
+        Initialize segmented writer
+
+        Frames are encoded into short MPEG-TS segments, each starting on a
+        keyframe, and every finished segment is added to an HLS playlist
+        right away, so players can start and seek within the video while
+        later segments are still being processed. On release the playlist
+        is closed and the segments are joined into a single file for
+        download.
+
+        Each segment comes from its own writer and restarts its timestamps,
+        so the playlist marks every boundary as a discontinuity. The ffmpeg
+        backend publishes segments from a single encoder instead (see
+        FFmpegWriter); this writer is the fallback for other writers.
+
+        Args:
+            output_path: Path of the complete .mp4 written on release, or None
+            segment_dir: Directory for the segments and playlist
+            fps: Frame rate
+            size: (width, height) of the frames
+            segment_seconds: Target segment duration
+            encoder: Optional VideoEncoder whose backend encodes the segments
+                (defaults to cv2.VideoWriter with mp4v)
+        """
+        self.output_path = output_path
+        self.segment_dir = segment_dir
+        self.fps = fps
+        self.size = size
+        self.frames_per_segment = max(1, int(round(segment_seconds * fps)))
+        self.target_duration = math.ceil(self.frames_per_segment / fps)
+        self.playlist_path = os.path.join(segment_dir, PLAYLIST_NAME)
+        self.encoder = encoder
+
+        self.segments = []  # (file name, frame count) of finished segments
+        self._writer = None
+        self._segment_frames = 0
+        self._released = False
+
+        os.makedirs(segment_dir, exist_ok=True)
+        self._write_playlist(finished=False)
+
+    def isOpened(self):
+        return not self._released
+
+    def write(self, frame):
+        """Encode a frame, starting a new segment when the current one is full"""
+        if self._writer is None:
+            name = f"segment_{len(self.segments):05d}.ts"
+            path = os.path.join(self.segment_dir, name)
+            if self.encoder is not None:
+                self._writer = self.encoder.open_backend(path, self.fps, self.size)
+            else:
+                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+                self._writer = cv2.VideoWriter(path, fourcc, self.fps, self.size)
+            self._segment_name = name
+
+        self._writer.write(frame)
+        self._segment_frames += 1
+        if self._segment_frames >= self.frames_per_segment:
+            self._finish_segment()
+
+    def release(self):
+        """Finish the last segment, close the playlist and write the complete video"""
+        if self._released:
+            return
+        self._released = True
+        if self._writer is not None:
+            self._finish_segment()
+        self._write_playlist(finished=True)
+
+        if self.output_path is not None and self.segments:
+            paths = [os.path.join(self.segment_dir, name) for name, _ in self.segments]
+            concatenate_videos(paths, self.output_path, self.fps, self.size)
+        logging.info(f"Wrote {len(self.segments)} segments to {self.segment_dir}")
+
+    def _finish_segment(self):
+        """Close the current segment and publish it in the playlist"""
+        self._writer.release()
+        self._writer = None
+        self.segments.append((self._segment_name, self._segment_frames))
+        self._segment_frames = 0
+        self._write_playlist(finished=False)
+
+    def _write_playlist(self, finished):
+        """Rewrite the playlist atomically, so readers never see a partial file"""
+        lines = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:3',
+            f'#EXT-X-TARGETDURATION:{self.target_duration}',
+            '#EXT-X-MEDIA-SEQUENCE:0',
+            # EVENT playlists only grow, so players can seek back to the start
+            '#EXT-X-PLAYLIST-TYPE:EVENT'
+        ]
+        for index, (name, frames) in enumerate(self.segments):
+            if index:
+                # Every segment was encoded separately, with timestamps starting at 0
+                lines.append('#EXT-X-DISCONTINUITY')
+            lines += [f'#EXTINF:{frames / self.fps:.3f},', name]
+        if finished:
+            lines.append('#EXT-X-ENDLIST')
+
+        temp_path = f"{self.playlist_path}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, self.playlist_path)
@@ -0,0 +1,349 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from utils.annotation import InfoPanel
+from utils.heatmap import HeatmapGenerator
+from utils.scheduler import DetectionScheduler
+from utils.tracking import PersonTracker
+
+FRAME_POLICIES = ('drop_oldest', 'latest')
+
+class StreamProcessor:
+    """Continuously analyze a live video source within a latency budget"""
+
+    def __init__(self, source, detector, scheduler=None, tracker=None, window_seconds=60.0,
+                 latency_budget=0.5, buffer_size=4, frame_policy='drop_oldest', replay_speed=None,
+                 grid_size=50, reconnect_delay=2.0):
+        """
+        Initialize stream processor
+
+        A reader thread pulls frames from the source as they arrive and a
+        worker thread analyzes them. Frames wait in a small buffer; when the
+        worker falls behind, frames are dropped instead of queueing up, so
+        results never lag real time by more than the latency budget.
+
+        Args:
+            source: Anything cv2.VideoCapture accepts: an RTSP/HTTP URL, a
+                device index, or a local file (replayed at wall-clock speed)
+            detector: Initialized YOLODetector instance
+            scheduler: DetectionScheduler deciding which frames run the detector
+            tracker: PersonTracker carrying detections between detector runs
+            window_seconds: Length of the rolling statistics window; the heatmap
+                decays so that older activity fades out over the same time
+            latency_budget: Maximum age in seconds of a frame when its analysis
+                starts; older frames are dropped if a newer one is waiting
+            buffer_size: Frames buffered between reader and worker
+            frame_policy: 'drop_oldest' analyzes buffered frames in order and
+                evicts the oldest when the buffer is full; 'latest' always
+                skips to the newest frame
+            replay_speed: Playback speed for local files (defaults to 1.0 for
+                files and no throttling for live sources)
+            grid_size: Heatmap grid cell size in pixels
+            reconnect_delay: Seconds to wait before reopening a live source
+                that stopped delivering frames
+        """
+        if frame_policy not in FRAME_POLICIES:
+            raise ValueError(f"frame_policy must be one of {FRAME_POLICIES}")
+
+        self.source = source
+        self.detector = detector
+        self.scheduler = scheduler or DetectionScheduler()
+        self.tracker = tracker or PersonTracker()
+        self.window_seconds = window_seconds
+        self.latency_budget = latency_budget
+        self.frame_policy = frame_policy
+        self.is_file = isinstance(source, str) and os.path.isfile(source)
+        self.replay_speed = replay_speed if replay_speed is not None else (1.0 if self.is_file else None)
+        self.grid_size = grid_size
+        self.reconnect_delay = reconnect_delay
+
+        self.status = 'created'
+        self.error = None
+        self.fps = None
+        self.heatmap_generator = None
+
+        self._buffer = deque(maxlen=buffer_size)
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._reader_done = False
+        self._threads = []
+
+        # Rolling window of (timestamp, people_count) for processed frames
+        self._window = deque()
+        self._window_total = 0
+        self._stats_lock = threading.Lock()
+        self._render_lock = threading.Lock()
+        self._latest = None
+        self._info_panel = None
+
+        self.frames_read = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self._latency_total = 0.0
+        self.max_latency = 0.0
+        self._processing_time = 0.0
+        self._started_at = None
+        self._last_frame_number = 0
+
+    def start(self):
+        """Open the source and start the reader and worker threads"""
+        cap = self._open()
+        if cap is None:
+            raise ValueError(f"Cannot open video source: {self.source}")
+
+        source_fps = cap.get(cv2.CAP_PROP_FPS)
+        self.fps = source_fps if source_fps and source_fps > 0 else 25.0
+
+        # Decay so activity older than the window has faded to 5%
+        decay_factor = 0.05 ** (1.0 / max(1.0, self.window_seconds * self.fps))
+        self.heatmap_generator = HeatmapGenerator(grid_size=self.grid_size, decay_factor=decay_factor)
+        self.scheduler.reset()
+        self.tracker.reset()
+
+        self._started_at = time.monotonic()
+        self.status = 'running'
+        self._threads = [
+            threading.Thread(target=self._read_loop, args=(cap,), daemon=True),
+            threading.Thread(target=self._process_loop, daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logging.info(f"Stream started: {self.source} @ {self.fps}fps")
+
+    def stop(self, timeout=5.0):
+        """Stop processing and wait for the threads to finish"""
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        if self.status == 'running':
+            self.status = 'stopped'
+        logging.info(f"Stream stopped: {self.source}")
+
+    @property
+    def running(self):
+        return self.status == 'running'
+
+    def _open(self):
+        """Open the capture, or return None if the source is unavailable"""
+        source = int(self.source) if isinstance(self.source, str) and self.source.isdigit() else self.source
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        return cap
+
+    def _read_loop(self, cap):
+        """Read frames as they arrive and hand them to the worker"""
+        started = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                if self.replay_speed:
+                    # Replay files at wall-clock speed, like a live camera
+                    due = started + self.frames_read / (self.fps * self.replay_speed)
+                    delay = due - time.monotonic()
+                    if delay > 0:
+                        self._stop.wait(delay)
+
+                ret, frame = cap.read()
+                if not ret:
+                    if self.is_file:
+                        break
+                    # Live source dropped out; reopen it
+                    logging.warning(f"Stream source stopped delivering frames: {self.source}")
+                    cap.release()
+                    cap = None
+                    while cap is None and not self._stop.wait(self.reconnect_delay):
+                        cap = self._open()
+                    if cap is None:
+                        break
+                    continue
+
+                self.frames_read += 1
+                with self._condition:
+                    if len(self._buffer) == self._buffer.maxlen:
+                        # The deque evicts the oldest frame on append
+                        self.frames_dropped += 1
+                    self._buffer.append((self.frames_read, time.monotonic(), frame))
+                    self._condition.notify()
+        except Exception as e:
+            logging.error(f"Stream read error: {str(e)}")
+            self.error = str(e)
+        finally:
+            if cap is not None:
+                cap.release()
+            with self._condition:
+                self._reader_done = True
+                self._condition.notify_all()
+
+    def _next_frame(self):
+        """
+        Take the next frame to analyze, applying the frame policy and latency budget
+
+        Returns:
+            (frame_number, capture_time, frame), or None when the stream ended
+        """
+        with self._condition:
+            while not self._buffer:
+                if self._reader_done or self._stop.is_set():
+                    return None
+                self._condition.wait(0.5)
+
+            now = time.monotonic()
+            if self.frame_policy == 'latest':
+                skipped = len(self._buffer) - 1
+                item = self._buffer.pop()
+                self._buffer.clear()
+            else:
+                # Skip frames that are already over budget if a newer one is waiting
+                skipped = 0
+                while len(self._buffer) > 1 and now - self._buffer[0][1] > self.latency_budget:
+                    self._buffer.popleft()
+                    skipped += 1
+                item = self._buffer.popleft()
+            self.frames_dropped += skipped
+            return item
+
+    def _process_loop(self):
+        """Analyze frames until the stream ends or is stopped"""
+        try:
+            while not self._stop.is_set():
+                item = self._next_frame()
+                if item is None:
+                    break
+                self._process(*item)
+        except Exception as e:
+            logging.error(f"Stream processing error: {str(e)}")
+            self.error = str(e)
+            self.status = 'failed'
+            self._stop.set()
+            return
+
+        if self.status == 'running':
+            if self._stop.is_set():
+                self.status = 'stopped'
+            else:
+                self.status = 'finished' if self.error is None else 'failed'
+
+    def _process(self, frame_number, captured_at, frame):
+        """Detect or track people on one frame and update the rolling state"""
+        started = time.monotonic()
+        heatmap_generator = self.heatmap_generator
+        if heatmap_generator.heatmap_data is None:
+            heatmap_generator.initialize_heatmap(frame.shape)
+
+        # Frame numbers count every source frame, so tracker ages and heatmap
+        # decay follow real time even when frames are dropped
+        if self.scheduler.should_detect(frame):
+            detections = self.tracker.update(frame, self.detector.detect_people(frame), frame_number)
+        else:
+            detections = self.tracker.predict(frame, frame_number)
+
+        elapsed_frames = frame_number - self._last_frame_number
+        self._last_frame_number = frame_number
+        heatmap_generator.update_heatmap(self.detector.get_person_centers(detections), elapsed_frames)
+        snapshot = heatmap_generator.get_overlay_snapshot()
+
+        finished = time.monotonic()
+        latency = finished - captured_at
+        timestamp = captured_at - self._started_at
+        people_count = len(detections)
+
+        with self._stats_lock:
+            self._window.append((timestamp, people_count))
+            self._window_total += people_count
+            while self._window and self._window[0][0] < timestamp - self.window_seconds:
+                self._window_total -= self._window.popleft()[1]
+
+            self.frames_processed += 1
+            self._latency_total += latency
+            self.max_latency = max(self.max_latency, latency)
+            self._processing_time += finished - started
+            self._latest = (frame, detections, snapshot, timestamp)
+
+    def get_stats(self):
+        """
+        Get rolling-window statistics
+
+        Returns:
+            Dictionary with current and windowed people counts, heatmap
+            density, throughput, dropped frames and latency
+        """
+        with self._stats_lock:
+            counts = [count for _, count in self._window]
+            window_frames = len(counts)
+            frames_processed = self.frames_processed
+            latency_total = self._latency_total
+            processing_time = self._processing_time
+
+        density_stats = (self.heatmap_generator.get_density_stats()
+                         if self.heatmap_generator is not None else None)
+        total_frames = frames_processed + self.frames_dropped
+        uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+        return {
+            'source': str(self.source),
+            'status': self.status,
+            'error': self.error,
+            'uptime': round(uptime, 2),
+            'window_seconds': self.window_seconds,
+            'current_people': counts[-1] if counts else 0,
+            'avg_people': round(sum(counts) / window_frames, 2) if window_frames else 0.0,
+            'max_people': max(counts) if counts else 0,
+            'window_frames': window_frames,
+            'density_stats': density_stats,
+            'frames_read': self.frames_read,
+            'frames_processed': frames_processed,
+            'frames_dropped': self.frames_dropped,
+            'drop_ratio': round(self.frames_dropped / total_frames, 3) if total_frames else 0.0,
+            'processing_fps': round(frames_processed / processing_time, 2) if processing_time > 0 else 0.0,
+            'avg_latency': round(latency_total / frames_processed, 3) if frames_processed else 0.0,
+            'max_latency': round(self.max_latency, 3),
+            'detection_stats': self.scheduler.get_stats()
+        }
+
+    def render_latest(self, alpha=0.3):
+        """
+        Render the most recently analyzed frame with detections and heatmap
+
+        Rendering happens only on request, so it costs nothing in the
+        processing loop.
+
+        Returns:
+            Annotated BGR frame, or None if no frame has been analyzed yet
+        """
+        with self._stats_lock:
+            latest = self._latest
+            counts = [count for _, count in self._window]
+        if latest is None:
+            return None
+
+        frame, detections, snapshot, timestamp = latest
+        with self._render_lock:
+            # Blend into a new frame (the stored one is never modified), then
+            # draw on top of it in place
+            rendered = self.heatmap_generator.generate_heatmap_overlay(frame, alpha=alpha, snapshot=snapshot,
+                                                                       out=np.empty_like(frame))
+            if rendered is frame:
+                rendered = frame.copy()
+            self.detector.draw_detections(rendered, detections, in_place=True)
+            self._add_stream_info(rendered, len(detections), counts, timestamp)
+        return rendered
+
+    def _add_stream_info(self, frame, people_count, counts, timestamp):
+        """Draw current and rolling-window counts in the top-left corner (caller holds the render lock)"""
+        if self._info_panel is None:
+            self._info_panel = InfoPanel(['Time: ', 'People: ', f"Avg ({self.window_seconds:g}s): ",
+                                          f"Max ({self.window_seconds:g}s): "], width=220, border=False)
+        self._info_panel.draw(frame, [
+            f"{timestamp:.1f}s",
+            people_count,
+            f"{sum(counts) / len(counts) if counts else 0:.1f}",
+            max(counts) if counts else 0
+        ])
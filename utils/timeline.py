@@ -0,0 +1,171 @@
+import numpy as np
+
+# Bucket widths (seconds) of the timeline levels, finest first
+LEVELS = (1, 10, 60)
+
+# Aggregates kept per bucket
+FIELDS = ('start', 'frames', 'min', 'max', 'mean', 'p95', 'people_total', 'density_max')
+
+class DensityTimeline:
+    """Multi-resolution people count timeline of a processed video"""
+
+    def __init__(self, levels, duration, zone_names=()):
+        """
+        Initialize timeline
+
+        Args:
+            levels: Dictionary mapping bucket width in seconds to a dictionary
+                of per-bucket arrays (see FIELDS), plus (buckets x zones)
+                'zone_mean' and 'zone_max' arrays if there are zones
+            duration: Video duration in seconds
+            zone_names: Names of the zones, in column order
+        """
+        self.levels = levels
+        self.duration = duration
+        self.zone_names = list(zone_names)
+
+    @classmethod
+    def from_frame_stats(cls, frame_stats, fps, levels=LEVELS, zones=None):
+        """
+        Aggregate per-frame statistics into per-second, 10-second and per-minute buckets
+
+        Every level is computed from the frames themselves rather than from
+        the level below, so percentiles stay exact.
+
+        Args:
+            frame_stats: FrameStatsStore of the video
+            fps: Video frame rate
+            levels: Bucket widths in seconds
+            zones: Optional ZoneCounter of the same frames, for per-zone
+                occupancy series
+
+        Returns:
+            DensityTimeline
+        """
+        counts = frame_stats.column('people_count')
+        density = frame_stats.column('density')
+        # Bucket by the frame's start time (the stored timestamp is the frame's end)
+        times = (frame_stats.column('frame') - 1) / fps
+        duration = len(counts) / fps if fps > 0 else 0.0
+        zone_counts = zones.counts() if zones is not None else None
+        return cls({level: _aggregate(times, counts, density, level, zone_counts) for level in levels},
+                   duration, zones.names if zones is not None else ())
+
+    def query(self, start=None, end=None, max_points=500):
+        """
+        Get the finest level that covers a time range in at most max_points buckets
+
+        Args:
+            start: Start of the range in seconds (None for the start)
+            end: End of the range in seconds (None for the end)
+            max_points: Maximum number of buckets to return
+
+        Returns:
+            JSON-serializable dictionary with the chosen bucket width and one
+            list per aggregate
+        """
+        start = 0.0 if start is None else max(0.0, start)
+        end = self.duration if end is None else min(end, self.duration)
+        if end < start:
+            end = start
+
+        widths = sorted(self.levels)
+        chosen = widths[-1]
+        for width in widths:
+            if (end - start) / width <= max_points:
+                chosen = width
+                break
+
+        buckets = self.levels[chosen]
+        low = np.searchsorted(buckets['start'], start - chosen, side='right')
+        high = np.searchsorted(buckets['start'], end, side='right')
+        selected = {name: _to_list(buckets[name][low:high]) for name in FIELDS}
+        if self.zone_names:
+            selected['zones'] = {name: {'mean': _to_list(buckets['zone_mean'][low:high, i]),
+                                        'max': _to_list(buckets['zone_max'][low:high, i])}
+                                 for i, name in enumerate(self.zone_names)}
+        return {
+            'bucket_seconds': chosen,
+            'start': start,
+            'end': end,
+            'duration': self.duration,
+            'buckets': selected
+        }
+
+    def save(self, output_path):
+        """
+        Save all levels to an uncompressed NumPy archive
+
+        Args:
+            output_path: Path of the .npz file
+        """
+        arrays = {f"{level}_{name}": values for level, buckets in self.levels.items()
+                  for name, values in buckets.items()}
+        np.savez(output_path, duration=self.duration, zone_names=np.array(self.zone_names, dtype=str), **arrays)
+
+    @classmethod
+    def load(cls, input_path):
+        """
+        Load a timeline saved with save
+
+        Args:
+            input_path: Path of the .npz file
+
+        Returns:
+            DensityTimeline
+        """
+        levels = {}
+        with np.load(input_path) as data:
+            for key in data.files:
+                if key in ('duration', 'zone_names'):
+                    continue
+                level, name = key.split('_', 1)
+                levels.setdefault(int(level), {})[name] = data[key]
+            duration = float(data['duration'])
+            zone_names = data['zone_names'].tolist() if 'zone_names' in data.files else []
+        return cls(levels, duration, zone_names)
+
+
+def _aggregate(times, counts, density, width, zone_counts=None):
+    """Per-bucket aggregates of one level, for the buckets that contain frames"""
+    if len(counts) == 0:
+        aggregates = {name: np.empty(0) for name in FIELDS}
+        if zone_counts is not None:
+            aggregates['zone_mean'] = aggregates['zone_max'] = np.empty((0, zone_counts.shape[1]))
+        return aggregates
+
+    bucket = (times // width).astype(np.int64)
+    # Sorting by bucket then count puts each bucket's counts in order for the percentile
+    order = np.lexsort((counts, bucket))
+    bucket = bucket[order]
+    counts = counts[order].astype(np.int64)
+    density = density[order]
+
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    sizes = np.diff(np.r_[starts, len(bucket)])
+    totals = np.add.reduceat(counts, starts)
+    # Nearest-rank 95th percentile within each sorted bucket
+    p95_index = starts + np.ceil(0.95 * sizes).astype(np.int64) - 1
+
+    aggregates = {
+        'start': (bucket[starts] * width).astype(np.float64),
+        'frames': sizes,
+        'min': counts[starts],
+        'max': counts[starts + sizes - 1],
+        'mean': totals / sizes,
+        'p95': counts[p95_index],
+        'people_total': totals,
+        'density_max': np.maximum.reduceat(density, starts)
+    }
+    if zone_counts is not None:
+        zone_counts = zone_counts[order]
+        aggregates['zone_mean'] = np.add.reduceat(zone_counts, starts, axis=0) / sizes[:, None]
+        aggregates['zone_max'] = np.maximum.reduceat(zone_counts, starts, axis=0)
+    return aggregates
+
+
+def _to_list(values):
+    """JSON-ready list of a bucket array, with floats rounded"""
+    if values.dtype.kind == 'f':
+        return values.astype(np.float64).round(4).tolist()
+    return values.tolist()
@@ -0,0 +1,384 @@
+import cv2
+import numpy as np
+
+from utils.detection import Detections
+
+class PersonTracker:
+    """Track detected people between detector runs with stable IDs"""
+
+    def __init__(self, iou_threshold=0.3, max_distance=1.0, max_age=30, min_hits=2,
+                 use_optical_flow=True, flow_width=320):
+        """
+        Initialize tracker
+
+        Args:
+            iou_threshold: Minimum IoU to associate a detection with a track
+            max_distance: Maximum centroid distance, relative to the track's box
+                size, for associating detections that do not overlap enough
+            max_age: Frames a track survives without a matching detection
+            min_hits: Matches needed before a track counts as a unique person
+            use_optical_flow: Move boxes on skipped frames with sparse optical
+                flow (otherwise a constant-velocity prediction is used)
+            flow_width: Width of the grayscale frame used for optical flow
+        """
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.use_optical_flow = use_optical_flow
+        self.flow_width = flow_width
+        self.reset()
+
+    def get_config(self):
+        """Get constructor arguments, e.g. to rebuild the tracker in another process"""
+        return {
+            'iou_threshold': self.iou_threshold,
+            'max_distance': self.max_distance,
+            'max_age': self.max_age,
+            'min_hits': self.min_hits,
+            'use_optical_flow': self.use_optical_flow,
+            'flow_width': self.flow_width
+        }
+
+    def reset(self):
+        """Reset all tracks for a new video"""
+        # Active track state, one row per track
+        self._ids = np.empty(0, dtype=np.int64)
+        self._boxes = np.empty((0, 4), dtype=np.float32)
+        self._velocity = np.empty((0, 2), dtype=np.float32)
+        self._anchor = np.empty((0, 2), dtype=np.float32)  # center at the last match
+        self._confidence = np.empty(0, dtype=np.float32)
+        self._first_frame = np.empty(0, dtype=np.int64)
+        self._last_frame = np.empty(0, dtype=np.int64)
+        self._hits = np.empty(0, dtype=np.int64)
+        self._first_box = np.empty((0, 4), dtype=np.float32)  # box at the first match
+
+        self._next_id = 1
+        self._last_update_frame = 0
+        self._prev_gray = None
+        self._flow_scale = 1.0
+
+        # (first_frame, last_frame, hits, first_box) arrays of retired tracks
+        self._finished = []
+
+    def update(self, frame, detections, frame_number):
+        """
+        Associate fresh detections with tracks
+
+        Args:
+            frame: Current frame (used for optical flow on later frames)
+            detections: Detections from the detector
+            frame_number: Current frame number
+
+        Returns:
+            The detections with their track IDs
+        """
+        self._update_flow_frame(frame)
+
+        detections = Detections.from_list(detections)
+        det_boxes = detections.boxes.astype(np.float32)
+        det_conf = detections.scores
+        track_idx, det_idx = self._associate(self._boxes, det_boxes)
+
+        # Update matched tracks
+        if len(track_idx):
+            elapsed = np.maximum(frame_number - self._last_frame[track_idx], 1)[:, None]
+            det_centers = self._centers(det_boxes[det_idx])
+            self._velocity[track_idx] = (det_centers - self._anchor[track_idx]) / elapsed
+            self._anchor[track_idx] = det_centers
+            self._boxes[track_idx] = det_boxes[det_idx]
+            self._confidence[track_idx] = det_conf[det_idx]
+            self._last_frame[track_idx] = frame_number
+            self._hits[track_idx] += 1
+
+        # Start tracks for unmatched detections
+        new_det = np.setdiff1d(np.arange(len(det_boxes)), det_idx)
+        num_new = len(new_det)
+        if num_new:
+            self._ids = np.concatenate([self._ids, np.arange(self._next_id, self._next_id + num_new)])
+            self._next_id += num_new
+            self._boxes = np.concatenate([self._boxes, det_boxes[new_det]])
+            self._velocity = np.concatenate([self._velocity, np.zeros((num_new, 2), dtype=np.float32)])
+            self._anchor = np.concatenate([self._anchor, self._centers(det_boxes[new_det])])
+            self._confidence = np.concatenate([self._confidence, det_conf[new_det]])
+            self._first_frame = np.concatenate([self._first_frame, np.full(num_new, frame_number)])
+            self._last_frame = np.concatenate([self._last_frame, np.full(num_new, frame_number)])
+            self._hits = np.concatenate([self._hits, np.ones(num_new, dtype=np.int64)])
+            self._first_box = np.concatenate([self._first_box, det_boxes[new_det]])
+
+        # Tag detections with track IDs before retiring shifts the track indices
+        det_track = np.empty(len(det_boxes), dtype=np.int64)
+        det_track[det_idx] = self._ids[track_idx]
+        if num_new:
+            det_track[new_det] = self._ids[-num_new:]
+
+        # Retire tracks that have not been seen for too long
+        expired = frame_number - self._last_frame > self.max_age
+        if np.any(expired):
+            self._retire(expired)
+
+        self._last_update_frame = frame_number
+
+        # Report detections in their original order
+        return Detections(detections.boxes, det_conf, det_track)
+
+    def predict(self, frame, frame_number):
+        """
+        Move tracks on a frame where the detector did not run
+
+        Args:
+            frame: Current frame, or None if it was not decoded
+            frame_number: Current frame number
+
+        Returns:
+            Detections (with track IDs) for tracks seen at the last detector
+            run, with moved boxes
+        """
+        if frame is None:
+            # The flow reference would be stale by the next decoded frame
+            self._prev_gray = None
+
+        visible = self._last_frame == self._last_update_frame
+        if not np.any(visible):
+            if frame is not None:
+                self._update_flow_frame(frame)
+            return Detections()
+
+        shift = None
+        if self.use_optical_flow and frame is not None and self._prev_gray is not None:
+            shift = self._flow_shift(frame, visible)
+        elif frame is not None:
+            self._update_flow_frame(frame)
+
+        if shift is None:
+            shift = np.tile(self._velocity[visible], 2)
+        self._boxes[visible] += shift
+
+        return Detections(np.round(self._boxes[visible]), self._confidence[visible], self._ids[visible])
+
+    def _flow_shift(self, frame, visible):
+        """
+        Estimate per-track box displacement with sparse Lucas-Kanade flow
+
+        Returns:
+            (N, 4) box shifts for the visible tracks, falling back to the
+            track velocity where no points could be followed
+        """
+        prev_gray = self._prev_gray
+        gray = self._update_flow_frame(frame)
+        if prev_gray.shape != gray.shape:
+            return None
+
+        # Sample a 3x3 grid of points inside the central part of each box
+        boxes = self._boxes[visible] * self._flow_scale
+        fractions = np.array([0.3, 0.5, 0.7], dtype=np.float32)
+        fx, fy = np.meshgrid(fractions, fractions)
+        fx, fy = fx.ravel(), fy.ravel()
+        widths = (boxes[:, 2] - boxes[:, 0])[:, None]
+        heights = (boxes[:, 3] - boxes[:, 1])[:, None]
+        points = np.stack([boxes[:, 0:1] + widths * fx, boxes[:, 1:2] + heights * fy], axis=-1)
+        points = points.reshape(-1, 1, 2).astype(np.float32)
+
+        next_points, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None,
+                                                          winSize=(15, 15), maxLevel=2)
+        moved = (next_points - points).reshape(len(boxes), -1, 2) / self._flow_scale
+        good = status.reshape(len(boxes), -1).astype(bool)
+
+        # Median displacement of followed points; velocity where none were followed
+        moved[~good] = np.nan
+        with np.errstate(all='ignore'):
+            displacement = np.nanmedian(moved, axis=1)
+        lost = np.isnan(displacement).any(axis=1)
+        displacement[lost] = self._velocity[visible][lost]
+        return np.tile(displacement, 2).astype(np.float32)
+
+    def _update_flow_frame(self, frame):
+        """Store the downscaled grayscale frame used for optical flow"""
+        if not self.use_optical_flow:
+            return None
+        height, width = frame.shape[:2]
+        self._flow_scale = min(1.0, self.flow_width / width)
+        small = cv2.resize(frame, None, fx=self._flow_scale, fy=self._flow_scale,
+                           interpolation=cv2.INTER_AREA) if self._flow_scale < 1.0 else frame
+        self._prev_gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return self._prev_gray
+
+    def _associate(self, track_boxes, det_boxes):
+        """
+        Greedily match tracks to detections by IoU, then by centroid distance
+
+        Returns:
+            (track_indices, detection_indices) arrays of matched pairs
+        """
+        if len(track_boxes) == 0 or len(det_boxes) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        iou = self._iou_matrix(track_boxes, det_boxes)
+        track_idx, det_idx = self._greedy_match(iou, self.iou_threshold, larger_is_better=True)
+
+        # Fall back to centroid distance for pairs that don't overlap enough
+        free_tracks = np.setdiff1d(np.arange(len(track_boxes)), track_idx)
+        free_dets = np.setdiff1d(np.arange(len(det_boxes)), det_idx)
+        if len(free_tracks) and len(free_dets):
+            sizes = np.sqrt(np.prod(track_boxes[free_tracks, 2:] - track_boxes[free_tracks, :2], axis=1))
+            distance = np.linalg.norm(self._centers(track_boxes[free_tracks])[:, None, :] -
+                                      self._centers(det_boxes[free_dets])[None, :, :], axis=2)
+            relative = distance / np.maximum(sizes, 1.0)[:, None]
+            t2, d2 = self._greedy_match(relative, self.max_distance, larger_is_better=False)
+            track_idx = np.concatenate([track_idx, free_tracks[t2]])
+            det_idx = np.concatenate([det_idx, free_dets[d2]])
+
+        return track_idx, det_idx
+
+    @staticmethod
+    def _greedy_match(scores, threshold, larger_is_better):
+        """Pick pairs in score order, each row and column at most once"""
+        if larger_is_better:
+            rows, cols = np.nonzero(scores >= threshold)
+            order = np.argsort(-scores[rows, cols], kind='stable')
+        else:
+            rows, cols = np.nonzero(scores <= threshold)
+            order = np.argsort(scores[rows, cols], kind='stable')
+
+        used_rows, used_cols = set(), set()
+        matched_rows, matched_cols = [], []
+        for row, col in zip(rows[order], cols[order]):
+            if row in used_rows or col in used_cols:
+                continue
+            used_rows.add(row)
+            used_cols.add(col)
+            matched_rows.append(row)
+            matched_cols.append(col)
+        return np.array(matched_rows, dtype=np.int64), np.array(matched_cols, dtype=np.int64)
+
+    @staticmethod
+    def _iou_matrix(boxes_a, boxes_b):
+        """Pairwise IoU between two sets of [x1, y1, x2, y2] boxes"""
+        top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+        bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+        intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+        area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+        area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+        union = area_a[:, None] + area_b[None, :] - intersection
+        return intersection / np.maximum(union, 1e-6)
+
+    @staticmethod
+    def _centers(boxes):
+        return (boxes[:, :2] + boxes[:, 2:]) / 2
+
+    def _retire(self, mask):
+        """Remove tracks, keeping their frame range and hits for the statistics"""
+        self._finished.append((self._first_frame[mask], self._last_frame[mask], self._hits[mask],
+                               self._first_box[mask]))
+
+        keep = ~mask
+        self._ids = self._ids[keep]
+        self._boxes = self._boxes[keep]
+        self._velocity = self._velocity[keep]
+        self._anchor = self._anchor[keep]
+        self._confidence = self._confidence[keep]
+        self._first_frame = self._first_frame[keep]
+        self._last_frame = self._last_frame[keep]
+        self._hits = self._hits[keep]
+        self._first_box = self._first_box[keep]
+
+    def get_tracks(self):
+        """
+        Get every track of the video so far, retired and active
+
+        Returns:
+            Dictionary of per-track arrays: first_frame, last_frame, hits,
+            first_box (box at the first match), last_box (current box of
+            active tracks, zeros for retired ones) and active
+        """
+        finished = list(zip(*self._finished)) or [[np.empty(0, dtype=np.int64)]] * 3 + [[np.empty((0, 4))]]
+        num_finished = sum(len(frames) for frames in finished[0])
+        return {
+            'first_frame': np.concatenate([*finished[0], self._first_frame]).astype(np.int64),
+            'last_frame': np.concatenate([*finished[1], self._last_frame]).astype(np.int64),
+            'hits': np.concatenate([*finished[2], self._hits]).astype(np.int64),
+            'first_box': np.concatenate([*finished[3], self._first_box]).astype(np.float32),
+            'last_box': np.concatenate([np.zeros((num_finished, 4)), self._boxes]).astype(np.float32),
+            'active': np.arange(num_finished + len(self._ids)) >= num_finished
+        }
+
+    def stitch_tracks(self, earlier, later, boundary_frame):
+        """
+        Join the tracks of two consecutive frame ranges tracked separately
+
+        Tracks still active at the end of the earlier range are associated,
+        at their last (predicted) position, with the tracks the later range
+        started within max_age frames of the boundary, frame by frame and
+        with the same IoU and centroid distance rules as update. Associated
+        pairs become one track spanning both ranges, so a person on screen
+        across the boundary counts once and keeps their whole dwell time.
+
+        Args:
+            earlier: Track arrays (see get_tracks) of the earlier range
+            later: Track arrays of the range that follows it
+            boundary_frame: Frame number of the later range's first frame
+
+        Returns:
+            Track arrays of both ranges, active where the later range's tracks are
+        """
+        later = {name: values.copy() for name, values in later.items()}
+        ending = np.flatnonzero(earlier['active'])
+        joined = []
+        starts = np.unique(later['first_frame'][(later['first_frame'] >= boundary_frame) &
+                                                (later['first_frame'] < boundary_frame + self.max_age)])
+        for frame_number in starts:
+            # Tracks the serial tracker would have retired by this frame can't continue
+            ending = ending[frame_number - earlier['last_frame'][ending] <= self.max_age]
+            starting = np.flatnonzero(later['first_frame'] == frame_number)
+            end_idx, start_idx = self._associate(earlier['last_box'][ending], later['first_box'][starting])
+            if not len(end_idx):
+                continue
+            previous, continued = ending[end_idx], starting[start_idx]
+            later['first_frame'][continued] = earlier['first_frame'][previous]
+            later['hits'][continued] += earlier['hits'][previous]
+            later['first_box'][continued] = earlier['first_box'][previous]
+            joined.append(previous)
+            ending = np.setdiff1d(ending, previous)
+
+        keep = np.ones(len(earlier['hits']), dtype=bool)
+        if joined:
+            keep[np.concatenate(joined)] = False
+        combined = {name: np.concatenate([earlier[name][keep], later[name]]) for name in later}
+        combined['active'][:keep.sum()] = False
+        return combined
+
+    def get_stats(self, fps):
+        """
+        Get tracking statistics for the video so far
+
+        Args:
+            fps: Video frame rate, to convert dwell times to seconds
+
+        Returns:
+            Dictionary with unique people and dwell times in seconds
+        """
+        return track_stats(self.get_tracks(), self.min_hits, fps)
+
+
+def track_stats(tracks, min_hits, fps):
+    """
+    Summarize tracks into unique people and dwell times
+
+    Args:
+        tracks: Track arrays from PersonTracker.get_tracks (or stitch_tracks)
+        min_hits: Matches needed before a track counts as a unique person
+        fps: Video frame rate, to convert dwell times to seconds
+
+    Returns:
+        Dictionary with unique people and dwell times in seconds
+    """
+    confirmed = tracks['hits'] >= min_hits
+    dwell = tracks['last_frame'][confirmed] - tracks['first_frame'][confirmed] + 1
+    fps = fps or 1
+    return {
+        'unique_people': int(len(dwell)),
+        'total_dwell_time': round(float(dwell.sum()) / fps, 2),
+        'avg_dwell_time': round(float(dwell.mean()) / fps, 2) if len(dwell) else 0.0,
+        'max_dwell_time': round(float(dwell.max()) / fps, 2) if len(dwell) else 0.0
+    }
+
@@ -0,0 +1,330 @@
+import io
+import logging
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+# Containers that can be decoded front to back while the rest of the file arrives
+STREAMABLE_EXTENSIONS = {'mkv', 'webm', 'flv'}
+
+# MP4/QuickTime containers are streamable only with the 'moov' index before the media data
+ISO_BMFF_EXTENSIONS = {'mp4', 'mov', 'm4v'}
+
+# Bytes read from the request body per write to disk
+WRITE_BLOCK_SIZE = 1024 * 1024
+
+
+class UploadOffsetMismatch(Exception):
+    """Raised when a chunk does not start at the upload's current offset"""
+
+    def __init__(self, offset):
+        super().__init__(f"Upload offset is {offset}")
+        self.offset = offset
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload or chunk exceeds the allowed size"""
+
+
+class Upload:
+    """A chunked upload written to disk as its chunks arrive"""
+
+    def __init__(self, upload_id, path, filename, size, options=None):
+        """
+        Initialize upload
+
+        Args:
+            upload_id: Unique upload identifier (also used as the job ID)
+            path: Path the file is assembled at
+            filename: Original (sanitized) file name
+            size: Total size of the file in bytes, declared by the client
+            options: Optional dictionary of processing options for the job
+        """
+        self.id = upload_id
+        self.path = path
+        self.filename = filename
+        self.extension = filename.rsplit('.', 1)[-1].lower()
+        self.size = size
+        self.options = options or {}
+        self.job_id = None
+
+        self.offset = 0
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+        self._condition = threading.Condition()
+        self._append_lock = threading.Lock()
+        self._streamable = None
+
+        # Create the file up front so readers can open it before the first chunk
+        open(self.path, 'wb').close()
+
+    @property
+    def complete(self):
+        return self.offset >= self.size
+
+    def append(self, stream, offset, length=None):
+        """
+        Append a chunk read from a binary stream
+
+        The chunk is copied to disk block by block, so it is never held in
+        memory as a whole. If the stream ends early (e.g. the client
+        disconnected), the bytes received so far are kept and the client can
+        resume from the new offset.
+
+        Args:
+            stream: Readable binary stream with the chunk's bytes
+            offset: Offset the client claims the chunk starts at
+            length: Chunk length if known (e.g. from Content-Length)
+
+        Returns:
+            Offset after the chunk
+
+        Raises:
+            UploadOffsetMismatch: If offset is not the current offset, or
+                another chunk is being written
+            UploadTooLarge: If the chunk would extend past the declared size
+        """
+        if not self._append_lock.acquire(blocking=False):
+            raise UploadOffsetMismatch(self.offset)
+        try:
+            if offset != self.offset:
+                raise UploadOffsetMismatch(self.offset)
+            remaining = self.size - self.offset
+            if length is not None and length > remaining:
+                raise UploadTooLarge("Chunk extends past the declared upload size")
+
+            written = 0
+            with open(self.path, 'r+b') as f:
+                f.seek(self.offset)
+                while True:
+                    # Once the upload is full, read one more byte to catch oversized chunks
+                    block = stream.read(min(WRITE_BLOCK_SIZE, remaining - written) or 1)
+                    if not block:
+                        break
+                    written += len(block)
+                    if written > remaining:
+                        raise UploadTooLarge("Chunk extends past the declared upload size")
+                    f.write(block)
+                    f.flush()
+                    # Readers may go as far as the flushed bytes
+                    with self._condition:
+                        self.offset += len(block)
+                        self.updated_at = time.time()
+                        self._condition.notify_all()
+            return self.offset
+        finally:
+            self._append_lock.release()
+
+    def wait_for(self, offset, timeout):
+        """
+        Wait until the upload has reached an offset
+
+        Args:
+            offset: Offset to wait for (capped at the upload size)
+            timeout: Seconds without any new data before giving up
+
+        Returns:
+            Current offset, which is below the requested one if the upload stalled
+        """
+        offset = min(offset, self.size)
+        with self._condition:
+            while self.offset < offset:
+                if not self._condition.wait(timeout):
+                    break
+            return self.offset
+
+    def is_streamable(self):
+        """
+        Check whether the video can be decoded before the upload completes
+
+        Returns:
+            True or False, or None if too little of the file has arrived to tell
+        """
+        if self._streamable is None:
+            if self.extension in STREAMABLE_EXTENSIONS:
+                self._streamable = True
+            elif self.extension in ISO_BMFF_EXTENSIONS:
+                self._streamable = _moov_before_mdat(self.path, self.offset)
+            else:
+                # AVI and ASF keep their index at the end of the file
+                self._streamable = False
+        return self._streamable
+
+    def open_reader(self, stall_timeout=300.0):
+        """Open a reader that blocks until the bytes it reads have arrived"""
+        return UploadReader(self, stall_timeout)
+
+    def to_dict(self):
+        """Get a JSON-serializable status snapshot"""
+        return {
+            'upload_id': self.id,
+            'filename': self.filename,
+            'offset': self.offset,
+            'size': self.size,
+            'complete': self.complete,
+            'job_id': self.job_id
+        }
+
+
+class UploadReader(io.BufferedIOBase):
+    """Seekable reader over an upload that is still arriving"""
+
+    def __init__(self, upload, stall_timeout):
+        """
+        Initialize reader
+
+        The reader reports the declared size of the upload, and reads past
+        the bytes received so far block until they arrive. cv2.VideoCapture
+        accepts it as a stream source, so decoding can run on the front of
+        a file while the rest is uploading.
+
+        Args:
+            upload: Upload to read
+            stall_timeout: Seconds a read waits for new data before it
+                returns what is available (an early end of file)
+        """
+        super().__init__()
+        self.upload = upload
+        self.stall_timeout = stall_timeout
+        self._file = open(upload.path, 'rb')
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.upload.size - self._position
+        if size == 0 or self._position >= self.upload.size:
+            return b''
+
+        available = self.upload.wait_for(self._position + size, self.stall_timeout)
+        size = min(size, available - self._position)
+        if size <= 0:
+            return b''
+        self._file.seek(self._position)
+        data = self._file.read(size)
+        self._position += len(data)
+        return data
+
+    def read1(self, size=-1):
+        return self.read(size)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # Seeking needs no data; the file's end is its declared size
+        if whence == io.SEEK_SET:
+            base = 0
+        elif whence == io.SEEK_CUR:
+            base = self._position
+        else:
+            base = self.upload.size
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+class UploadManager:
+    """Chunked uploads in progress, by upload ID"""
+
+    def __init__(self, upload_dir, max_size, expire_seconds=24 * 3600):
+        """
+        Initialize upload manager
+
+        Args:
+            upload_dir: Directory uploads are assembled in
+            max_size: Maximum declared size of an upload in bytes
+            expire_seconds: Incomplete uploads without a new chunk for this
+                long are deleted
+        """
+        self.upload_dir = upload_dir
+        self.max_size = max_size
+        self.expire_seconds = expire_seconds
+
+        self._uploads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, upload_id, filename, size, options=None):
+        """
+        Start a new upload
+
+        Args:
+            upload_id: Unique upload identifier
+            filename: Sanitized original file name (its extension is kept)
+            size: Declared total size in bytes
+            options: Optional dictionary of processing options
+
+        Raises:
+            UploadTooLarge: If size exceeds the limit
+        """
+        if size > self.max_size:
+            raise UploadTooLarge(f"File is too large. Maximum size is {self.max_size // (1024 * 1024)}MB.")
+
+        extension = filename.rsplit('.', 1)[-1].lower()
+        path = os.path.join(self.upload_dir, f"{upload_id}.{extension}")
+        upload = Upload(upload_id, path, filename, size, options)
+        with self._lock:
+            self._expire_stale()
+            self._uploads[upload_id] = upload
+        logging.info(f"Upload {upload_id} started: {filename} ({size} bytes)")
+        return upload
+
+    def get(self, upload_id):
+        """Get an upload by ID, or None if unknown"""
+        with self._lock:
+            return self._uploads.get(upload_id)
+
+    def expire_stale(self):
+        """Delete incomplete uploads that stopped receiving chunks"""
+        with self._lock:
+            self._expire_stale()
+
+    def _expire_stale(self):
+        """Delete incomplete uploads that stopped receiving chunks (caller holds the lock)"""
+        now = time.time()
+        for upload_id, upload in list(self._uploads.items()):
+            if now - upload.updated_at < self.expire_seconds:
+                continue
+            del self._uploads[upload_id]
+            if not upload.complete and upload.job_id is None and os.path.exists(upload.path):
+                os.remove(upload.path)
+                logging.info(f"Upload {upload_id} expired")
+
+
+def _moov_before_mdat(path, available):
+    """
+    Walk the top-level boxes of an MP4/QuickTime file
+
+    Returns:
+        True if the 'moov' box comes before 'mdat', False if 'mdat' comes
+        first, or None if neither box has been reached within available bytes
+    """
+    position = 0
+    with open(path, 'rb') as f:
+        while position + 8 <= available:
+            f.seek(position)
+            size, box_type = struct.unpack('>I4s', f.read(8))
+            if box_type == b'moov':
+                return True
+            if box_type == b'mdat':
+                return False
+            if size == 1:
+                if position + 16 > available:
+                    return None
+                size = struct.unpack('>Q', f.read(8))[0]
+            if size < 8:
+                # Box extends to the end of the file, or a corrupt size
+                return False
+            position += size
+    return None
@@ -1,153 +1,742 @@
 import cv2
 import numpy as np
+import io
 import logging
 import os
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
+from utils.scheduler import DetectionScheduler
+from utils.tracking import PersonTracker, track_stats
+from utils.pipeline import FramePipeline
+from utils.frame_stats import FrameStatsStore
+from utils.metrics import StageTimer
+from utils.annotation import InfoPanel
+from utils.segmented_output import concatenate_videos
+from utils.encoding import VideoEncoder
+from utils.timeline import DensityTimeline
+from utils.zones import ZoneCounter
 
 class VideoProcessor:
     """Process videos for crowd density detection"""
     
-    def __init__(self, detector):
+    def __init__(self, detector, scheduler=None, tracker=None, use_pipeline=False,
+                 pipeline_queue_size=8, detection_cache=None, overlay_alpha=0.3,
+                 stats_spill_frames=4096, stats_spill_dir=None, segment_dir=None,
+                 segment_seconds=2.0, zones=None, encoder=None):
         """
         Initialize video processor
         
         Args:
             detector: YOLODetector instance
+            scheduler: DetectionScheduler deciding which frames run the detector
+                (defaults to motion-gated scheduling)
+            tracker: PersonTracker carrying detections between detector runs
+            use_pipeline: Run decode, analysis, rendering and encoding in
+                separate threads connected by bounded queues
+            pipeline_queue_size: Capacity of each queue between pipeline stages
+            detection_cache: Optional DetectionCache; detections cached for the
+                same video and detector settings are replayed instead of rerun
+            overlay_alpha: Opacity of the heatmap overlay in the output video
+            stats_spill_frames: Per-frame statistics kept in memory before they
+                are streamed to disk, or None to keep them all in memory
+            stats_spill_dir: Directory for spilled statistics (defaults to the
+                system temp directory)
+            segment_dir: Optional directory to publish the output video in as
+                HLS segments while it is processed (see VideoEncoder.open);
+                the complete video is still written to the output path
+            segment_seconds: Target duration of each segment
+            zones: Optional polygon zones (from parse_zones) to count people
+                in; adds per-zone occupancy and threshold alerts to the results
+            encoder: VideoEncoder for the output video (defaults to ffmpeg
+                if installed, else OpenCV, at the input resolution and frame
+                rate); frames it drops by decimation are not rendered
         """
         self.detector = detector
-        self.frame_stats = []
+        self.scheduler = scheduler or DetectionScheduler()
+        self.tracker = tracker or PersonTracker()
+        self.use_pipeline = use_pipeline
+        self.pipeline_queue_size = pipeline_queue_size
+        self.detection_cache = detection_cache
+        self.overlay_alpha = overlay_alpha
+        self.stats_spill_frames = stats_spill_frames
+        self.stats_spill_dir = stats_spill_dir
+        self.segment_dir = segment_dir
+        self.segment_seconds = segment_seconds
+        self.zones = zones or None
+        self.encoder = encoder or VideoEncoder()
+        self.frame_stats = self._new_frame_stats()
+        self.timeline = None
+        self.timer = StageTimer()
+        self._info_panel = None
         
-    def process_video(self, input_path, output_path, heatmap_generator):
+    def process_video(self, input_path, output_path, heatmap_generator, progress_callback=None):
         """
         Process video file for crowd density detection
         
         Args:
-            input_path: Path to input video
+            input_path: Path to input video, or a readable binary stream
+                (see _open_capture)
             output_path: Path to save processed video
             heatmap_generator: HeatmapGenerator instance
+            progress_callback: Optional callable(frames_processed, total_frames)
+                invoked after every frame
             
         Returns:
             Dictionary with processing results
         """
         try:
             # Open input video
-            cap = cv2.VideoCapture(input_path)
+            cap = self._open_capture(input_path)
             if not cap.isOpened():
                 raise ValueError(f"Cannot open video file: {input_path}")
             
             # Get video properties
-            fps = int(cap.get(cv2.CAP_PROP_FPS))
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps, width, height, total_frames = self._get_video_properties(cap)
             
             logging.info(f"Processing video: {width}x{height} @ {fps}fps, {total_frames} frames")
             
-            # Initialize video writer
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+            # Initialize video writer (the pipeline already encodes on its own thread)
+            out = self.encoder.open(output_path, fps, (width, height), segment_dir=self.segment_dir,
+                                    segment_seconds=self.segment_seconds,
+                                    asynchronous=not self.use_pipeline)
             
             # Initialize heatmap
             heatmap_generator.initialize_heatmap((height, width, 3))
             
-            # Processing variables
-            frame_count = 0
-            total_people_detected = 0
-            max_people_frame = 0
-            max_people_count = 0
-            self.frame_stats = []
+            def report_progress(frame_count):
+                if progress_callback is not None:
+                    progress_callback(frame_count, total_frames)
+            
+            cache_key, cached_detections = self._load_cached_detections(input_path)
+            
+            try:
+                chunk = self._process_frames(cap, out, heatmap_generator, fps, total_frames,
+                                             start_frame=0, end_frame=None,
+                                             progress_callback=report_progress,
+                                             cached_detections=cached_detections)
+            finally:
+                # Cleanup (also stops the encoder after a failure)
+                cap.release()
+                out.release()
+            
+            self._store_detections(cache_key, chunk)
+            self.frame_stats = chunk['frame_stats']
+            self.timer = chunk['timer']
+            results = self._build_results(chunk, heatmap_generator, fps, width, height)
+            
+            logging.info(f"Video processing completed: {results}")
+            return results
+            
+        except Exception as e:
+            logging.error(f"Video processing error: {str(e)}")
+            raise RuntimeError(f"Video processing failed: {str(e)}")
+    
+    def analyze_video(self, input_path, heatmap_generator, progress_callback=None):
+        """
+        Compute crowd statistics without rendering or encoding an output video
+        
+        Frames the scheduler does not need are only grabbed, not decoded, and
+        the tracker moves boxes across them by velocity instead of optical flow.
+        
+        Args:
+            input_path: Path to input video, or a readable binary stream
+                (see _open_capture)
+            heatmap_generator: HeatmapGenerator instance
+            progress_callback: Optional callable(frames_processed, total_frames)
+                invoked after every frame
             
-            # Process frames (skip frames for faster processing)
-            process_every_n_frames = 3  # Only process every 3rd frame
-            last_detections = []
+        Returns:
+            Dictionary with processing results, as process_video
+        """
+        try:
+            cap = self._open_capture(input_path)
+            if not cap.isOpened():
+                raise ValueError(f"Cannot open video file: {input_path}")
             
+            fps, width, height, total_frames = self._get_video_properties(cap)
+            
+            logging.info(f"Analyzing video: {width}x{height} @ {fps}fps, {total_frames} frames")
+            
+            heatmap_generator.initialize_heatmap((height, width, 3))
+            
+            def report_progress(frame_count):
+                if progress_callback is not None:
+                    progress_callback(frame_count, total_frames)
+            
+            cache_key, cached_detections = self._load_cached_detections(input_path)
+            
+            run = self._start_run(fps, 0, cached_detections)
+            frame_count = 0
             while True:
-                ret, frame = cap.read()
+                # Decode only frames the scheduler will look at
+                started = time.perf_counter()
+                if self.scheduler.needs_frame():
+                    ret, frame = cap.read()
+                else:
+                    ret, frame = cap.grab(), None
                 if not ret:
                     break
+                run['timer'].add('decode', time.perf_counter() - started)
                 
                 frame_count += 1
-                
-                # Skip frames to speed up processing
-                if frame_count % process_every_n_frames == 0:
-                    # Process this frame
-                    detections = self.detector.detect_people(frame)
-                    last_detections = detections
-                else:
-                    # Use previous detection results
-                    detections = last_detections
-                
-                people_count = len(detections)
-                total_people_detected += people_count
-                
-                # Update statistics
-                if people_count > max_people_count:
-                    max_people_count = people_count
-                    max_people_frame = frame_count
-                
-                # Get person centers for heatmap
-                person_centers = self.detector.get_person_centers(detections)
-                
-                # Update heatmap
-                heatmap_generator.update_heatmap(person_centers)
-                
-                # Draw detections on frame
-                frame_with_detections = self.detector.draw_detections(frame, detections)
-                
-                # Add heatmap overlay
-                frame_with_heatmap = heatmap_generator.generate_heatmap_overlay(
-                    frame_with_detections, alpha=0.3
-                )
-                
-                # Add frame information
-                self._add_frame_info(frame_with_heatmap, frame_count, people_count, 
-                                   total_people_detected, max_people_count)
-                
-                # Write frame
-                out.write(frame_with_heatmap)
-                
-                # Store frame statistics
-                self.frame_stats.append({
-                    'frame': frame_count,
-                    'people_count': people_count,
-                    'timestamp': frame_count / fps
-                })
-                
-                # Log progress
-                if frame_count % 30 == 0:
-                    progress = (frame_count / total_frames) * 100
-                    logging.info(f"Processing progress: {progress:.1f}% ({frame_count}/{total_frames})")
+                self._analyze_frame(run, frame, frame_count, heatmap_generator, render=False)
+                self._frame_done(frame_count, total_frames, report_progress)
             
-            # Cleanup
             cap.release()
-            out.release()
-            
-            # Calculate final statistics
-            avg_people_per_frame = total_people_detected / frame_count if frame_count > 0 else 0
-            density_stats = heatmap_generator.get_density_stats()
-            
-            # Create results dictionary
-            results = {
-                'total_frames': frame_count,
-                'total_people_detected': total_people_detected,
-                'avg_people_per_frame': round(avg_people_per_frame, 2),
-                'max_people_count': max_people_count,
-                'max_people_frame': max_people_frame,
-                'max_people_timestamp': round(max_people_frame / fps, 2),
-                'video_duration': round(frame_count / fps, 2),
+            
+            chunk = self._finish_run(run, frame_count)
+            self._store_detections(cache_key, chunk)
+            self.frame_stats = chunk['frame_stats']
+            self.timer = chunk['timer']
+            results = self._build_results(chunk, heatmap_generator, fps, width, height)
+            
+            logging.info(f"Video analysis completed: {results}")
+            return results
+            
+        except Exception as e:
+            logging.error(f"Video analysis error: {str(e)}")
+            raise RuntimeError(f"Video analysis failed: {str(e)}")
+    
+    def process_video_parallel(self, input_path, output_path, heatmap_generator,
+                               num_workers=None, min_chunk_frames=150, progress_callback=None):
+        """
+        Process video file in parallel frame ranges across CPU cores
+        
+        The video is split into chunks, each chunk is processed in its own
+        process into a separate segment, and the segments and statistics are
+        merged. Every chunk runs with this processor's scheduler settings and
+        detects on its first frame, as the motion since the previous chunk's
+        last detection is unknown; otherwise motion gating works as in a
+        serial run. With a fixed-interval scheduler chunk boundaries fall on
+        detection frames, and the results and final heatmap state match a
+        serial run. The on-frame overlay and running totals in each segment start from that
+        segment's first frame (as does the per-frame density in frame_stats).
+        Tracks are joined across chunk boundaries (see
+        PersonTracker.stitch_tracks), so a person crossing one normally counts
+        once in tracking_stats; counts and dwell times can still differ slightly
+        from a serial run, as boxes are not moved past the boundary. Chunks finish out of order, so chunked runs publish
+        no HLS segments (segment_dir); only the output video is written.
+        
+        Args:
+            input_path: Path to input video
+            output_path: Path to save processed video
+            heatmap_generator: HeatmapGenerator instance
+            num_workers: Number of worker processes (defaults to CPU count)
+            min_chunk_frames: Minimum number of frames per chunk
+            progress_callback: Optional callable(frames_processed, total_frames)
+            
+        Returns:
+            Dictionary with processing results
+        """
+        num_workers = num_workers or os.cpu_count() or 1
+        if isinstance(input_path, io.BufferedIOBase):
+            # Streams can only be read front to back, by a single process
+            return self.process_video(input_path, output_path, heatmap_generator,
+                                      progress_callback=progress_callback)
+        
+        try:
+            cap = cv2.VideoCapture(input_path)
+            if not cap.isOpened():
+                raise ValueError(f"Cannot open video file: {input_path}")
+            fps, width, height, total_frames = self._get_video_properties(cap)
+            cap.release()
+            
+            ranges = self._chunk_ranges(total_frames, num_workers, min_chunk_frames)
+            if len(ranges) < 2:
+                return self.process_video(input_path, output_path, heatmap_generator,
+                                          progress_callback=progress_callback)
+            
+            logging.info(f"Processing video in {len(ranges)} chunks: {width}x{height} @ {fps}fps, "
+                        f"{total_frames} frames")
+            
+            cache_key, cached_detections = self._load_cached_detections(input_path)
+            
+            output_root, _ = os.path.splitext(output_path)
+            tasks = [{
+                'input_path': input_path,
+                'segment_path': f"{output_root}_part{index:03d}.mp4",
+                'start_frame': start,
+                'end_frame': end,
                 'fps': fps,
-                'resolution': f"{width}x{height}",
-                'density_stats': density_stats,
-                'processing_time': datetime.now().isoformat()
-            }
+                'size': (width, height),
+                'detector': self.detector.get_config(),
+                'scheduler': self.scheduler.get_config(),
+                'tracker': self.tracker.get_config(),
+                'use_pipeline': self.use_pipeline,
+                'pipeline_queue_size': self.pipeline_queue_size,
+                'overlay_alpha': self.overlay_alpha,
+                'zones': self.zones,
+                'encoder': self.encoder.get_config(),
+                # None when caching is disabled, else this chunk's share of the cache
+                'cached_detections': cached_detections and {
+                    frame: detections for frame, detections in cached_detections.items()
+                    if frame > start and (end is None or frame <= end)
+                },
+                'heatmap': {
+                    'grid_size': heatmap_generator.grid_size,
+                    'decay_factor': heatmap_generator.decay_factor
+                }
+            } for index, (start, end) in enumerate(ranges)]
             
-            logging.info(f"Video processing completed: {results}")
+            # Spawn rather than fork: the parent may be running worker threads
+            ctx = multiprocessing.get_context('spawn')
+            frames_done = ctx.Value('i', 0)
+            with ProcessPoolExecutor(max_workers=min(num_workers, len(tasks)), mp_context=ctx,
+                                     initializer=_init_chunk_worker,
+                                     initargs=(frames_done,)) as executor:
+                futures = [executor.submit(_process_chunk, task) for task in tasks]
+                pending = set(futures)
+                while pending:
+                    _, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                    if progress_callback is not None:
+                        progress_callback(frames_done.value, total_frames)
+                chunks = [future.result() for future in futures]
+            
+            # Merge heatmaps in order, decaying earlier chunks by the frames that follow
+            heatmap_generator.initialize_heatmap((height, width, 3))
+            for chunk in chunks:
+                heatmap_generator.merge_heatmap(chunk['heatmap_data'], chunk['frames'])
+            
+            merged = self._merge_chunk_stats(chunks, fps)
+            self._store_detections(cache_key, merged)
+            self.frame_stats = merged['frame_stats']
+            self.timer = merged['timer']
+            
+            segment_paths = [task['segment_path'] for task in tasks]
+            output_fps, output_size = self.encoder.output_format(fps, (width, height))
+            self._concatenate_segments(segment_paths, output_path, output_fps, output_size)
+            
+            results = self._build_results(merged, heatmap_generator, fps, width, height)
+            logging.info(f"Parallel video processing completed: {results}")
             return results
             
         except Exception as e:
-            logging.error(f"Video processing error: {str(e)}")
+            logging.error(f"Parallel video processing error: {str(e)}")
             raise RuntimeError(f"Video processing failed: {str(e)}")
     
+    def _open_capture(self, source):
+        """
+        Open a video file, or a binary stream such as an upload still in progress
+        
+        Streams must be io.BufferedIOBase instances with read and seek; they
+        are decoded through FFmpeg, which reads them front to back for
+        streamable containers.
+        """
+        if isinstance(source, io.BufferedIOBase):
+            return cv2.VideoCapture(source, cv2.CAP_FFMPEG, [])
+        return cv2.VideoCapture(source)
+    
+    def _get_video_properties(self, cap):
+        """Get (fps, width, height, total_frames) of an opened capture"""
+        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        return fps, width, height, total_frames
+    
+    def _chunk_ranges(self, total_frames, num_chunks, min_chunk_frames):
+        """
+        Split a video into frame ranges for parallel processing
+        
+        Boundaries are multiples of the scheduler's minimum interval, so with
+        a fixed-interval scheduler every chunk starts on a detection frame.
+        
+        Returns:
+            List of (start_frame, end_frame) 0-based ranges; the last end is None
+        """
+        n = self.scheduler.min_interval
+        num_chunks = min(num_chunks, total_frames // max(min_chunk_frames, 1))
+        if num_chunks < 2:
+            return [(0, None)]
+        
+        chunk_length = total_frames / num_chunks
+        starts = [0]
+        for i in range(1, num_chunks):
+            start = int(round(i * chunk_length / n)) * n
+            if start > starts[-1]:
+                starts.append(start)
+        ends = starts[1:] + [None]
+        return list(zip(starts, ends))
+    
+    def _process_frames(self, cap, out, heatmap_generator, fps, total_frames,
+                        start_frame=0, end_frame=None, progress_callback=None,
+                        cached_detections=None):
+        """
+        Run detection, heatmap and rendering over a range of frames
+        
+        Args:
+            cap: Opened cv2.VideoCapture positioned at start_frame
+            out: EncodedVideoWriter receiving rendered frames
+            heatmap_generator: Initialized HeatmapGenerator instance
+            fps: Video frame rate
+            total_frames: Total number of frames (for progress logging)
+            start_frame: 0-based index of the first frame to process
+            end_frame: 0-based index to stop before, or None to read to the end
+            progress_callback: Optional callable(frame_count) invoked after every frame
+            cached_detections: Detections to replay, by frame number (see _start_run)
+            
+        Returns:
+            Dictionary with per-range statistics
+        """
+        if self.use_pipeline:
+            pipeline = FramePipeline(self, heatmap_generator, queue_size=self.pipeline_queue_size)
+            return pipeline.run(cap, out, fps, total_frames, start_frame, end_frame, progress_callback,
+                                cached_detections=cached_detections)
+        
+        run = self._start_run(fps, start_frame, cached_detections)
+        frame_count = start_frame
+        
+        timer = run['timer']
+        while end_frame is None or frame_count < end_frame:
+            with timer.measure('decode'):
+                ret, frame = cap.read()
+            if not ret:
+                break
+            
+            frame_count += 1
+            
+            # Frames the encoder drops are analyzed but not rendered
+            render = out.keeps_frame(frame_count - 1)
+            analysis = self._analyze_frame(run, frame, frame_count, heatmap_generator, render=render)
+            if render:
+                # Rendered straight into the encoder's buffer, so writing it is not a copy
+                rendered = self._render_frame(frame, analysis, heatmap_generator,
+                                              out=out.buffer(frame.shape), timer=timer)
+                
+                # Write frame
+                with timer.measure('encode'):
+                    out.write(rendered)
+            else:
+                out.skip()
+            
+            self._frame_done(frame_count, total_frames, progress_callback)
+        
+        return self._finish_run(run, frame_count)
+    
+    def _start_run(self, fps, start_frame, cached_detections=None):
+        """
+        Reset per-run state before processing a range of frames
+        
+        Args:
+            fps: Video frame rate
+            start_frame: 0-based index of the first frame to process
+            cached_detections: Detections to replay instead of running the
+                detector, by frame number; None (no cache) or a possibly empty
+                dict (cache miss), in which case detector output is recorded
+            
+        Returns:
+            Dictionary with per-run state
+        """
+        # Only run the detector when the scheduler asks for it; the tracker
+        # moves boxes on the frames in between
+        self.scheduler.reset()
+        self.tracker.reset()
+        
+        # Processing variables
+        return {
+            'fps': fps,
+            'start_frame': start_frame,
+            'total_people_detected': 0,
+            'max_people_count': 0,
+            'max_people_frame': 0,
+            'frame_stats': self._new_frame_stats(),
+            'cached_detections': cached_detections,
+            'detections': {} if cached_detections is not None else None,
+            'replayed_frames': 0,
+            'zones': ZoneCounter(self.zones) if self.zones else None,
+            'timer': StageTimer()
+        }
+    
+    def _analyze_frame(self, run, frame, frame_count, heatmap_generator, render=True):
+        """
+        Detect or track people on a frame and update statistics and heatmap
+        
+        Args:
+            run: Per-run state from _start_run
+            frame: Decoded frame, or None if the scheduler did not need it
+            frame_count: 1-based frame number
+            heatmap_generator: Initialized HeatmapGenerator instance
+            render: Whether the frame will be rendered (captures a heatmap snapshot)
+            
+        Returns:
+            Dictionary with everything needed to render the frame
+        """
+        timer = run['timer']
+        timer.count('frames')
+        
+        # Skip frames to speed up processing
+        with timer.measure('schedule'):
+            detect = self.scheduler.should_detect(frame)
+        if detect:
+            # Process this frame
+            timer.count('detector_calls')
+            found = self._detect(run, frame, frame_count)
+            with timer.measure('track'):
+                detections = self.tracker.update(frame, found, frame_count)
+        else:
+            # Carry previous detections forward
+            timer.count('frames_skipped')
+            with timer.measure('track'):
+                detections = self.tracker.predict(frame, frame_count)
+        
+        people_count = len(detections)
+        timer.count('people', people_count)
+        run['total_people_detected'] += people_count
+        
+        # Update statistics
+        if people_count > run['max_people_count']:
+            run['max_people_count'] = people_count
+            run['max_people_frame'] = frame_count
+        
+        # Get person centers for heatmap
+        person_centers = self.detector.get_person_centers(detections)
+        
+        # Count people per zone
+        zones = run['zones']
+        if zones is not None:
+            with timer.measure('zones'):
+                zones.update(person_centers, frame_count, heatmap_generator.frame_shape)
+        
+        # Update heatmap
+        with timer.measure('heatmap'):
+            heatmap_generator.update_heatmap(person_centers)
+            snapshot = heatmap_generator.get_overlay_snapshot() if render else None
+        
+        # Store frame statistics
+        run['frame_stats'].append(frame_count, frame_count / run['fps'], people_count,
+                                  heatmap_generator.get_max_density())
+        
+        return {
+            'frame': frame_count,
+            'detections': detections,
+            'people_count': people_count,
+            'total_people': run['total_people_detected'],
+            'max_people': run['max_people_count'],
+            'heatmap': snapshot,
+            'zone_polygons': zones.polygons if zones is not None else None
+        }
+    
+    def _render_frame(self, frame, analysis, heatmap_generator, out=None, timer=None):
+        """
+        Draw heatmap overlay, detections and frame information
+        
+        The overlay blend is the only full-frame write; detections, zones
+        and the information panel are then drawn in place on the blended
+        frame (or on the decoded frame itself if there is no overlay).
+        
+        Args:
+            frame: Decoded frame (may be drawn on)
+            analysis: Result of _analyze_frame for this frame
+            heatmap_generator: HeatmapGenerator instance
+            out: Optional buffer to render into
+            timer: Optional StageTimer recording the overlay, draw and info steps
+            
+        Returns:
+            Rendered frame
+        """
+        timer = timer or StageTimer()
+        
+        # Add heatmap overlay
+        with timer.measure('overlay'):
+            rendered = heatmap_generator.generate_heatmap_overlay(
+                frame, alpha=self.overlay_alpha, snapshot=analysis['heatmap'], out=out, timer=timer
+            )
+        
+        # Draw detections on top
+        with timer.measure('draw'):
+            self.detector.draw_detections(rendered, analysis['detections'], in_place=True)
+            if analysis['zone_polygons']:
+                cv2.polylines(rendered, analysis['zone_polygons'], True, (255, 255, 0), 2)
+        
+        # Add frame information
+        with timer.measure('info'):
+            self._add_frame_info(rendered, analysis['frame'], analysis['people_count'],
+                                 analysis['total_people'], analysis['max_people'])
+        return rendered
+    
+    def _frame_done(self, frame_count, total_frames, progress_callback):
+        """Report progress once a frame has been written"""
+        if progress_callback is not None:
+            progress_callback(frame_count)
+        
+        # Log progress
+        if frame_count % 30 == 0 and total_frames > 0:
+            progress = (frame_count / total_frames) * 100
+            logging.info(f"Processing progress: {progress:.1f}% ({frame_count}/{total_frames})")
+    
+    def _new_frame_stats(self):
+        """Create an empty per-frame statistics store"""
+        return FrameStatsStore(spill_frames=self.stats_spill_frames, spill_dir=self.stats_spill_dir)
+    
+    def _detect(self, run, frame, frame_count):
+        """Run the detector on a frame, or replay its cached detections"""
+        timer = run['timer']
+        cached = run['cached_detections']
+        if cached is not None and frame_count in cached:
+            detections = cached[frame_count]
+            run['replayed_frames'] += 1
+            timer.count('replayed_detector_calls')
+        else:
+            with timer.measure('detect'):
+                detections = self.detector.detect_people(frame, timer=timer)
+        timer.count('detections', len(detections))
+        
+        if run['detections'] is not None:
+            run['detections'][frame_count] = detections
+        return detections
+    
+    def _finish_run(self, run, frame_count):
+        """Collect per-run statistics after the last frame"""
+        stats = {
+            'frames': frame_count - run['start_frame'],
+            'last_frame': frame_count,
+            'total_people_detected': run['total_people_detected'],
+            'max_people_count': run['max_people_count'],
+            'max_people_frame': run['max_people_frame'],
+            'detection_stats': self.scheduler.get_stats(),
+            'tracking_stats': self.tracker.get_stats(run['fps']),
+            'frame_stats': run['frame_stats'],
+            'zones': run['zones'],
+            'timer': run['timer']
+        }
+        if run['detections'] is not None:
+            stats['detections'] = run['detections']
+            stats['replayed_frames'] = run['replayed_frames']
+        return stats
+    
+    def _load_cached_detections(self, input_path):
+        """
+        Look up cached detections for a video
+        
+        Returns:
+            (cache key, detections by frame number), with an empty dict on a
+            cache miss, or (None, None) when caching is disabled
+        """
+        if self.detection_cache is None or isinstance(input_path, io.BufferedIOBase):
+            # Streams can't be hashed before they have been read in full
+            return None, None
+        
+        cache_key = self.detection_cache.make_key(input_path, self.detector.get_config())
+        cached_detections = self.detection_cache.load(cache_key)
+        if cached_detections is not None:
+            logging.info(f"Replaying cached detections for {len(cached_detections)} frames")
+        return cache_key, cached_detections or {}
+    
+    def _store_detections(self, cache_key, stats):
+        """Save the run's detections to the cache if the detector ran on any frame"""
+        if cache_key is None:
+            return
+        
+        detections = stats.pop('detections')
+        if len(detections) > stats['replayed_frames']:
+            self.detection_cache.store(cache_key, detections)
+    
+    def _merge_chunk_stats(self, chunks, fps):
+        """Combine per-chunk statistics, in frame order, into whole-video statistics"""
+        merged = {
+            'frames': 0,
+            'last_frame': 0,
+            'total_people_detected': 0,
+            'max_people_count': 0,
+            'max_people_frame': 0,
+            'detection_stats': {'detector_calls': 0, 'frames_skipped': 0},
+            'frame_stats': self._new_frame_stats(),
+            'zones': None,
+            'timer': StageTimer()
+        }
+        if 'detections' in chunks[0]:
+            merged['detections'] = {}
+            merged['replayed_frames'] = 0
+        for chunk in chunks:
+            merged['frames'] += chunk['frames']
+            merged['last_frame'] = chunk['last_frame']
+            merged['total_people_detected'] += chunk['total_people_detected']
+            # Strict comparison keeps the earliest peak, like the serial loop
+            if chunk['max_people_count'] > merged['max_people_count']:
+                merged['max_people_count'] = chunk['max_people_count']
+                merged['max_people_frame'] = chunk['max_people_frame']
+            merged['frame_stats'].extend(chunk['frame_stats'])
+            if merged['zones'] is None:
+                merged['zones'] = chunk['zones']
+            elif chunk['zones'] is not None:
+                merged['zones'].extend(chunk['zones'])
+            merged['timer'].merge(chunk['timer'])
+            if 'detections' in merged:
+                merged['detections'].update(chunk['detections'])
+                merged['replayed_frames'] += chunk['replayed_frames']
+            for key in ('detector_calls', 'frames_skipped'):
+                merged['detection_stats'][key] += chunk['detection_stats'][key]
+        
+        # Join people tracked across chunk boundaries so each counts once
+        tracks = chunks[0]['tracks']
+        for previous, chunk in zip(chunks, chunks[1:]):
+            tracks = self.tracker.stitch_tracks(tracks, chunk['tracks'], previous['last_frame'] + 1)
+        merged['tracking_stats'] = track_stats(tracks, self.tracker.min_hits, fps)
+        
+        total = merged['frames']
+        skipped = merged['detection_stats']['frames_skipped']
+        merged['detection_stats']['skip_ratio'] = round(skipped / total, 3) if total else 0.0
+        return merged
+    
+    def _concatenate_segments(self, segment_paths, output_path, fps, size):
+        """Concatenate encoded chunk segments, in order, into the output video and remove them"""
+        try:
+            concatenate_videos(segment_paths, output_path, fps, size)
+        finally:
+            for path in segment_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+    
+    def _build_results(self, stats, heatmap_generator, fps, width, height):
+        """Create the results dictionary from whole-video statistics"""
+        frame_count = stats['frames']
+        total_people_detected = stats['total_people_detected']
+        max_people_frame = stats['max_people_frame']
+        
+        # Calculate final statistics
+        avg_people_per_frame = total_people_detected / frame_count if frame_count > 0 else 0
+        density_stats = heatmap_generator.get_density_stats()
+        
+        # Create results dictionary
+        results = {
+            'total_frames': frame_count,
+            'total_people_detected': total_people_detected,
+            'avg_people_per_frame': round(avg_people_per_frame, 2),
+            'max_people_count': stats['max_people_count'],
+            'max_people_frame': max_people_frame,
+            'max_people_timestamp': round(max_people_frame / fps, 2),
+            'video_duration': round(frame_count / fps, 2),
+            'fps': fps,
+            'resolution': f"{width}x{height}",
+            'density_stats': density_stats,
+            'detection_stats': stats['detection_stats'],
+            'tracking_stats': stats['tracking_stats'],
+            'processing_time': datetime.now().isoformat()
+        }
+        if 'pipeline_stats' in stats:
+            results['pipeline_stats'] = stats['pipeline_stats']
+        if 'replayed_frames' in stats:
+            results['detection_stats']['replayed_frames'] = stats['replayed_frames']
+        
+        if stats['zones'] is not None:
+            results['zones'] = stats['zones'].get_results(fps)
+        
+        # Small multi-resolution summary of frame_stats for timeline charts
+        with stats['timer'].measure('timeline'):
+            self.timeline = DensityTimeline.from_frame_stats(stats['frame_stats'], fps, zones=stats['zones'])
+        
+        # Per-stage timing breakdown, with detections per detector call
+        # (including calls replayed from the cache)
+        timings = stats['timer'].summary()
+        counters = timings['counters']
+        detector_calls = counters.get('detector_calls', 0)
+        counters['detections_per_frame'] = (round(counters.get('detections', 0) / detector_calls, 2)
+                                            if detector_calls else 0.0)
+        results['stage_timings'] = timings
+        return results
+    
     def _add_frame_info(self, frame, frame_number, people_count, total_people, max_people):
         """
         Add information overlay to frame
@@ -159,64 +748,104 @@ class VideoProcessor:
             total_people: Total people detected so far
             max_people: Maximum people in any frame so far
         """
-        # Prepare text information
-        info_lines = [
-            f"Frame: {frame_number}",
-            f"People: {people_count}",
-            f"Total: {total_people}",
-            f"Max: {max_people}"
-        ]
-        
-        # Text settings
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        font_scale = 0.6
-        font_thickness = 2
-        line_height = 25
-        
-        # Background rectangle
-        bg_height = len(info_lines) * line_height + 10
-        bg_width = 150
-        
-        # Draw background
-        cv2.rectangle(frame, (10, 10), (10 + bg_width, 10 + bg_height), 
-                     (0, 0, 0), -1)
-        cv2.rectangle(frame, (10, 10), (10 + bg_width, 10 + bg_height), 
-                     (255, 255, 255), 2)
-        
-        # Draw text
-        for i, line in enumerate(info_lines):
-            y_position = 35 + i * line_height
-            cv2.putText(frame, line, (15, y_position), font, font_scale, 
-                       (255, 255, 255), font_thickness)
-    
-    def get_frame_statistics(self):
+        # The panel keeps its box, labels and last values between frames
+        if self._info_panel is None:
+            self._info_panel = InfoPanel(['Frame: ', 'People: ', 'Total: ', 'Max: '])
+        self._info_panel.draw(frame, [frame_number, people_count, total_people, max_people])
+    
+    def get_frame_statistics(self, start_frame=None, end_frame=None):
         """
         Get detailed frame statistics
         
+        For large ranges prefer querying self.frame_stats (a FrameStatsStore)
+        directly, which returns NumPy columns.
+        
+        Args:
+            start_frame: First frame number to include (None for the start)
+            end_frame: Last frame number to include (None for the end)
+            
         Returns:
             List of frame statistics
         """
-        return self.frame_stats
+        return self.frame_stats.to_records(start_frame, end_frame)
     
     def export_statistics(self, output_path):
         """
-        Export frame statistics to JSON file
+        Export frame statistics to a JSON file, or to a NumPy archive if the
+        path ends in .npz
         
         Args:
-            output_path: Path to save statistics JSON
+            output_path: Path to save statistics
         """
         try:
-            import json
-            
-            stats_data = {
-                'frame_statistics': self.frame_stats,
-                'export_time': datetime.now().isoformat()
-            }
-            
-            with open(output_path, 'w') as f:
-                json.dump(stats_data, f, indent=2)
+            if output_path.endswith('.npz'):
+                self.frame_stats.save_npz(output_path)
+            else:
+                self.frame_stats.save_json(output_path, export_time=datetime.now().isoformat())
             
             logging.info(f"Statistics exported to: {output_path}")
             
         except Exception as e:
             logging.error(f"Error exporting statistics: {str(e)}")
+
+
+# Per-process counter of frames processed, shared with the parent for progress
+_chunk_progress = None
+
+def _init_chunk_worker(frames_done):
+    """Initialize a chunk worker process"""
+    global _chunk_progress
+    _chunk_progress = frames_done
+    # Parallelism comes from the process pool; keep OpenCV single-threaded per process
+    cv2.setNumThreads(1)
+
+def _process_chunk(task):
+    """
+    Process one frame range of a video into its own segment file
+    
+    Args:
+        task: Dictionary describing the chunk (see VideoProcessor.process_video_parallel)
+        
+    Returns:
+        Dictionary with chunk statistics and the chunk's heatmap data
+    """
+    from utils.detection import YOLODetector
+    from utils.heatmap import HeatmapGenerator
+    
+    detector = YOLODetector(**task['detector'])
+    processor = VideoProcessor(detector, scheduler=DetectionScheduler(**task['scheduler']),
+                               tracker=PersonTracker(**task['tracker']),
+                               use_pipeline=task['use_pipeline'],
+                               pipeline_queue_size=task['pipeline_queue_size'],
+                               overlay_alpha=task['overlay_alpha'],
+                               stats_spill_frames=None, zones=task['zones'],
+                               encoder=VideoEncoder(**task['encoder']))
+    heatmap_generator = HeatmapGenerator(**task['heatmap'])
+    width, height = task['size']
+    heatmap_generator.initialize_heatmap((height, width, 3))
+    
+    cap = cv2.VideoCapture(task['input_path'])
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video file: {task['input_path']}")
+    cap.set(cv2.CAP_PROP_POS_FRAMES, task['start_frame'])
+    
+    out = processor.encoder.open(task['segment_path'], task['fps'], task['size'],
+                                 frame_offset=task['start_frame'], asynchronous=not task['use_pipeline'])
+    
+    def report_progress(frame_count):
+        with _chunk_progress.get_lock():
+            _chunk_progress.value += 1
+    
+    try:
+        chunk = processor._process_frames(cap, out, heatmap_generator, task['fps'], 0,
+                                          start_frame=task['start_frame'],
+                                          end_frame=task['end_frame'],
+                                          progress_callback=report_progress,
+                                          cached_detections=task['cached_detections'])
+    finally:
+        cap.release()
+        out.release()
+    
+    chunk['heatmap_data'] = heatmap_generator.heatmap_data
+    chunk['tracks'] = processor.tracker.get_tracks()
+    return chunk
@@ -0,0 +1,229 @@
+import cv2
+import numpy as np
+
+# Zones are bits of the mask; the narrowest integer type with a bit per zone is used
+MASK_TYPES = (np.uint8, np.uint16, np.uint32, np.uint64)
+MAX_ZONES = 64
+
+# Alerts listed per zone in the results (the count is always complete)
+MAX_ALERTS_PER_ZONE = 20
+
+def parse_zones(spec):
+    """
+    Validate a zone configuration
+
+    Each zone is a dictionary with a 'name', a 'points' list of at least
+    three [x, y] vertices and optionally an occupancy 'threshold'. Points
+    are pixel coordinates, or fractions of the frame size with
+    'relative': true.
+
+    Args:
+        spec: List of zone dictionaries (e.g. parsed from JSON)
+
+    Returns:
+        List of normalized zone dictionaries
+
+    Raises:
+        ValueError: If the configuration is invalid
+    """
+    if not isinstance(spec, list):
+        raise ValueError("Zones must be a list")
+    if len(spec) > MAX_ZONES:
+        raise ValueError(f"At most {MAX_ZONES} zones are supported")
+
+    zones = []
+    names = set()
+    for zone in spec:
+        if not isinstance(zone, dict):
+            raise ValueError("Each zone must be an object")
+        name = str(zone.get('name', '')).strip()
+        if not name or name in names:
+            raise ValueError("Each zone needs a unique name")
+        names.add(name)
+
+        try:
+            points = np.asarray(zone.get('points'), dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError(f"Zone '{name}' has invalid points")
+        if points.ndim != 2 or points.shape[1] != 2 or len(points) < 3 or not np.isfinite(points).all():
+            raise ValueError(f"Zone '{name}' needs at least three [x, y] points")
+
+        threshold = zone.get('threshold')
+        if threshold is not None:
+            threshold = int(threshold)
+            if threshold < 0:
+                raise ValueError(f"Zone '{name}' threshold must not be negative")
+
+        zones.append({
+            'name': name,
+            'points': points.tolist(),
+            'relative': bool(zone.get('relative', False)),
+            'threshold': threshold
+        })
+    return zones
+
+
+class ZoneCounter:
+    """Per-frame people counts in named polygon zones"""
+
+    def __init__(self, zones):
+        """
+        Initialize zone counter
+
+        The polygons are rasterized once, on the first frame, into a mask
+        holding one bit per zone, so zones may overlap. Each frame's person
+        centers are then assigned to all zones with a single mask lookup.
+
+        Args:
+            zones: Zone dictionaries from parse_zones
+        """
+        self.zones = zones
+        self.names = [zone['name'] for zone in zones]
+        self.thresholds = np.array([np.inf if zone['threshold'] is None else zone['threshold']
+                                    for zone in zones])
+        self.mask = None
+        self.polygons = []
+        self._mask_type = next(dtype for dtype in MASK_TYPES if np.iinfo(dtype).bits >= len(zones))
+        self._bits = (np.uint64(1) << np.arange(len(zones), dtype=np.uint64)).astype(self._mask_type)
+        self._counts = np.zeros((1024, len(zones)), dtype=np.int32)
+        self._size = 0
+        self.start_frame = None
+
+    def __len__(self):
+        return self._size
+
+    def rasterize(self, frame_shape):
+        """
+        Build the zone mask (and pixel polygons, for drawing) for a frame size
+
+        Args:
+            frame_shape: Shape of the video frames, (height, width[, channels])
+        """
+        height, width = frame_shape[:2]
+        self.mask = np.zeros((height, width), dtype=self._mask_type)
+        layer = np.zeros((height, width), dtype=np.uint8)
+        self.polygons = []
+        for bit, zone in zip(self._bits, self.zones):
+            points = np.asarray(zone['points'])
+            if zone['relative']:
+                points = points * (width, height)
+            polygon = np.round(points).astype(np.int32)
+            self.polygons.append(polygon)
+            layer[:] = 0
+            cv2.fillPoly(layer, [polygon], 1)
+            self.mask[layer > 0] |= bit
+
+    def update(self, person_centers, frame_number, frame_shape):
+        """
+        Count the people in each zone on a frame
+
+        Args:
+            person_centers: (x, y) centers from get_person_centers
+            frame_number: 1-based frame number (frames must be consecutive)
+            frame_shape: Shape of the video frames
+
+        Returns:
+            Array of people counts, one per zone
+        """
+        if self.mask is None:
+            self.rasterize(frame_shape)
+        if self.start_frame is None:
+            self.start_frame = frame_number
+
+        counts = np.zeros(len(self.zones), dtype=np.int32)
+        if len(person_centers):
+            centers = np.asarray(person_centers, dtype=np.int64).reshape(-1, 2)
+            height, width = self.mask.shape
+            xs = np.clip(centers[:, 0], 0, width - 1)
+            ys = np.clip(centers[:, 1], 0, height - 1)
+            # Zone bits of every center, expanded to a (centers x zones) membership table
+            membership = (self.mask[ys, xs][:, None] & self._bits) != 0
+            counts = membership.sum(axis=0, dtype=np.int32)
+
+        if self._size == len(self._counts):
+            grown = np.zeros((len(self._counts) * 2, len(self.zones)), dtype=np.int32)
+            grown[:self._size] = self._counts[:self._size]
+            self._counts = grown
+        self._counts[self._size] = counts
+        self._size += 1
+        return counts
+
+    def counts(self):
+        """Get the per-frame counts as a (frames x zones) array"""
+        return self._counts[:self._size]
+
+    def extend(self, other):
+        """
+        Append the counts of another counter (e.g. a later chunk of the same video)
+
+        Args:
+            other: ZoneCounter with the same zones whose frames follow this one's
+        """
+        if self.start_frame is None:
+            self.start_frame = other.start_frame
+        self._counts = np.concatenate([self.counts(), other.counts()])
+        self._size = len(self._counts)
+
+    def get_results(self, fps):
+        """
+        Summarize occupancy and threshold alerts of every zone
+
+        An alert is a run of consecutive frames with more people in the zone
+        than its threshold.
+
+        Args:
+            fps: Video frame rate
+
+        Returns:
+            List with one dictionary per zone: peak, average, time over the
+            threshold and alerts
+        """
+        counts = self.counts()
+        frames, num_zones = counts.shape
+        if frames == 0:
+            return [{'name': name, 'threshold': zone['threshold'], 'peak': 0, 'peak_frame': 0,
+                     'peak_timestamp': 0.0, 'avg_occupancy': 0.0, 'seconds_over_threshold': 0.0,
+                     'alert_count': 0, 'alerts': []} for name, zone in zip(self.names, self.zones)]
+
+        first_frame = self.start_frame or 1
+        peak_index = counts.argmax(axis=0)
+        peaks = counts[peak_index, np.arange(num_zones)]
+        averages = counts.mean(axis=0)
+
+        # Alert runs start where a zone goes over its threshold and end where it drops back
+        over = counts > self.thresholds
+        padded = np.zeros((frames + 2, num_zones), dtype=np.int8)
+        padded[1:-1] = over
+        edges = np.diff(padded, axis=0).T
+        # Zone-major order, so the n-th start and end of each zone belong to the same run
+        alert_zones, alert_starts = np.nonzero(edges == 1)
+        _, alert_ends = np.nonzero(edges == -1)
+        # Peak of every run with one reduceat over the zone-major series (plus a
+        # sentinel, so a run ending on the last frame has a valid end index)
+        series = np.append(counts.T.ravel(), 0)
+        bounds = np.stack([alert_zones * frames + alert_starts, alert_zones * frames + alert_ends], axis=1)
+        alert_peaks = np.maximum.reduceat(series, bounds.ravel())[::2] if len(bounds) else bounds[:, 0]
+        zone_alerts = np.searchsorted(alert_zones, np.arange(num_zones + 1))
+
+        results = []
+        for i, (name, zone) in enumerate(zip(self.names, self.zones)):
+            low, high = zone_alerts[i], zone_alerts[i + 1]
+            listed = slice(low, min(high, low + MAX_ALERTS_PER_ZONE))
+            alerts = [{
+                'start_frame': int(start + first_frame),
+                'start_timestamp': round(int(start + first_frame) / fps, 2),
+                'end_timestamp': round(int(end + first_frame - 1) / fps, 2),
+                'peak': int(peak)
+            } for start, end, peak in zip(alert_starts[listed], alert_ends[listed], alert_peaks[listed])]
+            results.append({
+                'name': name,
+                'threshold': zone['threshold'],
+                'peak': int(peaks[i]),
+                'peak_frame': int(peak_index[i] + first_frame),
+                'peak_timestamp': round(int(peak_index[i] + first_frame) / fps, 2),
+                'avg_occupancy': round(float(averages[i]), 2),
+                'seconds_over_threshold': round(float(over[:, i].sum()) / fps, 2),
+                'alert_count': int(high - low),
+                'alerts': alerts
+            })
+        return results